@@ -2,6 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 import os
+import threading
 
 db = SQLAlchemy()
 
@@ -27,16 +28,27 @@ def create_app():
     db.init_app(app)
     
     # 注册蓝图
-    from app.api import analysis, generation, recommendation, user, melody
+    from app.api import analysis, generation, recommendation, user, melody, health
     app.register_blueprint(analysis.bp, url_prefix='/api/analysis')
     app.register_blueprint(generation.bp, url_prefix='/api/generation')
     app.register_blueprint(recommendation.bp, url_prefix='/api/recommendation')
     app.register_blueprint(user.bp, url_prefix='/api/user')
     app.register_blueprint(melody.bp, url_prefix='/api/melody')
+    app.register_blueprint(health.bp, url_prefix='/api/health')
     
     # 创建数据库表
     with app.app_context():
         db.create_all()
     
+    # 模型预热：off（默认，首次使用时加载）、background（后台线程加载）、blocking（启动时加载完再服务）
+    warmup_mode = os.environ.get('NLP_WARMUP', 'off').lower()
+    if warmup_mode in ('background', 'blocking'):
+        from nlp_engine.utils.lazy import warm_up, warmup_resources
+        names = warmup_resources()
+        if warmup_mode == 'blocking':
+            warm_up(names)
+        else:
+            threading.Thread(target=warm_up, args=(names,), name='nlp-warmup', daemon=True).start()
+    
     return app
 
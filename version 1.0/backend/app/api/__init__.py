@@ -1,4 +1,4 @@
 # API路由模块
-from . import analysis, generation, recommendation, user
+from . import analysis, generation, recommendation, user, health
 
-__all__ = ['analysis', 'generation', 'recommendation', 'user']
+__all__ = ['analysis', 'generation', 'recommendation', 'user', 'health']
@@ -1,7 +1,8 @@
 """
 分析API路由
 """
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from app.services.analysis_service import AnalysisService
 
 bp = Blueprint('analysis', __name__)
@@ -89,6 +90,34 @@ def analyze_sentiment():
         return jsonify({'error': str(e)}), 500
 
 
+@bp.route('/sentiment/stream', methods=['POST'])
+def analyze_sentiment_stream():
+    """流式分析情感（NDJSON：逐行结果，最后一条为汇总记录）"""
+    data = request.get_json()
+    lyrics = data.get('lyrics', '')
+    
+    if not lyrics:
+        return jsonify({'error': '歌词不能为空'}), 400
+    
+    try:
+        records = service.analyze_sentiment_stream(lyrics, data.get('chunk_size', 16))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        try:
+            for record in records:
+                yield json.dumps(record, ensure_ascii=False) + '\n'
+        except Exception as e:
+            yield json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @bp.route('/theme', methods=['POST'])
 def analyze_theme():
     """单独分析主题"""
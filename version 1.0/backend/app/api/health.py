@@ -0,0 +1,47 @@
+"""
+健康检查API路由
+存活检查、模型就绪状态和预热
+"""
+from flask import Blueprint, request, jsonify
+from nlp_engine.utils.lazy import ready_resources, resource_status, warm_up
+from nlp_engine.sentiment.analyzer import get_sentiment_cache
+from app.utils.music_api_client import get_music_cache
+
+bp = Blueprint('health', __name__)
+
+
+@bp.route('/live', methods=['GET'])
+def live():
+    """存活检查"""
+    return jsonify({'success': True, 'status': 'alive'}), 200
+
+
+@bp.route('/ready', methods=['GET'])
+def ready():
+    """就绪检查：报告各模型是否已加载及加载耗时，关键资源（NLP_READY_RESOURCES）加载完成前返回503"""
+    resources = resource_status()
+    loaded = {r['name'] for r in resources if r['loaded']}
+    missing = [name for name in ready_resources() if name not in loaded]
+    is_ready = not missing
+    data = {
+        'ready': is_ready,
+        'missing': missing,
+        'resources': resources,
+        'caches': {
+            'sentiment': get_sentiment_cache().stats(),
+            'music_api': get_music_cache().stats()
+        }
+    }
+    return jsonify({'success': True, 'data': data}), 200 if is_ready else 503
+
+
+@bp.route('/warmup', methods=['POST'])
+def warmup():
+    """预热模型（可在请求体中用resources指定资源名，默认全部）"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        resources = warm_up(data.get('resources'))
+        return jsonify({'success': True, 'data': resources}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
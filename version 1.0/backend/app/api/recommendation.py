@@ -1,6 +1,9 @@
 """
 推荐API路由
 """
+import hmac
+import os
+import uuid
 from flask import Blueprint, request, jsonify
 from app.services.recommendation_service import RecommendationService
 
@@ -15,6 +18,9 @@ def recommend():
     query_lyrics = data.get('lyrics', '')
     top_k = data.get('top_k', 5)
     user_id = data.get('user_id')
+    explain = data.get('explain', True)
+    if isinstance(explain, str):
+        explain = explain.lower() not in ('0', 'false', 'no', 'off')
     
     if not query_lyrics:
         return jsonify({'error': '歌词不能为空'}), 400
@@ -25,12 +31,90 @@ def recommend():
         if user_id:
             user_preferences = service.get_user_preferences(user_id)
         
-        result = service.recommend(query_lyrics, top_k, user_id, user_preferences)
+        result = service.recommend(query_lyrics, top_k, user_id, user_preferences, explain=bool(explain))
         return jsonify({'success': True, 'data': result}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _check_admin():
+    """管理接口需要在X-Admin-Token请求头中提供ADMIN_TOKEN，未配置令牌时管理接口不可用"""
+    token = os.environ.get('ADMIN_TOKEN', '')
+    if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({'error': '需要管理员权限'}), 403
+    return None
+
+
+def _save_body(path: str, max_bytes: int) -> bool:
+    """把请求体分块写入文件，超过max_bytes（0为不限）时停止并返回False"""
+    written = 0
+    with open(path, 'wb') as f:
+        for block in iter(lambda: request.stream.read(1 << 20), b''):
+            written += len(block)
+            if max_bytes and written > max_bytes:
+                return False
+            f.write(block)
+    return True
+
+
+@bp.route('/catalog/ingest', methods=['POST'])
+def ingest_catalog():
+    """批量导入歌曲（管理接口）
+    
+    请求体为NDJSON（每行一首歌）或CSV（带表头），也可用multipart表单的file字段上传；
+    CSV须使用text/csv类型或.csv文件名。每首歌须有lyrics字段。查询参数replace=true时替换整个曲库。
+    上传大小超过CATALOG_UPLOAD_MAX_BYTES时返回413。导入在后台进行，返回任务信息，可用GET /catalog/ingest/<job_id>查询进度。
+    """
+    denied = _check_admin()
+    if denied:
+        return denied
+    
+    max_bytes = int(os.environ.get('CATALOG_UPLOAD_MAX_BYTES', 500 * 1024 * 1024))
+    too_large = f'导入文件超过大小上限（{max_bytes}字节）'
+    if max_bytes and (request.content_length or 0) > max_bytes:
+        return jsonify({'error': too_large}), 413
+    
+    upload = request.files.get('file')
+    filename = upload.filename if upload else ''
+    is_csv = filename.lower().endswith('.csv') or request.mimetype == 'text/csv' or \
+        (upload is not None and upload.mimetype == 'text/csv')
+    
+    path = None
+    try:
+        upload_dir = os.path.join(service.catalog.root, 'uploads')
+        os.makedirs(upload_dir, exist_ok=True)
+        path = os.path.join(upload_dir, uuid.uuid4().hex + ('.csv' if is_csv else '.jsonl'))
+        if upload is not None:
+            upload.save(path)
+        elif not _save_body(path, max_bytes):
+            os.remove(path)
+            return jsonify({'error': too_large}), 413
+        if os.path.getsize(path) == 0:
+            os.remove(path)
+            return jsonify({'error': '导入内容不能为空'}), 400
+        
+        replace = request.args.get('replace', 'false').lower() in ('1', 'true', 'yes')
+        job = service.start_ingest(path, replace)
+        return jsonify({'success': True, 'data': job}), 202
+    except Exception as e:
+        if path and os.path.exists(path):
+            os.remove(path)
+        return jsonify({'error': str(e)}), 409 if isinstance(e, RuntimeError) else 500
+
+
+@bp.route('/catalog/ingest/<job_id>', methods=['GET'])
+def ingest_status(job_id):
+    """查询导入任务进度（管理接口）"""
+    denied = _check_admin()
+    if denied:
+        return denied
+    
+    job = service.get_ingest_job(job_id)
+    if not job:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify({'success': True, 'data': job}), 200
+
+
 @bp.route('/knowledge-graph', methods=['GET', 'POST'])
 def knowledge_graph():
     """构建知识图谱"""
@@ -3,7 +3,7 @@
 整合情感、主题、韵律分析
 """
 import json
-from typing import Dict, List
+from typing import Dict, Iterator, List
 import sys
 import os
 
@@ -22,6 +22,9 @@ from app import db
 class AnalysisService:
     """分析服务类"""
     
+    # 流式情感分析每批行数的上限
+    STREAM_MAX_CHUNK_SIZE = 256
+    
     def __init__(self):
         self.sentiment_analyzer = SentimentAnalyzer()
         self.theme_extractor = ThemeExtractor()
@@ -55,6 +58,20 @@ class AnalysisService:
         
         return result
     
+    def analyze_sentiment_stream(self, lyrics: str, chunk_size=16) -> Iterator[Dict]:
+        """流式情感分析：逐行结果，最后一条为汇总记录
+        
+        chunk_size须为整数，截断到1至STREAM_MAX_CHUNK_SIZE之间；参数无效时在开始产出结果之前抛出ValueError。
+        """
+        if isinstance(chunk_size, bool):
+            raise ValueError('chunk_size必须是整数')
+        try:
+            chunk_size = int(chunk_size)
+        except (TypeError, ValueError):
+            raise ValueError('chunk_size必须是整数')
+        chunk_size = max(1, min(chunk_size, self.STREAM_MAX_CHUNK_SIZE))
+        return self.sentiment_analyzer.analyze_lyrics_iter(lyrics, chunk_size)
+    
     def _analyze_structure(self, lyrics: str) -> Dict:
         """分析歌曲结构"""
         lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
@@ -107,12 +107,14 @@ class GenerationService:
     
     def optimize_rhyme(self, line: str, target_rhyme: str) -> Dict:
         """押韵优化"""
-        suggestions = self.generator.optimize_rhyme(line, target_rhyme)
+        candidates = self.generator.get_rhyme_candidates(line, target_rhyme)
         
         return {
             'original': line,
             'target_rhyme': target_rhyme,
-            'suggestions': suggestions
+            'suggestions': candidates['suggestions'][:10],
+            'rhyme_words': candidates['rhyme_words'],
+            'multi_syllable_rhymes': candidates['multi_syllable']
         }
     
     def convert_style(self, lyrics: str, target_style: str, user_id: int = None) -> Dict:
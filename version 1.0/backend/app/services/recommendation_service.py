@@ -8,13 +8,19 @@ from typing import Dict, List, Optional
 from typing import List as ListType
 import sys
 import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 添加backend目录到路径
 backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
 if backend_dir not in sys.path:
     sys.path.insert(0, backend_dir)
 
-from nlp_engine.recommendation import MusicRecommender
+from nlp_engine.recommendation import MusicRecommender, CatalogStore
+from nlp_engine.utils.lazy import JIEBA
+from nlp_engine.utils.ranking import top_k_indices
 from app.models import RecommendationHistory
 from app import db
 from app.utils.music_api_client import MusicAPIClient
@@ -26,125 +32,187 @@ class RecommendationService:
     def __init__(self):
         self.recommender = MusicRecommender()
         self.music_api = MusicAPIClient()
+        # 平台搜索并发发出，线程数限制同时进行的请求数
+        self._search_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('MUSIC_SEARCH_WORKERS', 8)),
+                                               thread_name_prefix='music-search')
+        # 关键短语的搜索是否与关键词、主题的搜索同时发出（默认只在前两类结果不足时补发）
+        self.eager_phrase_search = os.environ.get('MUSIC_SEARCH_EAGER_PHRASES', 'false').lower() in \
+            ('1', 'true', 'yes', 'on')
+        self.catalog = CatalogStore()
+        self.catalog_version = None  # 已加载的曲库版本目录
+        self.catalog_check_interval = float(os.environ.get('CATALOG_CHECK_INTERVAL', 10))
+        self._catalog_checked_at = time.time()
+        self._catalog_lock = threading.Lock()
+        self._catalog_loaded = False  # 曲库在首次推荐时加载，导入模块时不触碰磁盘和模型
+        self._ingest_jobs = {}
+    
+    def _ensure_catalog(self):
+        """首次使用时加载曲库（多个请求同时到达时只加载一次）"""
+        if self._catalog_loaded:
+            return
+        with self._catalog_lock:
+            if not self._catalog_loaded:
+                self._load_catalog()
+                self._catalog_checked_at = time.time()
+                self._catalog_loaded = True
+    
+    def _load_catalog(self):
+        """加载磁盘上的当前曲库（特征以mmap方式共享）
+        
+        还没有曲库时只在内存中使用示例歌曲，不写入磁盘；初始曲库由离线命令生成：
+            python -m nlp_engine.recommendation.ingest --sample
+        """
+        current = self.catalog.current()
+        if current:
+            try:
+                self.recommender.load_catalog(current)
+                self.catalog_version = current
+                return
+            except Exception as e:
+                print(f"加载曲库失败: {e}")
+        else:
+            print("曲库尚未生成，暂时使用示例歌曲（可运行 python -m nlp_engine.recommendation.ingest --sample 生成）")
         self._initialize_sample_songs()
     
     def _initialize_sample_songs(self):
-        """初始化示例歌曲库"""
-        sample_songs = [
-            {
-                'id': 1,
-                'title': '爱情故事',
-                'artist': '示例歌手A',
-                'lyrics': '我爱你\n就像爱春天\n你是我心中的\n最美的风景',
-                'theme': '爱情',
-                'style': '流行'
-            },
-            {
-                'id': 2,
-                'title': '追梦人',
-                'artist': '示例歌手B',
-                'lyrics': '追逐梦想\n永不放弃\n坚持到底\n成功在望',
-                'theme': '励志',
-                'style': '摇滚'
-            },
-            {
-                'id': 3,
-                'title': '回忆',
-                'artist': '示例歌手C',
-                'lyrics': '回忆过去\n那些美好时光\n青春岁月\n永远难忘',
-                'theme': '怀旧',
-                'style': '抒情'
-            }
-        ]
+        """初始化示例歌曲库（仅在内存中）"""
+        from nlp_engine.recommendation.ingest import SAMPLE_SONGS
+        self.recommender.add_songs_to_database([dict(song) for song in SAMPLE_SONGS])
+    
+    def reload_catalog(self, force: bool = False) -> bool:
+        """当前曲库版本变化时（如其他进程完成了入库）加载新版本并整体替换推荐器，返回是否重新加载"""
+        current = self.catalog.current()
+        if not current or (current == self.catalog_version and not force):
+            return False
+        recommender = MusicRecommender()
+        recommender.load_catalog(current)
+        self.recommender = recommender
+        self.catalog_version = current
+        return True
+    
+    def _check_catalog(self):
+        """首次调用时加载曲库，之后每隔catalog_check_interval秒检查一次曲库版本"""
+        self._ensure_catalog()
+        now = time.time()
+        if now - self._catalog_checked_at < self.catalog_check_interval:
+            return
+        self._catalog_checked_at = now
+        try:
+            self.reload_catalog()
+        except Exception as e:
+            print(f"重新加载曲库失败: {e}")
+    
+    def start_ingest(self, path: str, replace: bool = False) -> Dict:
+        """在后台线程中批量导入上传的歌曲文件（NDJSON或CSV，导入结束后删除），完成后切换到新曲库
+        
+        同一时间只运行一个导入任务；失败后重新上传相同的文件会从检查点继续。
+        """
+        from nlp_engine.recommendation.ingest import read_songs, ingest_songs
+        
+        with self._catalog_lock:
+            if any(job['status'] == 'running' for job in self._ingest_jobs.values()):
+                raise RuntimeError('已有导入任务正在运行')
+            job = {'id': uuid.uuid4().hex, 'status': 'running', 'done_chunks': 0, 'total_chunks': 0,
+                   'result': None, 'error': None}
+            self._ingest_jobs[job['id']] = job
+        
+        def progress(done, total):
+            job['done_chunks'], job['total_chunks'] = done, total
         
-        for song in sample_songs:
-            self.recommender.add_song_to_database(song)
+        def run():
+            try:
+                job['result'] = ingest_songs(
+                    read_songs(path), self.catalog, replace=replace,
+                    workers=int(os.environ.get('CATALOG_INGEST_WORKERS', 0)) or None,
+                    chunk_size=int(os.environ.get('CATALOG_INGEST_CHUNK_SIZE', 1000)),
+                    progress=progress)
+                self.reload_catalog()
+                job['status'] = 'completed'
+            except Exception as e:
+                print(f"批量导入失败: {e}")
+                job['error'] = str(e)
+                job['status'] = 'failed'
+            finally:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        
+        threading.Thread(target=run, name=f"catalog-ingest-{job['id'][:8]}", daemon=True).start()
+        return dict(job)
+    
+    def get_ingest_job(self, job_id: str) -> Optional[Dict]:
+        """导入任务状态"""
+        job = self._ingest_jobs.get(job_id)
+        return dict(job) if job else None
     
     def recommend(self, query_lyrics: str, top_k: int = 5,
-                 user_id: int = None, user_preferences: Optional[Dict] = None) -> Dict:
-        """推荐歌曲（改进算法：基于主题、关键词和歌词相似度）"""
-        # 提取关键词和主题
-        keywords = self._extract_keywords_from_lyrics(query_lyrics)
-        themes = self._extract_themes_from_lyrics(query_lyrics)
+                 user_id: int = None, user_preferences: Optional[Dict] = None,
+                 explain: bool = True) -> Dict:
+        """推荐歌曲（改进算法：基于主题、关键词和歌词相似度）
         
-        # 从多个关键词和主题搜索，增加多样性
-        all_songs = []
-        seen_song_ids = set()
+        explain为False时不生成推荐理由（explanation为None，reasons为空）
+        """
+        self._check_catalog()
+        # 提取关键词和主题（查询歌词只分词一次，主题、短语和内容相似度共用）
+        query_tokens = self._segment(query_lyrics)
+        keywords = self._extract_keywords_from_lyrics(query_tokens)
+        themes = self._extract_themes_from_lyrics(query_tokens)
         
-        try:
-            # 1. 使用关键词搜索
-            for keyword in keywords[:3]:  # 使用前3个关键词
-                songs = self.music_api.search_songs(keyword, platform='netease', limit=top_k * 2)
-                for song in songs:
-                    song_key = f"{song.get('title', '')}_{song.get('artist', '')}"
-                    if song_key not in seen_song_ids:
-                        seen_song_ids.add(song_key)
-                        all_songs.append(song)
-            
-            # 2. 使用主题搜索
-            for theme in themes[:2]:  # 使用前2个主题
-                songs = self.music_api.search_songs(theme, platform='netease', limit=top_k * 2)
-                for song in songs:
-                    song_key = f"{song.get('title', '')}_{song.get('artist', '')}"
-                    if song_key not in seen_song_ids:
-                        seen_song_ids.add(song_key)
-                        all_songs.append(song)
-            
-            # 3. 如果关键词和主题搜索结果不足，使用完整歌词的关键短语搜索
-            if len(all_songs) < top_k * 2:
-                phrases = self._extract_phrases(query_lyrics)
-                for phrase in phrases[:2]:
-                    songs = self.music_api.search_songs(phrase, platform='netease', limit=top_k)
-                    for song in songs:
-                        song_key = f"{song.get('title', '')}_{song.get('artist', '')}"
-                        if song_key not in seen_song_ids:
-                            seen_song_ids.add(song_key)
-                            all_songs.append(song)
-        except Exception as e:
-            print(f"音乐平台API调用失败: {e}")
+        # 从多个关键词和主题并发搜索，增加多样性
+        all_songs = self._search_candidates(query_tokens, keywords, themes, top_k)
         
         # 如果API有结果，计算综合相似度并排序
         if all_songs:
-            recommendations = []
-            for song in all_songs[:top_k * 3]:  # 取前3倍数量用于计算相似度
-                # 获取歌词
-                lyrics = self.music_api.get_song_lyrics(song['id'], 'netease')
-                if lyrics:
+            candidates = all_songs[:top_k * 3]  # 取前3倍数量用于计算相似度
+            query_words = self._content_words(query_tokens)
+            positions = {}  # 歌曲id -> 在候选列表中的位置
+            for position, song in enumerate(candidates):
+                positions.setdefault(song['id'], []).append(position)
+            
+            scored = []  # (歌曲, 关键词相似度, 主题相似度, 内容相似度)
+            scores = []
+            order = []  # 候选位置，同分时按搜索结果顺序
+            # 并发获取歌词，先返回的先计算相似度
+            for song_id, lyrics in self.music_api.get_song_lyrics_many(positions, 'netease'):
+                if not lyrics:
+                    continue
+                # 计算综合相似度（关键词相似度 + 主题相似度 + 歌词内容相似度），三者共用一次分词结果
+                tokens = self._segment(lyrics)
+                keyword_sim = self._calculate_keyword_similarity(keywords, tokens)
+                theme_sim = self._calculate_theme_similarity(themes, tokens)
+                content_sim = self._calculate_similarity(query_words, self._content_words(tokens))
+                
+                # 综合得分
+                for position in positions[song_id]:
+                    song = candidates[position]
                     song['lyrics'] = lyrics
-                    # 计算综合相似度（关键词相似度 + 主题相似度 + 歌词内容相似度）
-                    keyword_sim = self._calculate_keyword_similarity(keywords, lyrics)
-                    theme_sim = self._calculate_theme_similarity(themes, lyrics)
-                    content_sim = self._calculate_similarity(query_lyrics, lyrics)
-                    
-                    # 综合得分
-                    overall_similarity = (keyword_sim * 0.3 + theme_sim * 0.3 + content_sim * 0.4)
-                    
-                    recommendations.append({
-                        'song': song,
-                        'similarity': overall_similarity,
-                        'explanation': self._generate_explanation(query_lyrics, lyrics, keywords, themes),
-                        'platform': 'netease',
-                        'details': {
-                            'keyword_similarity': keyword_sim,
-                            'theme_similarity': theme_sim,
-                            'content_similarity': content_sim
-                        }
-                    })
+                    scored.append((song, keyword_sim, theme_sim, content_sim))
+                    scores.append(keyword_sim * 0.3 + theme_sim * 0.3 + content_sim * 0.4)
+                    order.append(position)
             
-            # 按相似度排序，取前top_k个
-            recommendations.sort(key=lambda x: x['similarity'], reverse=True)
-            recommendations = recommendations[:top_k]
+            # 取相似度最高的top_k个（同分保持搜索结果顺序），只为入选的歌曲生成结果和推荐理由
+            recommendations = []
+            for i in top_k_indices(scores, top_k, tie_break=order):
+                song, keyword_sim, theme_sim, content_sim = scored[i]
+                rec = {
+                    'song': song,
+                    'similarity': scores[i],
+                    'platform': 'netease',
+                    'details': {
+                        'keyword_similarity': keyword_sim,
+                        'theme_similarity': theme_sim,
+                        'content_similarity': content_sim
+                    }
+                }
+                if explain:
+                    rec['explanation'] = self._generate_explanation(query_lyrics, song['lyrics'], keywords, themes)
+                recommendations.append(rec)
         else:
-            # 使用本地推荐系统
+            # 使用本地推荐系统（推荐理由由推荐器用已计算的特征生成）
             recommendations = self.recommender.recommend_songs(
-                query_lyrics, top_k, user_preferences
+                query_lyrics, top_k, user_preferences, explain=explain
             )
-            
-            # 添加推荐理由
-            for rec in recommendations:
-                rec['explanation'] = self.recommender.explain_recommendation(
-                    query_lyrics, rec['song']
-                )
         
         result = {
             'query_lyrics': query_lyrics,
@@ -152,7 +220,7 @@ class RecommendationService:
                 {
                     'song': rec['song'],
                     'similarity': rec.get('similarity', 0.8),
-                    'explanation': rec.get('explanation', '基于歌词相似度的推荐'),
+                    'explanation': rec.get('explanation', '基于歌词相似度的推荐') if explain else None,
                     'reasons': rec.get('reasons', {}),
                     'platform': rec.get('platform', 'local'),
                     'details': rec.get('details', {})
@@ -166,23 +234,76 @@ class RecommendationService:
         
         return result
     
-    def _extract_themes_from_lyrics(self, lyrics: str) -> ListType[str]:
-        """从歌词中提取主题"""
-        import sys
-        import os
-        backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        if backend_dir not in sys.path:
-            sys.path.insert(0, backend_dir)
+    def _search_candidates(self, query_tokens: ListType[str], keywords: ListType[str],
+                           themes: ListType[str], top_k: int) -> ListType[Dict]:
+        """并发发起平台搜索，按返回先后合并去重
+        
+        关键词（前3个）和主题（前2个）的搜索同时发出，结果直接合并；不足top_k * 2首时
+        再并发搜索关键短语（前2个）并入。eager_phrase_search开启时关键短语的搜索与前两类同时发出，
+        结果不足时不必再等一轮，但每次推荐都多调用两次平台接口。
+        """
+        searches = [(keyword, top_k * 2) for keyword in keywords[:3]]
+        searches += [(theme, top_k * 2) for theme in themes[:2]]
+        phrase_searches = [(phrase, top_k) for phrase in self._extract_phrases(query_tokens)[:2]]
+        
+        phrase_futures = self._submit_searches(phrase_searches) if self.eager_phrase_search else None
+        all_songs = []
+        seen_song_ids = set()
+        
+        def merge(songs):
+            for song in songs:
+                song_key = f"{song.get('title', '')}_{song.get('artist', '')}"
+                if song_key not in seen_song_ids:
+                    seen_song_ids.add(song_key)
+                    all_songs.append(song)
         
-        from nlp_engine.theme import ThemeExtractor
-        extractor = ThemeExtractor()
-        themes = extractor.classify_theme(lyrics)
-        return [t['theme'] for t in themes[:3]]  # 返回前3个主题
+        for songs in self._search_results(self._submit_searches(searches)):
+            merge(songs)
+        
+        # 关键词和主题搜索结果不足时，补充关键短语的搜索结果
+        if len(all_songs) < top_k * 2:
+            if phrase_futures is None:
+                phrase_futures = self._submit_searches(phrase_searches)
+            for songs in self._search_results(phrase_futures):
+                merge(songs)
+        return all_songs
+    
+    def _submit_searches(self, searches: ListType[tuple]) -> list:
+        """把 (搜索词, 数量) 列表提交到搜索线程池"""
+        return [self._search_pool.submit(self.music_api.search_songs, query, platform='netease', limit=limit)
+                for query, limit in searches]
+    
+    @staticmethod
+    def _search_results(futures: list):
+        """按完成先后返回各次搜索的结果，失败的搜索记录后跳过"""
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"音乐平台API调用失败: {e}")
+    
+    @staticmethod
+    def _segment(lyrics: str) -> ListType[str]:
+        """歌词分词（jieba精确模式，保留原始切分结果），每段歌词只分词一次"""
+        return list(JIEBA.get().cut(lyrics))
+    
+    @staticmethod
+    def _content_words(tokens: ListType[str]) -> set:
+        """用于内容相似度的词集合：去掉单字和停用词"""
+        stopwords = {'的', '了', '在', '是', '我', '你', '他', '她', '它', '这', '那', '有', '和', '与', '或'}
+        return {w for w in tokens if len(w) > 1 and w not in stopwords}
     
-    def _extract_phrases(self, lyrics: str) -> ListType[str]:
-        """提取关键短语（2-3字组合）"""
-        import jieba
-        words = list(jieba.cut(lyrics))
+    def _classify_themes(self, tokens: ListType[str]) -> ListType[str]:
+        """用推荐器常驻的主题提取器对分词结果做主题分类，返回主题名（按得分降序）"""
+        themes = self.recommender.theme_extractor.classify_theme_tokens([[w for w in tokens if w.strip()]])[0]
+        return [t['theme'] for t in themes]
+    
+    def _extract_themes_from_lyrics(self, tokens: ListType[str]) -> ListType[str]:
+        """从歌词分词结果中提取主题"""
+        return self._classify_themes(tokens)[:3]  # 返回前3个主题
+    
+    def _extract_phrases(self, words: ListType[str]) -> ListType[str]:
+        """从分词结果中提取关键短语（2-3字组合）"""
         phrases = []
         
         # 提取2字短语
@@ -204,25 +325,15 @@ class RecommendationService:
         phrase_counter = Counter(phrases)
         return [p for p, _ in phrase_counter.most_common(5)]
     
-    def _calculate_keyword_similarity(self, keywords: ListType[str], lyrics: str) -> float:
+    def _calculate_keyword_similarity(self, keywords: ListType[str], tokens: ListType[str]) -> float:
         """计算关键词相似度"""
-        import jieba
-        lyrics_words = set(jieba.cut(lyrics))
+        lyrics_words = set(tokens)
         matched = sum(1 for kw in keywords if kw in lyrics_words)
         return matched / len(keywords) if keywords else 0.0
     
-    def _calculate_theme_similarity(self, themes: ListType[str], lyrics: str) -> float:
+    def _calculate_theme_similarity(self, themes: ListType[str], tokens: ListType[str]) -> float:
         """计算主题相似度"""
-        import sys
-        import os
-        backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        if backend_dir not in sys.path:
-            sys.path.insert(0, backend_dir)
-        
-        from nlp_engine.theme import ThemeExtractor
-        extractor = ThemeExtractor()
-        lyrics_themes = extractor.classify_theme(lyrics)
-        lyrics_theme_names = [t['theme'] for t in lyrics_themes]
+        lyrics_theme_names = self._classify_themes(tokens)
         
         matched = sum(1 for theme in themes if theme in lyrics_theme_names)
         return matched / len(themes) if themes else 0.0
@@ -239,21 +350,8 @@ class RecommendationService:
         
         return "、".join(reasons) if reasons else "基于歌词相似度的推荐"
     
-    def _calculate_similarity(self, lyrics1: str, lyrics2: str) -> float:
-        """计算两段歌词的相似度"""
-        import jieba
-        from collections import Counter
-        
-        # 分词
-        words1 = set(jieba.cut(lyrics1))
-        words2 = set(jieba.cut(lyrics2))
-        
-        # 过滤停用词
-        stopwords = {'的', '了', '在', '是', '我', '你', '他', '她', '它', '这', '那', '有', '和', '与', '或'}
-        words1 = {w for w in words1 if len(w) > 1 and w not in stopwords}
-        words2 = {w for w in words2 if len(w) > 1 and w not in stopwords}
-        
-        # 计算Jaccard相似度
+    def _calculate_similarity(self, words1: set, words2: set) -> float:
+        """计算两段歌词的相似度（内容词集合的Jaccard相似度）"""
         if not words1 or not words2:
             return 0.0
         
@@ -262,23 +360,15 @@ class RecommendationService:
         
         return intersection / union if union > 0 else 0.0
     
-    def _generate_explanation(self, query_lyrics: str, song_lyrics: str, keywords: ListType[str]) -> str:
-        """生成推荐理由"""
-        if keywords:
-            return f"基于关键词'{keywords[0]}'的推荐，歌词主题相似"
-        return "基于歌词内容和主题的相似度推荐"
-    
-    def _extract_keywords_from_lyrics(self, lyrics: str) -> ListType[str]:
-        """从歌词中提取关键词"""
-        import jieba
-        import jieba.analyse
-        
-        keywords = jieba.analyse.extract_tags(lyrics, topK=5, withWeight=False)
-        return keywords if keywords else []
+    def _extract_keywords_from_lyrics(self, tokens: ListType[str]) -> ListType[str]:
+        """从歌词分词结果中提取关键词（TF-IDF，使用推荐器主题提取器的IDF表）"""
+        keywords = self.recommender.theme_extractor.extract_keywords_tokens([tokens], top_k=5)[0]
+        return [k['word'] for k in keywords]
     
     def build_knowledge_graph(self, songs: List[Dict] = None) -> Dict:
         """构建知识图谱"""
         if songs is None:
+            self._check_catalog()
             songs = self.recommender.song_database
         
         graph = self.recommender.build_knowledge_graph(songs)
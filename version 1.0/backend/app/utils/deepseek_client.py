@@ -2,17 +2,19 @@
 DeepSeek API客户端
 用于高级歌词生成和优化
 """
-import requests
 import json
 import os
 from typing import List, Dict, Optional
 
+from app.utils.http_session import get_session, http_timeout
+
 class DeepSeekClient:
     """DeepSeek API客户端"""
     
     def __init__(self, api_key: str = None, api_url: str = None):
         self.api_key = api_key or os.environ.get('DEEPSEEK_API_KEY', '')
         self.api_url = api_url or os.environ.get('DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions')
+        self.timeout = http_timeout(float(os.environ.get('DEEPSEEK_READ_TIMEOUT', 30)))
     
     def generate_lyrics(self, prompt: str, style: str = None, theme: str = None, 
                        emotion: str = None, length: int = 16, 
@@ -24,7 +26,7 @@ class DeepSeekClient:
         messages = self._build_messages(prompt, style, theme, emotion, length, context, user_idea)
         
         try:
-            response = requests.post(
+            response = get_session().post(
                 self.api_url,
                 headers={
                     'Authorization': f'Bearer {self.api_key}',
@@ -36,7 +38,7 @@ class DeepSeekClient:
                     'temperature': 0.8,
                     'max_tokens': 2000
                 },
-                timeout=30
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
@@ -67,7 +69,7 @@ class DeepSeekClient:
 请直接输出转换后的完整歌词，不要添加任何解释或标记。"""
         
         try:
-            response = requests.post(
+            response = get_session().post(
                 self.api_url,
                 headers={
                     'Authorization': f'Bearer {self.api_key}',
@@ -82,7 +84,7 @@ class DeepSeekClient:
                     'temperature': 0.7,
                     'max_tokens': 2000
                 },
-                timeout=30
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
@@ -109,7 +111,7 @@ class DeepSeekClient:
 请根据用户的反馈，对歌词进行修改和完善。直接输出修改后的完整歌词，不要添加解释。"""
         
         try:
-            response = requests.post(
+            response = get_session().post(
                 self.api_url,
                 headers={
                     'Authorization': f'Bearer {self.api_key}',
@@ -124,7 +126,7 @@ class DeepSeekClient:
                     'temperature': 0.8,
                     'max_tokens': 2000
                 },
-                timeout=30
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
@@ -0,0 +1,53 @@
+"""
+共享HTTP会话
+DeepSeek和音乐平台客户端共用一个带连接池的requests.Session：同一主机的连接保持keep-alive复用，
+省去每次请求的TCP和TLS握手。会话在每个进程中首次使用时创建（fork出的worker各自重建），可在多线程中共用
+"""
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _create_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=int(os.environ.get('HTTP_POOL_CONNECTIONS', 10)),
+        pool_maxsize=int(os.environ.get('HTTP_POOL_MAXSIZE', 16)),
+        max_retries=0
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # 各请求之间互不影响：不保存服务器下发的Cookie
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session() -> requests.Session:
+    """获取当前进程共享的HTTP会话
+
+    - HTTP_POOL_CONNECTIONS: 缓存连接池的主机数
+    - HTTP_POOL_MAXSIZE: 每个主机保持的最大连接数（超出时临时新建连接，用完即关闭）
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _create_session()
+                _session_pid = pid
+    return _session
+
+
+def http_timeout(read: float, connect: Optional[float] = None) -> Tuple[float, float]:
+    """(连接超时, 读取超时)，连接超时默认为HTTP_CONNECT_TIMEOUT"""
+    if connect is None:
+        connect = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    return connect, read
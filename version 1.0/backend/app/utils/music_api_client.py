@@ -1,21 +1,235 @@
 """
 音乐平台API客户端
 支持QQ音乐和网易云音乐
+搜索、歌曲信息和歌词的响应经两级缓存（进程内LRU + 磁盘SQLite），命中时不发起网络请求
 """
 import requests
 import json
 import os
-from typing import List, Dict, Optional
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.utils.http_session import get_session, http_timeout
+from nlp_engine.utils.cache import LRUCache
+from nlp_engine.utils.paths import data_path
+
+# 各操作的缓存有效期（秒），None表示永不过期（同一首歌的歌词不会变化）
+OPERATION_TTLS = {
+    'search': 3600,
+    'song_info': 7 * 24 * 3600,
+    'lyrics': None
+}
+
+
+class ResponseCache:
+    """音乐平台响应的两级缓存
+    
+    - 第一级为进程内LRU，第二级为磁盘SQLite（多个worker共享，重启后保留）
+    - 每种操作单独设置TTL；请求失败或结果为空时按negative_ttl缓存，避免短时间内反复请求
+    - 值以JSON文本保存，每次读取得到新的对象，调用方修改结果不会影响缓存
+    """
+    
+    MISS = object()
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 5000,
+                 ttls: Dict[str, Optional[float]] = None, negative_ttl: float = 300):
+        self.path = path
+        self.memory = LRUCache(max_entries=max_entries)
+        self.ttls = dict(OPERATION_TTLS, **(ttls or {}))
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+    
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        """磁盘缓存连接（每个进程各自打开），不可用时返回None"""
+        if not self.path:
+            return None
+        pid = os.getpid()
+        if self._conn is None or self._pid != pid:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS responses '
+                             '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)')
+                conn.commit()
+            except (OSError, sqlite3.Error) as e:
+                print(f"音乐平台磁盘缓存不可用: {e}")
+                self.path = None
+                return None
+            self._conn, self._pid = conn, pid
+        return self._conn
+    
+    def get(self, operation: str, key: str):
+        """读取缓存，未命中或已过期时返回ResponseCache.MISS"""
+        cache_key = f"{operation}:{key}"
+        now = time.time()
+        entry = self.memory.get(cache_key)
+        if entry is not None and (entry[0] is None or entry[0] > now):
+            return self._hit(entry[1])
+        
+        with self._lock:
+            conn = self._connection()
+            row = None
+            if conn is not None:
+                try:
+                    row = conn.execute('SELECT value, expires FROM responses WHERE key = ?', (cache_key,)).fetchone()
+                except sqlite3.Error as e:
+                    print(f"读取音乐平台磁盘缓存失败: {e}")
+            if row is not None and (row[1] is None or row[1] > now):
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+                return self.MISS
+        self.memory.put(cache_key, (row[1], row[0]))
+        return self._hit(row[0])
+    
+    def _hit(self, text: str):
+        value = json.loads(text)
+        if not value:
+            with self._lock:
+                self.negative_hits += 1
+        return value
+    
+    def set(self, operation: str, key: str, value):
+        """写入缓存，空结果（None、空列表）按negative_ttl缓存"""
+        cache_key = f"{operation}:{key}"
+        ttl = self.ttls.get(operation) if value else self.negative_ttl
+        expires = None if ttl is None else time.time() + ttl
+        text = json.dumps(value, ensure_ascii=False)
+        self.memory.put(cache_key, (expires, text))
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?)', (cache_key, text, expires))
+                # 顺带清理已过期的条目
+                conn.execute('DELETE FROM responses WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"写入音乐平台磁盘缓存失败: {e}")
+    
+    def stats(self) -> Dict:
+        """缓存统计：内存命中、磁盘命中、未命中（需要请求网络）及其中空结果的命中次数"""
+        memory = self.memory.stats()
+        hits = memory['hits'] + self.disk_hits
+        total = hits + self.misses
+        return {
+            'memory': memory,
+            'disk_enabled': bool(self.path),
+            'disk_hits': self.disk_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0
+        }
+
+
+_shared_cache = None
+
+
+def get_music_cache() -> ResponseCache:
+    """获取进程内共享的音乐平台响应缓存（容量、路径和有效期由环境变量配置）"""
+    global _shared_cache
+    if _shared_cache is None:
+        path = os.environ.get('MUSIC_CACHE_PATH') or data_path('music_api_cache.db')
+        lyrics_ttl = float(os.environ.get('MUSIC_CACHE_TTL_LYRICS', 0))
+        _shared_cache = ResponseCache(
+            path=None if path.lower() == 'none' else path,
+            max_entries=int(os.environ.get('MUSIC_CACHE_MAX_ENTRIES', 5000)),
+            ttls={
+                'search': float(os.environ.get('MUSIC_CACHE_TTL_SEARCH', OPERATION_TTLS['search'])),
+                'song_info': float(os.environ.get('MUSIC_CACHE_TTL_SONG_INFO', OPERATION_TTLS['song_info'])),
+                'lyrics': lyrics_ttl or None
+            },
+            negative_ttl=float(os.environ.get('MUSIC_CACHE_NEGATIVE_TTL', 300))
+        )
+    return _shared_cache
+
+
+class HostLimiter:
+    """按主机限制同时进行的请求数，并保证同一主机相邻两次请求的最小间隔"""
+    
+    def __init__(self, max_concurrent: int = 4, min_interval: float = 0.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+    
+    def _semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrent)
+            return self._semaphores[host]
+    
+    @contextmanager
+    def slot(self, host: str):
+        """占用一个该主机的请求名额，需要时等待到最小间隔"""
+        with self._semaphore(host):
+            if self.min_interval > 0:
+                with self._lock:
+                    now = time.monotonic()
+                    start = max(now, self._next_start.get(host, now))
+                    self._next_start[host] = start + self.min_interval
+                if start > now:
+                    time.sleep(start - now)
+            yield
+
 
 class MusicAPIClient:
     """音乐平台API客户端"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[ResponseCache] = None):
         self.qq_music_key = os.environ.get('QQ_MUSIC_API_KEY', '')
         self.netease_music_key = os.environ.get('NETEASE_MUSIC_API_KEY', '')
+        if cache is None and os.environ.get('MUSIC_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off'):
+            cache = get_music_cache()
+        self.cache = cache
+        # 批量请求的并发数，以及对同一主机的并发上限和最小请求间隔（秒）
+        self.max_workers = int(os.environ.get('MUSIC_API_MAX_WORKERS', 8))
+        self.host_limiter = HostLimiter(int(os.environ.get('MUSIC_API_PER_HOST', 8)),
+                                        float(os.environ.get('MUSIC_API_HOST_INTERVAL', 0)))
+        self.timeout = http_timeout(float(os.environ.get('MUSIC_API_READ_TIMEOUT', 10)))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def _get(self, url: str, params: Dict = None) -> requests.Response:
+        """发起GET请求（复用共享会话的连接，受主机并发和间隔限制）"""
+        with self.host_limiter.slot(urlparse(url).netloc):
+            return get_session().get(url, params=params, timeout=self.timeout)
+    
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='music-api')
+            return self._pool
+    
+    def _cached(self, operation: str, key: str, fetch):
+        """先查缓存，未命中时请求平台并写入缓存"""
+        if self.cache is None:
+            return fetch()
+        value = self.cache.get(operation, key)
+        if value is ResponseCache.MISS:
+            value = fetch()
+            self.cache.set(operation, key, value)
+        return value
     
     def search_songs(self, keyword: str, platform: str = 'netease', limit: int = 10) -> List[Dict]:
         """搜索歌曲"""
+        return self._cached('search', f"{platform}:{limit}:{keyword}",
+                            lambda: self._search_songs(keyword, platform, limit))
+    
+    def _search_songs(self, keyword: str, platform: str, limit: int) -> List[Dict]:
         if platform == 'netease':
             return self._search_netease(keyword, limit)
         elif platform == 'qq':
@@ -25,6 +239,10 @@ class MusicAPIClient:
     
     def get_song_info(self, song_id: str, platform: str = 'netease') -> Optional[Dict]:
         """获取歌曲信息"""
+        return self._cached('song_info', f"{platform}:{song_id}",
+                            lambda: self._get_song_info(song_id, platform))
+    
+    def _get_song_info(self, song_id: str, platform: str) -> Optional[Dict]:
         if platform == 'netease':
             return self._get_netease_song_info(song_id)
         elif platform == 'qq':
@@ -34,6 +252,10 @@ class MusicAPIClient:
     
     def get_song_lyrics(self, song_id: str, platform: str = 'netease') -> Optional[str]:
         """获取歌词"""
+        return self._cached('lyrics', f"{platform}:{song_id}",
+                            lambda: self._get_song_lyrics(song_id, platform))
+    
+    def _get_song_lyrics(self, song_id: str, platform: str) -> Optional[str]:
         if platform == 'netease':
             return self._get_netease_lyrics(song_id)
         elif platform == 'qq':
@@ -41,6 +263,34 @@ class MusicAPIClient:
         else:
             return None
     
+    def get_song_lyrics_many(self, song_ids: Iterable[str], platform: str = 'netease',
+                             max_workers: int = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """并发获取多首歌的歌词，按完成先后逐个返回 (歌曲id, 歌词)
+        
+        同时进行的请求数不超过max_workers（默认MUSIC_API_MAX_WORKERS），且受每个主机的并发上限约束；
+        调用方可以在其余请求仍在进行时处理已返回的歌词。重复的id只请求一次。
+        """
+        song_ids = list(dict.fromkeys(song_ids))
+        if not song_ids:
+            return
+        max_workers = max_workers or self.max_workers
+        if max_workers >= self.max_workers:
+            executor, owned = self._executor(), False
+        else:
+            executor, owned = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='music-api'), True
+        try:
+            futures = {executor.submit(self.get_song_lyrics, song_id, platform): song_id for song_id in song_ids}
+            for future in as_completed(futures):
+                try:
+                    lyrics = future.result()
+                except Exception as e:
+                    print(f"获取歌词失败: {e}")
+                    lyrics = None
+                yield futures[future], lyrics
+        finally:
+            if owned:
+                executor.shutdown(wait=False)
+    
     def recommend_by_lyrics(self, lyrics: str, platform: str = 'netease', limit: int = 5) -> List[Dict]:
         """根据歌词推荐相似歌曲"""
         # 提取关键词
@@ -74,7 +324,7 @@ class MusicAPIClient:
                 'offset': 0
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('code') == 200 and 'result' in data:
@@ -124,7 +374,7 @@ class MusicAPIClient:
                 'needNewCode': 0
             }
             
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 if 'data' in data and 'song' in data['data']:
@@ -150,7 +400,7 @@ class MusicAPIClient:
             params = {
                 'ids': f'[{song_id}]'
             }
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 if data.get('code') == 200 and 'songs' in data:
@@ -181,7 +431,7 @@ class MusicAPIClient:
                 'lv': -1,
                 'tv': -1
             }
-            response = requests.get(url, params=params, timeout=10)
+            response = self._get(url, params=params)
             if response.status_code == 200:
                 data = response.json()
                 if 'lrc' in data and 'lyric' in data['lrc']:
@@ -16,6 +16,13 @@ class Config:
     # DeepSeek API配置
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
     DEEPSEEK_API_URL = os.environ.get('DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions')
+    # DeepSeek响应的读取超时（秒）
+    DEEPSEEK_READ_TIMEOUT = float(os.environ.get('DEEPSEEK_READ_TIMEOUT', 30))
+    
+    # 共享HTTP连接池：缓存连接池的主机数、每个主机保持的连接数，以及建立连接的超时（秒）
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 16))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
     
     # QQ音乐API配置（需要申请）
     QQ_MUSIC_API_KEY = os.environ.get('QQ_MUSIC_API_KEY', '')
@@ -24,9 +31,68 @@ class Config:
     # 网易云音乐API配置（需要申请）
     NETEASE_MUSIC_API_KEY = os.environ.get('NETEASE_MUSIC_API_KEY', '')
     NETEASE_MUSIC_API_URL = os.environ.get('NETEASE_MUSIC_API_URL', 'https://music.163.com')
+    # 推荐时并发搜索音乐平台的线程数
+    MUSIC_SEARCH_WORKERS = int(os.environ.get('MUSIC_SEARCH_WORKERS', 8))
+    # 关键短语的搜索是否与关键词、主题的搜索同时发出；默认只在前两类结果不足时补发，少调用两次平台接口
+    MUSIC_SEARCH_EAGER_PHRASES = os.environ.get('MUSIC_SEARCH_EAGER_PHRASES', 'false').lower() in ('1', 'true', 'yes', 'on')
+    # 音乐平台批量请求（如批量获取歌词）的并发数；对同一主机的并发上限和相邻请求的最小间隔（秒）
+    MUSIC_API_MAX_WORKERS = int(os.environ.get('MUSIC_API_MAX_WORKERS', 8))
+    MUSIC_API_PER_HOST = int(os.environ.get('MUSIC_API_PER_HOST', 8))
+    MUSIC_API_HOST_INTERVAL = float(os.environ.get('MUSIC_API_HOST_INTERVAL', 0))
+    # 音乐平台响应的读取超时（秒）
+    MUSIC_API_READ_TIMEOUT = float(os.environ.get('MUSIC_API_READ_TIMEOUT', 10))
+    # 音乐平台响应缓存（内存LRU + 磁盘SQLite）：搜索、歌曲信息、歌词的有效期（秒，歌词为0表示永不过期），
+    # 请求失败或结果为空时的缓存时间；MUSIC_CACHE_PATH为none时只使用内存缓存
+    MUSIC_CACHE_ENABLED = os.environ.get('MUSIC_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+    MUSIC_CACHE_PATH = os.environ.get('MUSIC_CACHE_PATH', '')
+    MUSIC_CACHE_MAX_ENTRIES = int(os.environ.get('MUSIC_CACHE_MAX_ENTRIES', 5000))
+    MUSIC_CACHE_TTL_SEARCH = float(os.environ.get('MUSIC_CACHE_TTL_SEARCH', 3600))
+    MUSIC_CACHE_TTL_SONG_INFO = float(os.environ.get('MUSIC_CACHE_TTL_SONG_INFO', 7 * 24 * 3600))
+    MUSIC_CACHE_TTL_LYRICS = float(os.environ.get('MUSIC_CACHE_TTL_LYRICS', 0))
+    MUSIC_CACHE_NEGATIVE_TTL = float(os.environ.get('MUSIC_CACHE_NEGATIVE_TTL', 300))
     
     # 情感分析配置
     SENTIMENT_MODEL = 'advanced'  # 'simple' 或 'advanced'
+    # 外部情感词典文件（多个文件用系统路径分隔符分隔）
+    EMOTION_LEXICON_PATHS = os.environ.get('EMOTION_LEXICON_PATHS', '')
+    # 逐句情感结果缓存（LRU，按条目数和估算内存限制）
+    SENTIMENT_CACHE_ENABLED = os.environ.get('SENTIMENT_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+    SENTIMENT_CACHE_MAX_ENTRIES = int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', 20000))
+    SENTIMENT_CACHE_MAX_BYTES = int(os.environ.get('SENTIMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # 模型预热：off（首次使用时加载）、background（后台线程预热）、blocking（启动时预热完成再服务）
+    NLP_WARMUP = os.environ.get('NLP_WARMUP', 'off')
+    # 启动时预热的资源（逗号分隔，all为全部），默认 jieba,jieba_analyse,sentiment_model,pinyin_table
+    NLP_WARMUP_RESOURCES = os.environ.get('NLP_WARMUP_RESOURCES', '')
+    # 就绪检查要求已加载的资源（逗号分隔），默认与启动时预热的资源相同（NLP_WARMUP为off时不要求任何资源）
+    NLP_READY_RESOURCES = os.environ.get('NLP_READY_RESOURCES', '')
+    
+    # NLP数据目录（语料IDF表、索引等），默认为项目根目录下的data
+    NLP_DATA_DIR = os.environ.get('NLP_DATA_DIR', '')
+    # 歌词语料IDF表前缀（由 python -m nlp_engine.theme.idf fit 生成），默认 data/lyrics_idf
+    LYRICS_IDF_PATH = os.environ.get('LYRICS_IDF_PATH', '')
+    # 拼音韵母查找表前缀（首次使用时自动生成，也可用 python -m nlp_engine.rhythm.pinyin_table 预先生成），默认 data/pinyin_table
+    PINYIN_TABLE_PATH = os.environ.get('PINYIN_TABLE_PATH', '')
+    # 押韵词典索引前缀（须由 python -m nlp_engine.rhythm.rhyme_index 预先生成，缺失时押韵优化退回常用同韵字），默认 data/rhyme_index
+    RHYME_INDEX_PATH = os.environ.get('RHYME_INDEX_PATH', '')
+    
+    # 推荐近似最近邻检索：曲库达到该规模后启用IVF索引；NPROBE为扫描的簇数，SHORTLIST为精确重排的候选数（越大召回越高、越慢）
+    RECOMMENDER_ANN_MIN_SONGS = int(os.environ.get('RECOMMENDER_ANN_MIN_SONGS', 5000))
+    RECOMMENDER_ANN_NPROBE = int(os.environ.get('RECOMMENDER_ANN_NPROBE', 8))
+    RECOMMENDER_ANN_SHORTLIST = int(os.environ.get('RECOMMENDER_ANN_SHORTLIST', 200))
+    # 持久化曲库根目录（SQLite歌曲表 + mmap特征文件，按版本存放，CURRENT指向当前版本），默认 data/catalog
+    CATALOG_DIR = os.environ.get('CATALOG_DIR', '')
+    # 曲库版本检查间隔（秒），其他进程完成入库后各worker在该间隔内切换到新版本
+    CATALOG_CHECK_INTERVAL = float(os.environ.get('CATALOG_CHECK_INTERVAL', 10))
+    # 旧曲库版本被替换后至少保留的秒数（须大于检查间隔，仍在使用旧版本的进程在此期间切换）
+    CATALOG_RETAIN_SECONDS = float(os.environ.get('CATALOG_RETAIN_SECONDS', 600))
+    # 批量入库：特征提取进程数（0为CPU核数）和每块歌曲数
+    CATALOG_INGEST_WORKERS = int(os.environ.get('CATALOG_INGEST_WORKERS', 0))
+    CATALOG_INGEST_CHUNK_SIZE = int(os.environ.get('CATALOG_INGEST_CHUNK_SIZE', 1000))
+    # 管理接口上传导入文件的大小上限（字节，0为不限），超过时返回413
+    CATALOG_UPLOAD_MAX_BYTES = int(os.environ.get('CATALOG_UPLOAD_MAX_BYTES', 500 * 1024 * 1024))
+    # 管理接口令牌（请求头X-Admin-Token），为空时管理接口不可用
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
     
     # 生成配置
     DEFAULT_LYRIC_LENGTH = 16  # 默认歌词行数
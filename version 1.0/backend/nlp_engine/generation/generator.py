@@ -3,10 +3,16 @@
 智能歌词生成、上下文感知建议、风格转换
 """
 import random
+import re
 import jieba
 from typing import List, Dict, Optional
 from ..theme.extractor import ThemeExtractor
 from ..sentiment.analyzer import SentimentAnalyzer
+from ..rhythm.pinyin_table import get_pinyin_table
+from ..rhythm.rhyme_index import get_rhyme_index
+
+# 句末的标点和空白（不参与押韵和分词）
+TRAILING_PUNCTUATION = re.compile(r'[\W_]+$')
 
 
 class LyricsGenerator:
@@ -106,19 +112,67 @@ class LyricsGenerator:
         }
     
     def optimize_rhyme(self, line: str, target_rhyme: str) -> List[str]:
-        """押韵优化建议"""
-        # 获取同韵词建议（简化版）
-        suggestions = []
-        
-        # 这里应该使用韵母词典，简化处理
-        rhyme_words = self._get_rhyme_words(target_rhyme)
-        
-        for word in rhyme_words[:5]:
-            # 替换最后一个字
-            new_line = line[:-1] + word
-            suggestions.append(new_line)
+        """押韵优化建议：把句末的词换成同韵、同字数的词"""
+        return self.get_rhyme_candidates(line, target_rhyme, limit=10)['suggestions']
+    
+    def get_rhyme_candidates(self, line: str, target_rhyme: str, limit: int = 50) -> Dict:
+        """查询押韵词典索引，返回同韵词、多音节押韵词和替换后的句子
+        
+        target_rhyme可以是韵母（如ang）或汉字（取其读音）。
+        - rhyme_words: 与句末词字数相同的同韵词（韵母相同的优先，再补充同韵组的词）
+        - multi_syllable: 末两字都押韵的词（倒数第二字与原句倒数第二字同韵组）
+        """
+        empty = {'rhyme_words': [], 'multi_syllable': [], 'suggestions': []}
+        line = line.strip()
+        # 句末标点和空白先去掉，替换句末的词之后再加回
+        body = TRAILING_PUNCTUATION.sub('', line)
+        tail = line[len(body):]
+        if not body:
+            return empty
+        words = [w for w in jieba.cut(body) if w.strip()]
+        last_word = words[-1] if words else body[-1:]
+        prefix = body[:len(body) - len(last_word)]
+        
+        index, target = None, None
+        try:
+            index = get_rhyme_index()
+            target = index.resolve(target_rhyme)
+        except Exception as e:
+            print(f"押韵索引加载失败: {e}")
+        
+        if index is None:
+            # 索引不可用时退回常用同韵字
+            rhyme_words = [w for w in self._get_rhyme_words(target_rhyme) if w != body[-1:]]
+            return {
+                'rhyme_words': rhyme_words,
+                'multi_syllable': [],
+                'suggestions': [body[:-1] + w + tail for w in rhyme_words[:5]]
+            }
+        if target is None:
+            # 无法识别的目标韵
+            return empty
+        
+        found = index.candidates(target['group'], final=target['final'], length=len(last_word),
+                                 limit=limit, exclude=last_word)
+        if len(found) < limit and target['final'] is not None:
+            seen = {c['word'] for c in found}
+            found += [c for c in index.candidates(target['group'], length=len(last_word),
+                                                  limit=limit + len(seen), exclude=last_word)
+                      if c['word'] not in seen][:limit - len(found)]
+        rhyme_words = [c['word'] for c in found]
+        
+        multi_syllable = []
+        if len(body) >= 2:
+            prev_group = get_pinyin_table().group_of(body[-2])
+            if prev_group >= 0:
+                multi_syllable = [c['word'] for c in index.candidates(target['group'], prev_group=prev_group,
+                                                                      limit=limit, exclude=last_word)]
         
-        return suggestions
+        return {
+            'rhyme_words': rhyme_words,
+            'multi_syllable': multi_syllable,
+            'suggestions': [prefix + w + tail for w in rhyme_words[:limit]]
+        }
     
     def convert_style(self, lyrics: str, target_style: str) -> str:
         """风格转换"""
@@ -183,14 +237,13 @@ class LyricsGenerator:
         return random.choice(lines)
     
     def _get_rhyme_words(self, rhyme: str) -> List[str]:
-        """获取同韵字（简化版）"""
-        # 实际应使用韵母词典
+        """获取常用同韵字（押韵词典索引不可用时的备用方案）"""
         common_rhymes = {
             'a': ['啊', '他', '她', '它', '那', '大', '家'],
             'i': ['你', '里', '起', '地', '意', '气', '力'],
             'u': ['路', '处', '度', '苦', '数', '树', '住']
         }
-        return common_rhymes.get(rhyme, ['的', '了', '在', '是', '有'])
+        return common_rhymes.get(rhyme, [])
 
 
 
@@ -1,6 +1,9 @@
 from .recommender import MusicRecommender
+from .tfidf_index import TfidfIndex
+from .ann import IVFIndex
+from .catalog import CatalogStore
 
-__all__ = ['MusicRecommender']
+__all__ = ['MusicRecommender', 'TfidfIndex', 'IVFIndex', 'CatalogStore']
 
 
 
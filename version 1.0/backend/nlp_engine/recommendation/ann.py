@@ -0,0 +1,138 @@
+"""
+近似最近邻索引
+倒排文件（IVF）索引：用球面k-means把向量分成若干簇，查询时只扫描与查询最接近的几个簇，
+返回候选后由调用方精确重排。纯NumPy实现，可保存到磁盘并以mmap方式加载
+"""
+import json
+from typing import Tuple
+
+import numpy as np
+
+from ..utils.paths import atomic_files
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFIndex:
+    """IVF内积索引
+
+    - n_lists: 簇数（默认约为sqrt(向量数)）
+    - n_probe: 查询时扫描的簇数，越大召回率越高、耗时越长
+    向量按所属簇连续存放，每个簇的扫描是一次连续内存上的矩阵-向量乘法。
+    """
+
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, ids: np.ndarray,
+                 offsets: np.ndarray, n_probe: int = 8):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.n_probe = n_probe
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    # ---------- 构建 / 保存 / 加载 ----------
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: int = None, n_probe: int = 8, n_iter: int = 10,
+              sample_size: int = 50000, seed: int = 0) -> 'IVFIndex':
+        """在（采样的）向量上训练球面k-means，再把全部向量分配到最近的簇"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("不能为空向量集构建索引")
+        n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+
+        sample = vectors[rng.choice(n, size=min(sample_size, n), replace=False)]
+        unit_sample = _normalize(sample)
+        centroids = unit_sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = cls._assign(unit_sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, unit_sample)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # 空簇重新取随机样本作为中心
+                sums[empty] = unit_sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = _normalize(sums).astype(np.float32)
+
+        assign = cls._assign(_normalize(vectors), centroids)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1)).astype(np.int64)
+        return cls(centroids, vectors[order], order.astype(np.int64), offsets, n_probe)
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        """分块计算每个向量最接近的簇，避免一次性生成 向量数×簇数 的大矩阵"""
+        assign = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assign[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return assign
+
+    def save(self, prefix: str):
+        """保存为 <prefix>.json 和各数组的.npy文件（先写临时文件再替换）"""
+        arrays = {'centroids': self.centroids, 'vectors': self.vectors, 'ids': self.ids, 'offsets': self.offsets}
+        meta = {'n_probe': self.n_probe, 'n_lists': self.n_lists, 'count': len(self),
+                'dim': int(self.vectors.shape[1])}
+        paths = [f"{prefix}.{name}.npy" for name in arrays] + [prefix + '.json']
+        with atomic_files(*paths) as tmp_paths:
+            for array, tmp in zip(arrays.values(), tmp_paths):
+                with open(tmp, 'wb') as f:
+                    np.save(f, np.asarray(array))
+            with open(tmp_paths[-1], 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> 'IVFIndex':
+        """加载索引，向量以只读mmap映射"""
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        mode = 'r' if mmap else None
+        index = cls(np.load(prefix + '.centroids.npy'),
+                    np.load(prefix + '.vectors.npy', mmap_mode=mode),
+                    np.load(prefix + '.ids.npy', mmap_mode=mode),
+                    np.load(prefix + '.offsets.npy'),
+                    meta.get('n_probe', 8))
+        if len(index) != meta['count'] or index.offsets[-1] != meta['count']:
+            raise ValueError(f"ANN索引损坏: {prefix}")
+        return index
+
+    # ---------- 查询 ----------
+
+    def search(self, query: np.ndarray, k: int, n_probe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """返回内积最大的k个向量的 (原始编号, 内积)，按内积降序"""
+        n_probe = max(1, min(n_probe or self.n_probe, self.n_lists))
+        query = np.asarray(query, dtype=np.float32).ravel()
+        centroid_scores = self.centroids @ _normalize(query)
+        if n_probe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probe = np.arange(self.n_lists)
+
+        ids, scores = [], []
+        for c in probe:
+            start, end = int(self.offsets[c]), int(self.offsets[c + 1])
+            if start == end:
+                continue
+            scores.append(np.asarray(self.vectors[start:end]) @ query)
+            ids.append(np.asarray(self.ids[start:end]))
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+
+        if k < len(ids):
+            top = np.argpartition(-scores, k - 1)[:k]
+            ids, scores = ids[top], scores[top]
+        order = np.lexsort((ids, -scores))
+        return ids[order], scores[order]
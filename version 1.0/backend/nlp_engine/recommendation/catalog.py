@@ -0,0 +1,378 @@
+"""
+持久化曲库
+歌曲元数据存放在SQLite表中，逐首预计算的特征（主题得分、情感、TF-IDF矩阵、ANN索引）存成.npy文件，
+加载时以只读mmap映射，多个worker进程共享同一份页缓存，启动时无需重新分析歌词
+
+目录结构（每次写入生成一个新的版本目录，CURRENT文件记录当前版本，整体原子切换）：
+    <root>/CURRENT              当前版本目录名
+    <root>/LOCK                 入库写锁
+    <root>/<version>/songs.db   歌曲表，行号与特征数组的行一致
+    <root>/<version>/features.* 主题得分、主题排名、情感得分、情感基调、押韵概况
+    <root>/<version>/tfidf.*    曲库TF-IDF索引
+    <root>/<version>/ann.*      IVF近似最近邻索引（曲库较大时）
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from ..utils.paths import atomic_files, data_path
+
+SQL_BATCH = 500  # 按行号批量查询时每条SQL的参数个数上限
+SONG_FIELDS = ('song_id', 'title', 'artist', 'theme', 'style')  # 可单独查询的元数据列
+
+
+def write_song_table(path: str, songs: Iterable[Dict]):
+    """把歌曲按顺序写入新的SQLite文件（行号从0开始），写完后替换目标文件"""
+    with atomic_files(path) as (tmp,):
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.execute('CREATE TABLE songs ('
+                         'row INTEGER PRIMARY KEY, song_id TEXT, title TEXT, artist TEXT, '
+                         'theme TEXT, style TEXT, data TEXT NOT NULL)')
+            conn.executemany('INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                (row, None if song.get('id') is None else str(song['id']), song.get('title'), song.get('artist'),
+                 song.get('theme'), song.get('style'), json.dumps(song, ensure_ascii=False, default=str))
+                for row, song in enumerate(songs)))
+            conn.execute('CREATE INDEX idx_songs_song_id ON songs (song_id)')
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class SongTable:
+    """只读的歌曲表，按行号读取
+
+    连接在首次查询时打开，fork之后的子进程会重新打开自己的连接。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._count = self._connection().execute('SELECT COUNT(*) FROM songs').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        if self._conn is None or self._pid != pid:
+            uri = 'file:' + quote(os.path.abspath(self.path)) + '?mode=ro'
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._pid = pid
+        return self._conn
+
+    def get_many(self, rows: Iterable[int]) -> List[Dict]:
+        """按行号批量读取歌曲，返回顺序与rows一致"""
+        rows = [int(row) for row in rows]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            unique = sorted(set(rows))
+            for start in range(0, len(unique), SQL_BATCH):
+                batch = unique[start:start + SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                for row, data in conn.execute(f'SELECT row, data FROM songs WHERE row IN ({placeholders})', batch):
+                    found[row] = data
+        return [json.loads(found[row]) for row in rows]
+
+    def get_fields(self, rows: Iterable[int], field: str) -> List:
+        """按行号批量读取某一元数据列（不解析整首歌曲）"""
+        if field not in SONG_FIELDS:
+            raise ValueError(f"不支持的歌曲字段: {field}")
+        rows = [int(row) for row in rows]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            unique = sorted(set(rows))
+            for start in range(0, len(unique), SQL_BATCH):
+                batch = unique[start:start + SQL_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                found.update(conn.execute(f'SELECT row, {field} FROM songs WHERE row IN ({placeholders})', batch))
+        return [found[row] for row in rows]
+
+    def find_row(self, song: Dict) -> Optional[int]:
+        """按歌曲id查找行号（内容须完全一致）"""
+        if song.get('id') is None:
+            return None
+        with self._lock:
+            matches = self._connection().execute('SELECT row, data FROM songs WHERE song_id = ?',
+                                                 (str(song['id']),)).fetchall()
+        for row, data in matches:
+            if json.loads(data) == song:
+                return row
+        return None
+
+    def __iter__(self) -> Iterator[Dict]:
+        for start in range(0, self._count, SQL_BATCH):
+            yield from self.get_many(range(start, min(start + SQL_BATCH, self._count)))
+
+
+class SongList:
+    """曲库歌曲序列：磁盘上的歌曲表加上之后在内存中新增的歌曲，用法与列表相同"""
+
+    def __init__(self, table: SongTable = None):
+        self.table = table
+        self._base = len(table) if table is not None else 0
+        self._added: List[Dict] = []
+        self._added_rows: Dict[int, int] = {}  # id(歌曲) -> 行号
+
+    def __len__(self) -> int:
+        return self._base + len(self._added)
+
+    def __getitem__(self, row: int) -> Dict:
+        return self.get_many([row])[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        if self.table is not None:
+            yield from self.table
+        yield from self._added
+
+    def append(self, song: Dict):
+        self._added_rows[id(song)] = len(self)
+        self._added.append(song)
+
+    def get_many(self, rows: Iterable[int]) -> List[Dict]:
+        """按行号批量取歌曲（磁盘上的部分一次查询）"""
+        rows = [int(row) for row in rows]
+        n = len(self)
+        if any(row < 0 or row >= n for row in rows):
+            raise IndexError("歌曲行号超出范围")
+        stored = [row for row in rows if row < self._base]
+        loaded = dict(zip(stored, self.table.get_many(stored))) if stored else {}
+        return [loaded[row] if row < self._base else self._added[row - self._base] for row in rows]
+
+    def get_fields(self, rows: Iterable[int], field: str) -> List:
+        """按行号批量取歌曲的theme、style等字段（磁盘上的部分只读该列）"""
+        rows = [int(row) for row in rows]
+        stored = [row for row in rows if row < self._base]
+        loaded = dict(zip(stored, self.table.get_fields(stored, field))) if stored else {}
+        key = 'id' if field == 'song_id' else field
+        return [loaded[row] if row < self._base else self._added[row - self._base].get(key) for row in rows]
+
+    def index_of(self, song: Dict) -> Optional[int]:
+        """歌曲在曲库中的行号，不在曲库中时返回None"""
+        row = self._added_rows.get(id(song))
+        if row is not None and self._added[row - self._base] is song:
+            return row
+        if self.table is not None:
+            return self.table.find_row(song)
+        return None
+
+
+class FeatureList:
+    """与SongList一一对应的特征序列：磁盘上的特征数组（只读mmap）加上内存中新增的特征
+
+    按行读取时还原为extract_features的结果格式；主题顺序与ThemeExtractor.EXTENDED_THEMES一致。
+    """
+
+    def __init__(self, theme_order: List[str], arrays: Dict[str, np.ndarray] = None, tones: List[str] = None):
+        self.theme_order = list(theme_order)
+        self._theme_columns = {theme: i for i, theme in enumerate(self.theme_order)}
+        self.arrays = arrays
+        self.tones = tones or []
+        self._base = len(arrays['sentiment_scores']) if arrays else 0
+        self._added: List[Dict] = []
+
+    def __len__(self) -> int:
+        return self._base + len(self._added)
+
+    def __getitem__(self, row: int) -> Dict:
+        row = int(row)
+        if row >= self._base:
+            return self._added[row - self._base]
+        scores = np.asarray(self.arrays['theme_scores'][row], dtype=np.float64)
+        ranks = np.asarray(self.arrays['theme_ranks'][row])
+        hit = np.flatnonzero(ranks >= 0)
+        ordered = hit[np.argsort(ranks[hit], kind='stable')]
+        themes = [{'theme': self.theme_order[t], 'score': float(scores[t])} for t in ordered]
+        return {
+            'themes': themes,
+            'theme_names': {t['theme'] for t in themes},
+            'theme_vector': scores,
+            'sentiment_score': float(self.arrays['sentiment_scores'][row]),
+            'sentiment_tone': self.tones[int(self.arrays['sentiment_tones'][row])],
+            'rhyme_group': int(self.arrays['rhyme_groups'][row]),
+            'rhyme_ratio': float(self.arrays['rhyme_ratios'][row])
+        }
+
+    def append(self, features: Dict):
+        self._added.append(features)
+
+    def _gather(self, name: str, rows, extract, dtype, width: int = None) -> np.ndarray:
+        """按行号取某项特征组成数组：磁盘上的行直接索引数组，新增的行用extract从特征字典中取"""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        out = np.empty((len(rows),) if width is None else (len(rows), width), dtype=dtype)
+        stored = rows < self._base
+        if stored.any():
+            out[stored] = self.arrays[name][rows[stored]]
+        if not stored.all():
+            out[~stored] = [extract(self._added[row - self._base]) for row in rows[~stored]]
+        return out
+
+    def theme_matrix(self, rows=None) -> np.ndarray:
+        """主题得分矩阵（行数 × 主题数），rows为None时为全部歌曲"""
+        return self._gather('theme_scores', rows, lambda f: f['theme_vector'], np.float64, len(self.theme_order))
+
+    def theme_indicators(self, rows=None) -> np.ndarray:
+        """主题是否命中的0/1矩阵（行数 × 主题数）"""
+        ranks = self._gather('theme_ranks', rows, self._ranks_of, np.int8, len(self.theme_order))
+        return (ranks >= 0).astype(np.float64)
+
+    def _ranks_of(self, features: Dict) -> np.ndarray:
+        """特征字典中各主题的排名，未命中为-1"""
+        ranks = np.full(len(self.theme_order), -1, dtype=np.int8)
+        for rank, t in enumerate(features['themes']):
+            ranks[self._theme_columns[t['theme']]] = rank
+        return ranks
+
+    def sentiment_scores(self, rows=None) -> np.ndarray:
+        """情感得分"""
+        return self._gather('sentiment_scores', rows, lambda f: f['sentiment_score'], np.float64)
+
+    def save(self, prefix: str):
+        """保存为 <prefix>.json 和各数组的.npy文件（先写临时文件再替换）"""
+        tone_codes = {tone: i for i, tone in enumerate(self.tones)}
+        ranks = np.array([self._ranks_of(f) for f in self._added], dtype=np.int8).reshape(-1, len(self.theme_order))
+        added_tones = np.array([tone_codes.setdefault(f['sentiment_tone'], len(tone_codes)) for f in self._added],
+                               dtype=np.int16)
+        tones = list(tone_codes)
+        added_rhyme_groups = np.array([f.get('rhyme_group', -1) for f in self._added], dtype=np.int16)
+        added_rhyme_ratios = np.array([f.get('rhyme_ratio', 0.0) for f in self._added], dtype=np.float64)
+        arrays = {
+            'theme_scores': self.theme_matrix(),
+            'theme_ranks': ranks,
+            'sentiment_scores': self.sentiment_scores(),
+            'sentiment_tones': added_tones,
+            'rhyme_groups': added_rhyme_groups,
+            'rhyme_ratios': added_rhyme_ratios
+        }
+        if self._base:
+            arrays['theme_ranks'] = np.vstack([np.asarray(self.arrays['theme_ranks']), ranks])
+            for name in ('sentiment_tones', 'rhyme_groups', 'rhyme_ratios'):
+                arrays[name] = np.concatenate([np.asarray(self.arrays[name]), arrays[name]])
+
+        paths = [f"{prefix}.{name}.npy" for name in arrays] + [prefix + '.json']
+        with atomic_files(*paths) as tmp_paths:
+            for array, tmp in zip(arrays.values(), tmp_paths):
+                with open(tmp, 'wb') as f:
+                    np.save(f, array)
+            with open(tmp_paths[-1], 'w', encoding='utf-8') as f:
+                json.dump({'count': len(self), 'themes': self.theme_order, 'tones': tones}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str, theme_order: List[str], mmap: bool = True) -> 'FeatureList':
+        """加载特征数组（只读mmap）；主题库与保存时不一致时抛出ValueError，需要重新入库"""
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['themes'] != list(theme_order):
+            raise ValueError("曲库特征的主题库与当前主题库不一致，需要重新生成曲库")
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(f"{prefix}.{name}.npy", mmap_mode=mode)
+                  for name in ('theme_scores', 'theme_ranks', 'sentiment_scores', 'sentiment_tones')}
+        # 早期版本的曲库没有押韵概况
+        for name, fill, dtype in (('rhyme_groups', -1, np.int16), ('rhyme_ratios', 0.0, np.float64)):
+            path = f"{prefix}.{name}.npy"
+            arrays[name] = np.load(path, mmap_mode=mode) if os.path.exists(path) else \
+                np.full(meta['count'], fill, dtype=dtype)
+        if any(len(array) != meta['count'] for array in arrays.values()):
+            raise ValueError(f"曲库特征损坏: {prefix}")
+        return cls(theme_order, arrays if meta['count'] else None, meta['tones'])
+
+
+class CatalogStore:
+    """曲库版本目录管理
+
+    新版本写入独立目录，完成后原子替换CURRENT指针；旧版本保留KEEP_VERSIONS个，
+    更早的版本被替换retain_seconds秒后才删除，仍在使用它的进程有时间发现新版本并切换。
+    """
+
+    KEEP_VERSIONS = 3
+
+    def __init__(self, root: str = None, retain_seconds: float = None):
+        self.root = root or os.environ.get('CATALOG_DIR') or data_path('catalog')
+        if retain_seconds is None:
+            retain_seconds = float(os.environ.get('CATALOG_RETAIN_SECONDS', 600))
+        self.retain_seconds = retain_seconds
+
+    def current(self) -> Optional[str]:
+        """当前版本目录，没有时返回None"""
+        try:
+            with open(os.path.join(self.root, 'CURRENT'), 'r', encoding='utf-8') as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(self.root, name)
+        return path if name and os.path.isdir(path) else None
+
+    @contextmanager
+    def write_lock(self):
+        """曲库写锁（跨进程独占）：入库从读取当前版本到发布新版本期间持有，同时进行的入库依次合并，不会丢失歌曲"""
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, 'LOCK'), 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK重试10秒后仍未拿到锁
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def new_version(self) -> str:
+        """创建新的版本目录"""
+        path = os.path.join(self.root, datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+        os.makedirs(path)
+        return path
+
+    def publish(self, path: str):
+        """把版本目录设为当前版本"""
+        name = os.path.basename(os.path.normpath(path))
+        os.utime(path)  # 版本目录的修改时间记为发布时间
+        with atomic_files(os.path.join(self.root, 'CURRENT')) as (tmp,):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(name)
+        self._cleanup(name)
+
+    def _cleanup(self, current: str):
+        """删除多余的旧版本：最近的KEEP_VERSIONS个之外，被下一个版本替换超过retain_seconds秒的才删除"""
+        # 版本目录以时间戳命名，入库检查点等其他目录不参与清理
+        versions = sorted(name for name in os.listdir(self.root)
+                          if name[:1].isdigit() and os.path.isdir(os.path.join(self.root, name)))
+        now = time.time()
+        for name, successor in zip(versions[:-self.KEEP_VERSIONS], versions[1:]):
+            if name == current:
+                continue
+            try:
+                replaced_at = os.path.getmtime(os.path.join(self.root, successor))
+            except OSError:
+                continue
+            if now - replaced_at >= self.retain_seconds:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
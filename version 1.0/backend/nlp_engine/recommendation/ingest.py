@@ -0,0 +1,223 @@
+"""
+曲库批量入库
+读取NDJSON或CSV格式的歌曲（每首须有lyrics字段，其余字段原样保存），在进程池中分块提取特征
+（分词、主题、情感、押韵概况），汇总时统一拟合TF-IDF并建立ANN索引，写成新的曲库版本后原子切换。
+每块的结果写入检查点文件，中断后用相同的输入和块大小重新执行会跳过已完成的块。
+
+命令行：
+    python -m nlp_engine.recommendation.ingest songs.jsonl [--replace] [--workers 8] [--chunk-size 1000]
+    python -m nlp_engine.recommendation.ingest --sample    # 还没有曲库时生成只含示例歌曲的初始曲库
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from ..utils.paths import atomic_files
+from .catalog import CatalogStore
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# 初始曲库的示例歌曲
+SAMPLE_SONGS = [
+    {
+        'id': 1,
+        'title': '爱情故事',
+        'artist': '示例歌手A',
+        'lyrics': '我爱你\n就像爱春天\n你是我心中的\n最美的风景',
+        'theme': '爱情',
+        'style': '流行'
+    },
+    {
+        'id': 2,
+        'title': '追梦人',
+        'artist': '示例歌手B',
+        'lyrics': '追逐梦想\n永不放弃\n坚持到底\n成功在望',
+        'theme': '励志',
+        'style': '摇滚'
+    },
+    {
+        'id': 3,
+        'title': '回忆',
+        'artist': '示例歌手C',
+        'lyrics': '回忆过去\n那些美好时光\n青春岁月\n永远难忘',
+        'theme': '怀旧',
+        'style': '抒情'
+    }
+]
+
+_worker_recommender = None  # 每个工作进程各自的特征提取器
+
+
+def read_songs(path: str) -> List[Dict]:
+    """读取歌曲文件：.csv按表头解析，其他扩展名按NDJSON（每行一个JSON对象）解析
+
+    没有歌词的记录跳过。
+    """
+    songs = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for record in records:
+            if isinstance(record, dict) and (record.get('lyrics') or '').strip():
+                songs.append(record)
+    return songs
+
+
+def _init_worker():
+    global _worker_recommender
+    from .recommender import MusicRecommender
+    _worker_recommender = MusicRecommender()
+
+
+def _extract_chunk(lyrics_list: List[str]):
+    return _worker_recommender._extract_features_tokens(lyrics_list)
+
+
+def _fingerprint(songs: List[Dict], chunk_size: int, replace: bool) -> str:
+    """输入内容和分块参数的摘要，用作检查点目录名"""
+    digest = hashlib.sha1(f"{chunk_size}:{replace}".encode('utf-8'))
+    for song in songs:
+        digest.update(json.dumps(song, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()[:16]
+
+
+def _save_checkpoint(path: str, result):
+    with atomic_files(path) as (tmp,):
+        with open(tmp, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def ingest_songs(songs: List[Dict], store: CatalogStore = None, replace: bool = False, workers: int = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint_dir: str = None,
+                 progress: Callable[[int, int], None] = None) -> Dict:
+    """批量入库，返回入库统计
+
+    - replace: 为True时新曲库只包含本次的歌曲，否则追加到当前曲库之后
+    - workers: 特征提取的进程数，默认为CPU核数；为1时在当前进程中计算
+    - checkpoint_dir: 检查点目录，默认按输入内容摘要放在曲库根目录下，成功后删除
+    - progress: 每完成一块调用一次 progress(已完成块数, 总块数)
+    """
+    from .recommender import MusicRecommender
+    if not songs:
+        raise ValueError("没有可导入的歌曲（每首歌须有lyrics字段）")
+    store = store or CatalogStore()
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, chunk_size)
+    started = time.time()
+
+    chunks = [songs[start:start + chunk_size] for start in range(0, len(songs), chunk_size)]
+    checkpoint_dir = checkpoint_dir or os.path.join(store.root, 'ingest-' + _fingerprint(songs, chunk_size, replace))
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    paths = [os.path.join(checkpoint_dir, f"chunk-{i:06d}.pkl") for i in range(len(chunks))]
+    pending = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+    resumed = len(chunks) - len(pending)
+    done = resumed
+    if progress:
+        progress(done, len(chunks))
+
+    def lyrics_of(i):
+        return [song.get('lyrics', '') for song in chunks[i]]
+
+    if pending and workers <= 1:
+        _init_worker()
+        for i in pending:
+            _save_checkpoint(paths[i], _extract_chunk(lyrics_of(i)))
+            done += 1
+            if progress:
+                progress(done, len(chunks))
+    elif pending:
+        # spawn启动工作进程，避免在多线程的Web服务进程中fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            queue = iter(pending)
+            running = {}
+            # 同时提交的块数有上限，已完成的块及时写入检查点并释放内存
+            for i in queue:
+                running[executor.submit(_extract_chunk, lyrics_of(i))] = i
+                if len(running) >= workers * 2:
+                    break
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    _save_checkpoint(paths[i], future.result())
+                    done += 1
+                    if progress:
+                        progress(done, len(chunks))
+                    next_i = next(queue, None)
+                    if next_i is not None:
+                        running[executor.submit(_extract_chunk, lyrics_of(next_i))] = next_i
+
+    # 汇总：在当前曲库（mmap）基础上追加，重新拟合TF-IDF后写成新版本
+    # 持有写锁直到发布，其他进程同时入库时在此等待，之后基于本次发布的版本追加
+    with store.write_lock():
+        recommender = MusicRecommender()
+        current = store.current()
+        if current and not replace:
+            recommender.load_catalog(current)
+        for chunk, path in zip(chunks, paths):
+            with open(path, 'rb') as f:
+                features, token_lists = pickle.load(f)
+            recommender.add_songs_with_features(chunk, features, token_lists)
+        recommender.text_index.refit()
+        recommender.ann_index = None  # 按新曲库重建
+
+        version = store.new_version()
+        recommender.save_catalog(version)
+        store.publish(version)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    return {
+        'version': os.path.basename(version),
+        'added': len(songs),
+        'total': len(recommender.song_database),
+        'chunks': len(chunks),
+        'resumed_chunks': resumed,
+        'seconds': round(time.time() - started, 1)
+    }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='批量导入歌曲到推荐曲库')
+    parser.add_argument('path', nargs='?', help='NDJSON或CSV文件，每首歌须有lyrics字段')
+    parser.add_argument('--sample', action='store_true',
+                        help='导入示例歌曲；只指定--sample且曲库已存在时（除非同时指定--replace）不做任何事，可在部署时重复执行')
+    parser.add_argument('--catalog-dir', help='曲库根目录，默认为CATALOG_DIR或data/catalog')
+    parser.add_argument('--replace', action='store_true', help='替换整个曲库（默认追加）')
+    parser.add_argument('--workers', type=int, default=None, help='特征提取进程数，默认为CPU核数')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每块歌曲数')
+    args = parser.parse_args(argv)
+    if not args.path and not args.sample:
+        parser.error('需要指定歌曲文件或--sample')
+
+    store = CatalogStore(args.catalog_dir)
+    if args.sample and not args.path and store.current() and not args.replace:
+        print(f"曲库已存在：{store.current()}", file=sys.stderr)
+        return
+    songs = [dict(song) for song in SAMPLE_SONGS] if args.sample else []
+    if args.path:
+        songs += read_songs(args.path)
+
+    def report(done, total):
+        print(f"\r特征提取 {done}/{total} 块", end='', file=sys.stderr, flush=True)
+
+    summary = ingest_songs(songs, store, replace=args.replace, workers=args.workers,
+                           chunk_size=args.chunk_size, progress=report)
+    print(file=sys.stderr)
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
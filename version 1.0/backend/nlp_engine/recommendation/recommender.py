@@ -2,43 +2,126 @@
 推荐系统模块
 个性化推荐、可解释推荐、相似度分析
 """
-from typing import List, Dict, Optional
+import os
+import threading
+import zlib
+from itertools import islice
+from typing import List, Dict, Optional, Tuple
 from ..theme.extractor import ThemeExtractor
 from ..sentiment.analyzer import SentimentAnalyzer
 from ..rhythm.analyzer import RhythmAnalyzer
+from .tfidf_index import TfidfIndex, tokenize
+from .ann import IVFIndex
+from .catalog import FeatureList, SongList, SongTable, write_song_table
+from ..utils.ranking import top_k_indices
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 
 class MusicRecommender:
     """音乐推荐器"""
     
+    # 近似最近邻检索：曲库达到ann_min_songs首后先用IVF索引取候选，再精确重排
+    EMBEDDING_DIM = 256  # 文本部分的哈希投影维数
+    ANN_REBUILD_RATIO = 0.2  # 索引建立后新增歌曲超过该比例时在后台重建
+    
     def __init__(self):
         self.theme_extractor = ThemeExtractor()
         self.sentiment_analyzer = SentimentAnalyzer()
         self.rhythm_analyzer = RhythmAnalyzer()
-        self.vectorizer = TfidfVectorizer(max_features=100)
-        self.song_database = []  # 存储歌曲数据库
+        self.text_index = TfidfIndex()  # 曲库TF-IDF索引，行号与song_database一致
+        self.song_database = SongList()  # 存储歌曲数据库（加载曲库后为磁盘上的歌曲表）
+        self.song_features = FeatureList(list(self.theme_extractor.EXTENDED_THEMES))  # 与song_database一一对应的预计算特征
+        # ANN索引覆盖曲库的前len(ann_index)首，之后新增的歌曲直接精确计算；整体替换，不原地修改
+        self.ann_index: Optional[IVFIndex] = None
+        self._ann_lock = threading.Lock()
+        self._ann_building = False
+        self._ann_failed = False
+        self._word_hashes = np.zeros(0, dtype=np.int64)  # TF-IDF词表中各词的哈希（投影用）
+        self.ann_min_songs = int(os.environ.get('RECOMMENDER_ANN_MIN_SONGS', 5000))
+        self.ann_n_probe = int(os.environ.get('RECOMMENDER_ANN_NPROBE', 8))
+        self.ann_shortlist = int(os.environ.get('RECOMMENDER_ANN_SHORTLIST', 200))
     
     def add_song_to_database(self, song: Dict):
-        """添加歌曲到数据库"""
-        self.song_database.append(song)
+        """添加歌曲到数据库，同时预先计算并保存歌曲特征"""
+        self.add_songs_to_database([song])
+    
+    def add_songs_to_database(self, songs: List[Dict]):
+        """批量添加歌曲（主题分类批量计算，分词结果同时加入TF-IDF索引）"""
+        features, token_lists = self._extract_features_tokens([song.get('lyrics', '') for song in songs])
+        self.add_songs_with_features(songs, features, token_lists)
+    
+    def add_songs_with_features(self, songs: List[Dict], features: List[Dict], token_lists: List[List[str]]):
+        """添加已提取好特征和分词结果的歌曲（批量入库时特征在进程池中计算）"""
+        self.text_index.add_tokens(token_lists)
+        for song, feature in zip(songs, features):
+            self.song_database.append(song)
+            self.song_features.append(feature)
+    
+    def extract_features(self, lyrics: str) -> Dict:
+        """提取一首歌词的特征（主题、情感、词频），推荐时只比较特征"""
+        return self.extract_features_batch([lyrics])[0]
+    
+    def extract_features_batch(self, lyrics_list: List[str]) -> List[Dict]:
+        """批量提取歌词特征
+        
+        - themes / theme_names / theme_vector: 主题分类结果、主题名集合、各主题得分向量
+        - sentiment_score / sentiment_tone: 整体情感得分和基调
+        - rhyme_group / rhyme_ratio: 押韵概况，出现最多的句末韵组（无法识别时为-1）及其所占句数比例
+        """
+        return self._extract_features_tokens(lyrics_list)[0]
+    
+    def _extract_features_tokens(self, lyrics_list: List[str]) -> Tuple[List[Dict], List[List[str]]]:
+        """提取特征并返回分词结果（每首歌词只分词一次，主题分类和TF-IDF共用）"""
+        token_lists = [tokenize(lyrics) for lyrics in lyrics_list]
+        theme_order = list(self.theme_extractor.EXTENDED_THEMES)
+        features = []
+        for lyrics, themes in zip(lyrics_list, self.theme_extractor.classify_theme_tokens(token_lists)):
+            theme_vector = np.zeros(len(theme_order), dtype=np.float64)
+            for t in themes:
+                theme_vector[theme_order.index(t['theme'])] = t['score']
+            sentiment = self.sentiment_analyzer.analyze_lyrics(lyrics)
+            rhyme_group, rhyme_ratio = self._rhyme_profile(lyrics)
+            features.append({
+                'themes': themes,
+                'theme_names': {t['theme'] for t in themes},
+                'theme_vector': theme_vector,
+                'sentiment_score': sentiment['overall_score'],
+                'sentiment_tone': sentiment['overall_tone'],
+                'rhyme_group': rhyme_group,
+                'rhyme_ratio': rhyme_ratio
+            })
+        return features, token_lists
+    
+    def _rhyme_profile(self, lyrics: str) -> Tuple[int, float]:
+        """出现最多的句末韵组及其占全部句子的比例"""
+        classes = [self.rhythm_analyzer.rhyme_class(line) for line in lyrics.split('\n') if line.strip()]
+        groups = [c for c in classes if isinstance(c, int)]
+        if not groups:
+            return -1, 0.0
+        counts = np.bincount(groups)
+        top = int(np.argmax(counts))
+        return top, round(float(counts[top]) / len(classes), 3)
+    
+    def get_song_features(self, song: Dict) -> Dict:
+        """已入库歌曲直接返回保存的特征，否则现场计算"""
+        index = self.song_database.index_of(song)
+        if index is not None:
+            return self.song_features[index]
+        return self.extract_features(song.get('lyrics', ''))
     
     def calculate_similarity(self, lyrics1: str, lyrics2: str) -> float:
         """计算两首歌词的相似度"""
+        (features1, features2), (tokens1, tokens2) = self._extract_features_tokens([lyrics1, lyrics2])
+        text_sim = self.text_index.pair_similarity(tokens1, tokens2)
+        return self._feature_similarity(features1, features2, text_sim)
+    
+    def _feature_similarity(self, features1: Dict, features2: Dict, text_sim: float) -> float:
+        """根据特征计算相似度"""
         # 主题相似度
-        themes1 = self.theme_extractor.classify_theme(lyrics1)
-        themes2 = self.theme_extractor.classify_theme(lyrics2)
-        theme_sim = self._theme_similarity(themes1, themes2)
+        theme_sim = self._theme_similarity(features1['themes'], features2['themes'])
         
         # 情感相似度
-        sent1 = self.sentiment_analyzer.analyze_lyrics(lyrics1)
-        sent2 = self.sentiment_analyzer.analyze_lyrics(lyrics2)
-        sent_sim = 1 - abs(sent1['overall_score'] - sent2['overall_score'])
-        
-        # 文本相似度
-        text_sim = self._text_similarity(lyrics1, lyrics2)
+        sent_sim = 1 - abs(features1['sentiment_score'] - features2['sentiment_score'])
         
         # 综合相似度
         overall_sim = (theme_sim * 0.4 + sent_sim * 0.3 + text_sim * 0.3)
@@ -46,35 +129,200 @@ class MusicRecommender:
         return round(overall_sim, 3)
     
     def recommend_songs(self, query_lyrics: str, top_k: int = 5, 
-                       user_preferences: Optional[Dict] = None) -> List[Dict]:
-        """推荐相似歌曲"""
+                       user_preferences: Optional[Dict] = None, explain: bool = True) -> List[Dict]:
+        """推荐相似歌曲（查询歌词只分析一次，曲库歌曲使用预先计算的特征和TF-IDF索引）
+        
+        explain为True时为入选的top_k首歌曲生成推荐原因（reasons）和推荐理由（explanation），
+        使用已计算的特征，不再重新分析歌词。
+        """
         if not self.song_database:
             return []
         
-        similarities = []
-        for song in self.song_database:
-            sim = self.calculate_similarity(query_lyrics, song.get('lyrics', ''))
-            
-            # 考虑用户偏好
-            if user_preferences:
-                preference_boost = self._calculate_preference_boost(song, user_preferences)
-                sim = sim * (1 + preference_boost * 0.2)
-            
-            similarities.append({
-                'song': song,
-                'similarity': sim,
-                'reasons': self._generate_reasons(query_lyrics, song.get('lyrics', ''))
-            })
+        (query_features,), (query_tokens,) = self._extract_features_tokens([query_lyrics])
+        
+        # 大曲库先用ANN索引取候选，小曲库直接全量计算
+        rows = self._candidate_rows(query_features, query_tokens, top_k)
+        # 与候选歌曲的文本相似度：一次稀疏矩阵-向量乘法
+        text_sims = self.text_index.similarities(tokens=query_tokens, rows=rows)
+        if rows is None:
+            rows = np.arange(len(self.song_database))
+        
+        similarities = self._score_rows(query_features, rows, text_sims)
+        
+        # 考虑用户偏好
+        if user_preferences:
+            similarities = similarities * (1 + self._preference_boosts(rows, user_preferences) * 0.2)
+        
+        # 选出top_k（同分按曲库顺序），只读取入选歌曲的元数据，只为入选歌曲生成推荐原因
+        top = top_k_indices(similarities, top_k, tie_break=rows)
+        winners = rows[top]
+        results = []
+        for row, song, sim in zip(winners, self.song_database.get_many(winners), similarities[top]):
+            result = {'song': song, 'similarity': float(sim)}
+            results.append(result)
+            if explain:
+                result['reasons'] = self._generate_reasons(query_features, self.song_features[row])
+                result['explanation'] = self._format_explanation(result['reasons'])
+        
+        return results
+    
+    def _score_rows(self, query_features: Dict, rows: np.ndarray, text_sims: np.ndarray) -> np.ndarray:
+        """查询与指定行歌曲的综合相似度数组（按行向量化，与_feature_similarity的计算一致）"""
+        themes = self.song_features.theme_indicators(rows)
+        theme_order = list(self.theme_extractor.EXTENDED_THEMES)
+        query_themes = np.zeros(len(theme_order))
+        query_themes[[theme_order.index(t['theme']) for t in query_features['themes']]] = 1.0
+        
+        # 主题集合的Jaccard系数
+        intersection = themes @ query_themes
+        union = themes.sum(axis=1) + query_themes.sum() - intersection
+        theme_sims = np.divide(intersection, union, out=np.zeros(len(rows)), where=union > 0)
+        
+        sentiment_sims = 1 - np.abs(query_features['sentiment_score'] - self.song_features.sentiment_scores(rows))
+        
+        return np.round(theme_sims * 0.4 + sentiment_sims * 0.3 + np.asarray(text_sims) * 0.3, 3)
+    
+    def _preference_boosts(self, rows: np.ndarray, preferences: Dict) -> np.ndarray:
+        """用户偏好加成：主题、风格各0.5（只读取歌曲的theme、style字段）"""
+        boosts = np.zeros(len(rows))
+        for field, key in (('theme', 'preferred_themes'), ('style', 'preferred_styles')):
+            if key in preferences:
+                values = self.song_database.get_fields(rows, field)
+                boosts += 0.5 * np.fromiter((v in preferences[key] for v in values), dtype=bool, count=len(rows))
+        return boosts
+    
+    def build_ann_index(self, n_lists: int = None) -> IVFIndex:
+        """为当前曲库建立IVF近似最近邻索引（在入库或保存曲库时离线调用）"""
+        index = IVFIndex.build(self._embed_catalog(), n_lists=n_lists, n_probe=self.ann_n_probe)
+        self.ann_index = index
+        return index
+    
+    def _schedule_ann_build(self):
+        """在后台线程中（重新）建立ANN索引，建好后整体替换；同一时间只有一个构建任务，失败后不再重试"""
+        with self._ann_lock:
+            if self._ann_building or self._ann_failed:
+                return
+            self._ann_building = True
+        
+        def run():
+            try:
+                self.build_ann_index()
+            except Exception as e:
+                print(f"建立ANN索引失败: {e}")
+                self._ann_failed = True
+            finally:
+                with self._ann_lock:
+                    self._ann_building = False
+        
+        threading.Thread(target=run, name='ann-build', daemon=True).start()
+    
+    def load_ann_index(self, prefix: str):
+        """从磁盘加载ANN索引（须与当前曲库的前若干首一一对应）"""
+        index = IVFIndex.load(prefix)
+        if len(index) > len(self.song_database):
+            raise ValueError(f"ANN索引包含{len(index)}首歌曲，超过曲库的{len(self.song_database)}首")
+        self.ann_index = index
+    
+    def save_catalog(self, directory: str):
+        """把曲库写入目录：歌曲表、特征数组、TF-IDF索引，曲库较大时同时建立并保存ANN索引"""
+        os.makedirs(directory, exist_ok=True)
+        if self.ann_index is None and len(self.song_database) >= self.ann_min_songs:
+            self.build_ann_index()
+        write_song_table(os.path.join(directory, 'songs.db'), self.song_database)
+        self.song_features.save(os.path.join(directory, 'features'))
+        self.text_index.save(os.path.join(directory, 'tfidf'))
+        if self.ann_index is not None:
+            self.ann_index.save(os.path.join(directory, 'ann'))
+    
+    def load_catalog(self, directory: str):
+        """加载save_catalog写入的曲库，特征数组和索引以只读mmap映射，多进程共享"""
+        table = SongTable(os.path.join(directory, 'songs.db'))
+        features = FeatureList.load(os.path.join(directory, 'features'),
+                                    list(self.theme_extractor.EXTENDED_THEMES))
+        text_index = TfidfIndex.load(os.path.join(directory, 'tfidf'))
+        if not len(table) == len(features) == len(text_index):
+            raise ValueError(f"曲库文件不一致: 歌曲{len(table)}首，特征{len(features)}行，TF-IDF索引{len(text_index)}行")
+        ann_prefix = os.path.join(directory, 'ann')
+        ann_index = IVFIndex.load(ann_prefix) if os.path.exists(ann_prefix + '.json') else None
+        if ann_index is not None and len(ann_index) > len(table):
+            raise ValueError(f"ANN索引包含{len(ann_index)}首歌曲，超过曲库的{len(table)}首")
+        
+        # 全部读取成功后再替换
+        self.song_database = SongList(table)
+        self.song_features = features
+        self.text_index = text_index
+        self._word_hashes = np.zeros(0, dtype=np.int64)
+        self.ann_index = ann_index
+    
+    def _candidate_rows(self, query_features: Dict, query_tokens: List[str], top_k: int) -> Optional[np.ndarray]:
+        """ANN候选行号（含索引建立后新增的歌曲）；曲库较小或还没有索引时返回None表示全量计算
         
-        # 排序并返回top_k
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
+        索引通常在入库时建立并随曲库保存；缺失或过旧时在后台重建，请求不等待。
+        """
+        n_songs = len(self.song_database)
+        if n_songs < self.ann_min_songs:
+            return None
+        index = self.ann_index
+        if index is None or n_songs - len(index) > self.ANN_REBUILD_RATIO * len(index):
+            self._schedule_ann_build()
+        if index is None:
+            return None
+        
+        query = self._embed(query_features['theme_vector'][None, :], np.array([query_features['sentiment_score']]),
+                            self.text_index.vectorize(query_tokens))[0]
+        shortlist = max(self.ann_shortlist, top_k * 10)
+        ids, _ = index.search(query, shortlist, n_probe=self.ann_n_probe)
+        tail = np.arange(len(index), n_songs, dtype=np.int64)
+        return np.concatenate([ids, tail])
+    
+    def _embed_catalog(self) -> np.ndarray:
+        """曲库全部歌曲的检索向量"""
+        return self._embed(self.song_features.theme_matrix(), self.song_features.sentiment_scores(),
+                           self.text_index.matrix)
+    
+    def _embed(self, theme_vectors: np.ndarray, sentiments: np.ndarray, tfidf_rows) -> np.ndarray:
+        """检索向量，两首歌检索向量的内积近似综合相似度（各部分权重与_feature_similarity一致）
         
-        return similarities[:top_k]
+        - 主题：主题集合的0/1向量归一化（内积为集合的余弦系数，近似Jaccard）
+        - 情感：得分映射到单位圆上的角度（内积随得分差增大而单调减小）
+        - 文本：TF-IDF向量经哈希随机投影降维后归一化
+        """
+        projection = self._hash_projection(tfidf_rows.shape[1])
+        text = np.asarray((tfidf_rows @ projection).todense(), dtype=np.float64)
+        text_norms = np.linalg.norm(text, axis=1, keepdims=True)
+        text_norms[text_norms == 0] = 1.0
+        themes = (theme_vectors > 0).astype(np.float64)
+        theme_norms = np.linalg.norm(themes, axis=1, keepdims=True)
+        theme_norms[theme_norms == 0] = 1.0
+        angles = np.asarray(sentiments, dtype=np.float64)[:, None] * (np.pi / 2)
+        return np.hstack([np.sqrt(0.4) * themes / theme_norms,
+                          np.sqrt(0.3) * np.hstack([np.cos(angles), np.sin(angles)]),
+                          np.sqrt(0.3) * text / text_norms]).astype(np.float32)
+    
+    def _hash_projection(self, width: int):
+        """词表 -> EMBEDDING_DIM维的稀疏随机投影（按词的CRC32确定桶和符号，重新拟合后保持不变）"""
+        from scipy import sparse
+        hashes = self._word_hashes
+        if len(hashes) < width:
+            # 词表只会追加，新词的哈希接在后面
+            new_words = islice(self.text_index.vocab, len(hashes), width)
+            hashes = np.concatenate([hashes, np.fromiter((zlib.crc32(w.encode('utf-8')) for w in new_words),
+                                                         dtype=np.int64, count=width - len(hashes))])
+            self._word_hashes = hashes
+        hashes = hashes[:width]
+        signs = np.where(hashes & (1 << 31), -1.0, 1.0)
+        return sparse.csr_matrix((signs, (np.arange(width), hashes % self.EMBEDDING_DIM)),
+                                 shape=(width, self.EMBEDDING_DIM))
     
     def explain_recommendation(self, query_lyrics: str, recommended_song: Dict) -> str:
         """生成推荐理由"""
-        reasons = self._generate_reasons(query_lyrics, recommended_song.get('lyrics', ''))
-        
+        reasons = self._generate_reasons(self.extract_features(query_lyrics),
+                                         self.get_song_features(recommended_song))
+        return self._format_explanation(reasons)
+    
+    @staticmethod
+    def _format_explanation(reasons: Dict) -> str:
+        """把推荐原因组织成一句推荐理由"""
         explanation_parts = []
         if reasons.get('theme_match'):
             explanation_parts.append(f"主题相似：都涉及{reasons['theme_match']}")
@@ -146,45 +394,25 @@ class MusicRecommender:
         
         return len(intersection) / len(union)
     
-    def _text_similarity(self, text1: str, text2: str) -> float:
-        """计算文本相似度"""
-        try:
-            vectors = self.vectorizer.fit_transform([text1, text2])
-            similarity = cosine_similarity(vectors[0:1], vectors[1:2])[0][0]
-            return float(similarity)
-        except:
-            return 0.0
-    
-    def _calculate_preference_boost(self, song: Dict, preferences: Dict) -> float:
-        """计算用户偏好加成"""
-        boost = 0.0
-        
-        if 'preferred_themes' in preferences:
-            if song.get('theme') in preferences['preferred_themes']:
-                boost += 0.5
-        
-        if 'preferred_styles' in preferences:
-            if song.get('style') in preferences['preferred_styles']:
-                boost += 0.5
-        
-        return boost
-    
-    def _generate_reasons(self, lyrics1: str, lyrics2: str) -> Dict:
-        """生成相似原因"""
-        themes1 = self.theme_extractor.classify_theme(lyrics1)
-        themes2 = self.theme_extractor.classify_theme(lyrics2)
-        
-        common_themes = [t['theme'] for t in themes1 if t['theme'] in [t2['theme'] for t2 in themes2]]
-        
-        sent1 = self.sentiment_analyzer.analyze_lyrics(lyrics1)
-        sent2 = self.sentiment_analyzer.analyze_lyrics(lyrics2)
+    def _generate_reasons(self, features1: Dict, features2: Dict) -> Dict:
+        """生成相似原因（使用已计算的特征）"""
+        theme_names2 = features2['theme_names']
+        common_themes = [t['theme'] for t in features1['themes'] if t['theme'] in theme_names2]
         
         reasons = {}
         if common_themes:
             reasons['theme_match'] = '、'.join(common_themes[:2])
         
-        if abs(sent1['overall_score'] - sent2['overall_score']) < 0.2:
-            reasons['sentiment_match'] = f"情感基调相似（{sent1['overall_tone']} vs {sent2['overall_tone']}）"
+        if abs(features1['sentiment_score'] - features2['sentiment_score']) < 0.2:
+            reasons['sentiment_match'] = f"情感基调相似（{features1['sentiment_tone']} vs {features2['sentiment_tone']}）"
+        
+        # 主要韵脚相同且都占一半以上的句子
+        rhyme_group = features1.get('rhyme_group', -1)
+        if rhyme_group >= 0 and rhyme_group == features2.get('rhyme_group', -1) \
+                and min(features1['rhyme_ratio'], features2['rhyme_ratio']) >= 0.5:
+            table = self.rhythm_analyzer.pinyin_table
+            if table is not None:
+                reasons['style_match'] = f"押韵相近（都以{table.group_names[rhyme_group]}韵为主）"
         
         return reasons
 
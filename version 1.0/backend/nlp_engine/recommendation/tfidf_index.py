@@ -0,0 +1,239 @@
+"""
+曲库TF-IDF索引
+在整个曲库上统计文档频率并保存为CSR矩阵（每行一首歌的L2归一化TF-IDF向量），
+查询歌词与全部歌曲的文本相似度只需一次稀疏矩阵-向量乘法
+
+文件格式（同一前缀）：
+    <prefix>.json   元数据：文档数、拟合时文档数、矩阵宽度
+    <prefix>.vocab  UTF-8词表，每行一个词，行号即列号
+    <prefix>.<name>.npy  文档频率、IDF，以及词频矩阵和TF-IDF矩阵的CSR数组（data/indices/indptr）
+"""
+import json
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from ..utils.lazy import JIEBA
+from ..utils.paths import atomic_files
+
+WORD_PATTERN = re.compile(r'\w', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """jieba分词，去掉空白和标点，英文转小写"""
+    return [w.lower() for w in JIEBA.get().cut(text) if WORD_PATTERN.search(w)]
+
+
+class TfidfIndex:
+    """可增量添加的TF-IDF索引
+
+    IDF与CorpusIDF一致：idf = ln((1 + N) / (1 + df)) + 1。
+    新增的歌曲先按当前IDF加权（新词按df=0计），累计新增超过上次拟合时文档数的
+    refit_ratio倍后自动重新拟合，也可随时调用refit()。
+    查询读取的是一份不可变快照，添加和重新拟合在锁内生成新快照后整体替换，可并发查询。
+    """
+
+    def __init__(self, tokenizer: Callable[[str], List[str]] = None, refit_ratio: float = 0.2):
+        self.tokenizer = tokenizer or tokenize
+        self.refit_ratio = refit_ratio
+        self.vocab: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # 词频矩阵按块保存，查询或重新拟合时再合并
+        self._count_blocks = []
+        self._df = np.zeros(0, dtype=np.int64)
+        self._n_docs = 0
+        self._n_fitted = 0
+        self._idf = np.zeros(0, dtype=np.float64)
+        self._tfidf_blocks = []
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return self._n_docs
+
+    # ---------- 构建 ----------
+
+    def add(self, texts: Iterable[str]) -> List[int]:
+        """添加文档，返回对应的行号"""
+        return self.add_tokens([self.tokenizer(text) for text in texts])
+
+    def add_tokens(self, token_lists: List[List[str]]) -> List[int]:
+        """添加已分词的文档，返回对应的行号"""
+        from scipy import sparse
+        with self._lock:
+            indptr = [0]
+            indices = []
+            for tokens in token_lists:
+                indices.extend(self.vocab.setdefault(token, len(self.vocab)) for token in tokens)
+                indptr.append(len(indices))
+            counts = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.float64), np.asarray(indices, dtype=np.int64), indptr),
+                shape=(len(token_lists), len(self.vocab)))
+            counts.sum_duplicates()
+
+            df = np.zeros(len(self.vocab), dtype=np.int64)
+            df[:len(self._df)] = self._df
+            np.add.at(df, counts.indices, 1)
+            self._df = df
+
+            start = self._n_docs
+            self._count_blocks.append(counts)
+            self._n_docs += len(token_lists)
+
+            if self._n_docs - self._n_fitted > self.refit_ratio * max(self._n_fitted, 1):
+                self._refit()
+            else:
+                self._tfidf_blocks.append(self._weight(counts))
+                self._matrix = None
+            return list(range(start, self._n_docs))
+
+    def refit(self):
+        """按当前全部文档重新统计IDF并重建矩阵"""
+        with self._lock:
+            self._refit()
+
+    def _refit(self):
+        self._idf = np.log((1.0 + self._n_docs) / (1.0 + self._df)) + 1.0
+        self._n_fitted = self._n_docs
+        counts = self._stack(self._count_blocks)
+        self._count_blocks = [counts] if counts is not None else []
+        self._tfidf_blocks = [self._weight(counts)] if counts is not None else []
+        self._matrix = None
+
+    def _weight(self, counts):
+        """词频 × IDF 并逐行L2归一化"""
+        idf = self._idf_for(counts.shape[1])
+        weighted = counts.multiply(idf[None, :]).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return weighted.multiply(1.0 / norms[:, None]).tocsr()
+
+    def _idf_for(self, width: int) -> np.ndarray:
+        """长度为width的IDF向量，拟合之后出现的新词按df=0计"""
+        if width <= len(self._idf):
+            return self._idf[:width]
+        unseen = np.log(1.0 + self._n_fitted) + 1.0
+        return np.concatenate([self._idf, np.full(width - len(self._idf), unseen)])
+
+    @staticmethod
+    def _stack(blocks):
+        from scipy import sparse
+        if not blocks:
+            return None
+        width = max(block.shape[1] for block in blocks)
+        resized = []
+        for block in blocks:
+            if block.shape[1] != width:
+                block = sparse.csr_matrix((block.data, block.indices, block.indptr), shape=(block.shape[0], width))
+            resized.append(block)
+        return sparse.vstack(resized, format='csr') if len(resized) > 1 else resized[0]
+
+    @property
+    def matrix(self):
+        """全部文档的TF-IDF矩阵（CSR，文档数 × 词表大小）"""
+        matrix = self._matrix
+        if matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    stacked = self._stack(self._tfidf_blocks)
+                    self._tfidf_blocks = [stacked] if stacked is not None else []
+                    self._matrix = stacked
+                matrix = self._matrix
+        return matrix
+
+    # ---------- 保存 / 加载 ----------
+    
+    def save(self, prefix: str):
+        """保存索引（先写临时文件再替换）"""
+        with self._lock:
+            counts = self._stack(self._count_blocks)
+            self._count_blocks = [counts] if counts is not None else []
+            vocab = list(self.vocab)
+            n_docs, n_fitted = self._n_docs, self._n_fitted
+            arrays = {'df': self._df, 'idf': self._idf}
+        matrix = self.matrix
+        width = len(vocab)
+        for name, csr in (('counts', counts), ('tfidf', matrix)):
+            if csr is None:
+                csr = self._empty(width)
+            arrays[name + '.data'] = csr.data
+            arrays[name + '.indices'] = csr.indices
+            arrays[name + '.indptr'] = csr.indptr
+
+        paths = [f"{prefix}.{name}.npy" for name in arrays] + [prefix + '.vocab', prefix + '.json']
+        with atomic_files(*paths) as tmp_paths:
+            for array, tmp in zip(arrays.values(), tmp_paths):
+                with open(tmp, 'wb') as f:
+                    np.save(f, np.asarray(array))
+            with open(tmp_paths[-2], 'w', encoding='utf-8') as f:
+                f.write('\n'.join(vocab))
+            with open(tmp_paths[-1], 'w', encoding='utf-8') as f:
+                json.dump({'docs': n_docs, 'fitted': n_fitted, 'width': width, 'refit_ratio': self.refit_ratio}, f)
+
+    @classmethod
+    def load(cls, prefix: str, tokenizer: Callable[[str], List[str]] = None, mmap: bool = True) -> 'TfidfIndex':
+        """加载索引，矩阵以只读mmap映射；之后新增的文档在内存中追加"""
+        from scipy import sparse
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(prefix + '.vocab', 'r', encoding='utf-8') as f:
+            content = f.read()
+        vocab = content.split('\n') if content else []
+        if len(vocab) != meta['width']:
+            raise ValueError(f"TF-IDF索引损坏: 词表{len(vocab)}项，矩阵宽度{meta['width']}")
+
+        mode = 'r' if mmap else None
+        shape = (meta['docs'], meta['width'])
+
+        def csr(name):
+            return sparse.csr_matrix((np.load(f"{prefix}.{name}.data.npy", mmap_mode=mode),
+                                      np.load(f"{prefix}.{name}.indices.npy", mmap_mode=mode),
+                                      np.load(f"{prefix}.{name}.indptr.npy", mmap_mode=mode)),
+                                     shape=shape, copy=False)
+
+        index = cls(tokenizer, meta.get('refit_ratio', 0.2))
+        index.vocab = {word: i for i, word in enumerate(vocab)}
+        index._df = np.load(prefix + '.df.npy')
+        index._idf = np.load(prefix + '.idf.npy')
+        index._n_docs, index._n_fitted = meta['docs'], meta['fitted']
+        if meta['docs']:
+            index._count_blocks = [csr('counts')]
+            index._matrix = csr('tfidf')
+            index._tfidf_blocks = [index._matrix]
+        return index
+
+    @staticmethod
+    def _empty(width: int):
+        from scipy import sparse
+        return sparse.csr_matrix((0, width), dtype=np.float64)
+
+    # ---------- 查询 ----------
+
+    def vectorize(self, tokens: List[str]):
+        """把一篇已分词的文档转换为TF-IDF行向量（词表外的词忽略）"""
+        from scipy import sparse
+        width = len(self.vocab)
+        indices = [self.vocab[t] for t in tokens if t in self.vocab]
+        counts = sparse.csr_matrix((np.ones(len(indices)), (np.zeros(len(indices), dtype=np.int64), indices)),
+                                   shape=(1, width))
+        counts.sum_duplicates()
+        return self._weight(counts)
+
+    def similarities(self, text: str = None, tokens: Optional[List[str]] = None,
+                     rows: np.ndarray = None) -> np.ndarray:
+        """查询文档与索引中全部文档（或指定的行）的余弦相似度"""
+        matrix = self.matrix
+        if matrix is None:
+            return np.zeros(0, dtype=np.float64)
+        if rows is not None:
+            matrix = matrix[rows]
+        query = self.vectorize(tokens if tokens is not None else self.tokenizer(text))
+        if query.shape[1] != matrix.shape[1]:
+            query = query[:, :matrix.shape[1]]
+        return np.asarray((matrix @ query.T).todense()).ravel()
+
+    def pair_similarity(self, tokens1: List[str], tokens2: List[str]) -> float:
+        """两篇文档之间的余弦相似度（使用索引的IDF）"""
+        vector1, vector2 = self.vectorize(tokens1), self.vectorize(tokens2)
+        return float(vector1.multiply(vector2).sum())
@@ -1,6 +1,9 @@
 from .analyzer import RhythmAnalyzer
+from .pinyin_table import PinyinTable
+from .rhyme_index import RhymeIndex
+from .prosody import analyze_prosody
 
-__all__ = ['RhythmAnalyzer']
+__all__ = ['RhythmAnalyzer', 'PinyinTable', 'RhymeIndex', 'analyze_prosody']
 
 
 
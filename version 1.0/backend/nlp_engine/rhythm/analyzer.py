@@ -4,8 +4,13 @@
 使用pypinyin进行准确的押韵判断
 """
 import jieba
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 import re
+import unicodedata
+from collections import Counter
+import numpy as np
+from .pinyin_table import RHYME_GROUPS, PinyinTable, get_pinyin_table
+from .prosody import analyze_prosody
 try:
     from pypinyin import pinyin, Style, lazy_pinyin
     PYPINYIN_AVAILABLE = True
@@ -18,27 +23,23 @@ class RhythmAnalyzer:
     """韵律分析器"""
     
     # 韵母表（更完整的韵母分组）
-    RHYME_GROUPS = {
-        'a': ['a', 'ia', 'ua'],
-        'o': ['o', 'uo'],
-        'e': ['e', 'ie', 'ue', 'üe'],
-        'i': ['i', 'ai', 'ei', 'ui', 'üi'],
-        'u': ['u', 'ou', 'iu'],
-        'v': ['v', 'ü'],
-        'an': ['an', 'ian', 'uan', 'üan'],
-        'en': ['en', 'in', 'un', 'ün'],
-        'ang': ['ang', 'iang', 'uang'],
-        'eng': ['eng', 'ing', 'ong', 'iong'],
-        'ao': ['ao', 'iao'],
-        'ei': ['ei', 'uei'],
-        'ou': ['ou', 'iou']
-    }
+    RHYME_GROUPS = RHYME_GROUPS
+    
+    # 可识别的四句韵式（按优先级）
+    NAMED_PATTERNS = ('AABB', 'ABAB', 'AAAA', 'ABCB', 'ABBA', 'AABA')
+    
+    _group_index = None  # 韵母 -> 韵组编号，所有实例共享
     
     def __init__(self):
         self.pypinyin_available = PYPINYIN_AVAILABLE
     
+    @property
+    def pinyin_table(self) -> Optional[PinyinTable]:
+        """共享拼音查找表（首次使用时加载），pypinyin不可用时为None"""
+        return get_pinyin_table() if self.pypinyin_available else None
+    
     def extract_final_sound(self, word: str) -> str:
-        """提取字词的韵母（使用pypinyin）"""
+        """提取字词的韵母（汉字查拼音表，其他字符使用pypinyin）"""
         if len(word) == 0:
             return ''
         
@@ -47,52 +48,82 @@ class RhythmAnalyzer:
         
         if self.pypinyin_available:
             try:
-                # 获取拼音
+                final = self.pinyin_table.final_of(last_char)
+                if final is not None:
+                    return final
+                # 不在表中的字符（非汉字、生僻字）仍交给pypinyin
                 pinyin_list = pinyin(last_char, style=Style.FINALS, heteronym=False)
                 if pinyin_list and len(pinyin_list) > 0:
-                    final = pinyin_list[0][0]
-                    # 标准化韵母（去除声调）
-                    final = final.replace('ā', 'a').replace('á', 'a').replace('ǎ', 'a').replace('à', 'a')
-                    final = final.replace('ē', 'e').replace('é', 'e').replace('ě', 'e').replace('è', 'e')
-                    final = final.replace('ī', 'i').replace('í', 'i').replace('ǐ', 'i').replace('ì', 'i')
-                    final = final.replace('ō', 'o').replace('ó', 'o').replace('ǒ', 'o').replace('ò', 'o')
-                    final = final.replace('ū', 'u').replace('ú', 'u').replace('ǔ', 'u').replace('ù', 'u')
-                    final = final.replace('ǖ', 'ü').replace('ǘ', 'ü').replace('ǚ', 'ü').replace('ǜ', 'ü')
-                    return final
+                    return pinyin_list[0][0]
             except Exception as e:
                 print(f"拼音提取失败: {e}")
         
         # 备用方案：返回最后一个字符
         return last_char
     
+    def rhyme_class(self, line: str):
+        """句子的韵类：句末字（跳过标点）所属韵组的编号
+        
+        拼音表中的汉字直接读出韵组；表外字符使用其韵母（在韵母分组中时归入该组），
+        读不出韵母的句子返回None（不与任何句子押韵）。
+        """
+        line = line.strip()
+        while line and unicodedata.category(line[-1])[0] in 'PZ':
+            line = line[:-1]
+        if not line:
+            return None
+        
+        table = self.pinyin_table
+        if table is not None:
+            entry = table.lookup(line[-1])
+            if entry is not None:
+                return entry[2] if entry[0] else None
+        final = self.extract_final_sound(line)
+        if not final:
+            return None
+        return self._final_group_index().get(final, final)
+    
+    def _final_group_index(self) -> Dict[str, int]:
+        """韵母 -> 韵组编号的反向索引（含韵母分组中的各种写法）"""
+        if RhythmAnalyzer._group_index is None:
+            table = self.pinyin_table
+            index: Dict[str, int] = {}
+            if table is not None:
+                for final, final_id in table.final_index.items():
+                    index[final] = int(table.groups[final_id])
+                for members in self.RHYME_GROUPS.values():
+                    grouped = [index[m] for m in members if m in index]
+                    for member in members:
+                        if grouped:
+                            index.setdefault(member, grouped[0])
+            RhythmAnalyzer._group_index = index
+        return RhythmAnalyzer._group_index
+    
     def detect_rhyme(self, line1: str, line2: str) -> bool:
-        """检测两句是否押韵"""
+        """检测两句是否押韵（句末字属于同一韵组）"""
         if not line1.strip() or not line2.strip():
             return False
-        
-        final1 = self.extract_final_sound(line1.strip())
-        final2 = self.extract_final_sound(line2.strip())
-        
-        # 如果韵母完全相同
-        if final1 == final2:
-            return True
-        
-        # 检查是否在同一韵母组
-        for group in self.RHYME_GROUPS.values():
-            if final1 in group and final2 in group:
-                return True
-        
-        # 检查韵母相似度（部分匹配）
-        if len(final1) >= 2 and len(final2) >= 2:
-            # 如果韵母的后半部分相同（如ang和iang）
-            if final1[-2:] == final2[-2:]:
-                return True
-        
-        return False
+        class1 = self.rhyme_class(line1)
+        return class1 is not None and class1 == self.rhyme_class(line2)
     
     def analyze_rhyme_pattern(self, lyrics: str) -> Dict:
-        """分析押韵模式"""
-        lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
+        """分析押韵模式
+        
+        每句只计算一次韵类，再按韵类首次出现的顺序分配字母得到全曲韵式（如AABBCC），
+        空行分隔的段落各自给出韵式；每句与之前最近的同韵句组成押韵对（不限距离）。
+        整体耗时与行数成线性关系。
+        """
+        stanzas = []
+        current = []
+        for line in lyrics.split('\n'):
+            if line.strip():
+                current.append(line.strip())
+            elif current:
+                stanzas.append(current)
+                current = []
+        if current:
+            stanzas.append(current)
+        lines = [line for stanza in stanzas for line in stanza]
         
         if len(lines) < 2:
             return {
@@ -101,59 +132,115 @@ class RhythmAnalyzer:
                 'quality_score': 0
             }
         
-        # 检测押韵对
+        classes = [self.rhyme_class(line) for line in lines]
+        
+        # 押韵对：每句与之前最近的同韵句
         rhyme_pairs = []
-        for i in range(len(lines) - 1):
-            if self.detect_rhyme(lines[i], lines[i + 1]):
-                rhyme_pairs.append((i, i + 1))
+        last_seen: Dict = {}
+        for i, rhyme in enumerate(classes):
+            if rhyme is None:
+                continue
+            if rhyme in last_seen:
+                rhyme_pairs.append((last_seen[rhyme], i))
+            last_seen[rhyme] = i
+        
+        # 段落韵式和四句一组的模式
+        stanza_results = []
+        quatrain_patterns = []
+        start = 0
+        for stanza in stanzas:
+            stanza_classes = classes[start:start + len(stanza)]
+            stanza_results.append({
+                'start_line': start,
+                'end_line': start + len(stanza) - 1,
+                'scheme': self._label_scheme(stanza_classes)
+            })
+            for offset in range(0, len(stanza) - 3, 4):
+                # 读不出韵类的句子在四句组中视为不押韵的独立一句
+                quatrain = [rhyme if rhyme is not None else ('X', k)
+                            for k, rhyme in enumerate(stanza_classes[offset:offset + 4])]
+                quatrain_patterns.append(self._label_scheme(quatrain))
+            start += len(stanza)
         
-        # 识别押韵模式
-        pattern = self._identify_pattern(lines, rhyme_pairs)
+        scheme = self._label_scheme(classes)
+        pattern = self._identify_pattern(quatrain_patterns, rhyme_pairs, scheme)
         
-        # 计算押韵质量分数
-        quality_score = len(rhyme_pairs) / max(len(lines) - 1, 1)
+        # 押韵质量：与前三句内某句押韵的句子占比
+        close_pairs = [(i, j) for i, j in rhyme_pairs if j - i <= 3]
+        quality_score = len(close_pairs) / max(len(lines) - 1, 1)
         
         return {
             'pattern': pattern,
-            'rhyme_pairs': [{'line1': i, 'line2': j} for i, j in rhyme_pairs],
+            'scheme': scheme,
+            'stanzas': stanza_results,
+            'rhyme_pairs': [{'line1': i, 'line2': j, 'distance': j - i} for i, j in rhyme_pairs],
             'quality_score': round(quality_score, 2),
             'total_lines': len(lines),
             'rhyme_count': len(rhyme_pairs)
         }
     
-    def _identify_pattern(self, lines: List[str], rhyme_pairs: List[Tuple]) -> str:
-        """识别押韵模式"""
+    @staticmethod
+    def _label_scheme(classes: List) -> str:
+        """按韵类首次出现的顺序分配字母（A-Z，之后为AA、AB...），读不出韵类的句子记为X"""
+        labels: Dict = {}
+        scheme = []
+        for rhyme in classes:
+            if rhyme is None:
+                scheme.append('X')
+                continue
+            if rhyme not in labels:
+                n = len(labels)
+                label = ''
+                while True:
+                    label = chr(ord('A') + n % 26) + label
+                    n = n // 26 - 1
+                    if n < 0:
+                        break
+                labels[rhyme] = label
+            scheme.append(labels[rhyme])
+        return ''.join(scheme)
+    
+    def _identify_pattern(self, quatrain_patterns: List[str], rhyme_pairs: List[Tuple], scheme: str = '') -> str:
+        """识别押韵模式：各四句组中占多数（至少一半）的常见韵式
+        
+        没有完整四句组（各段都只有两三句）时按全曲韵式判断：全曲同韵为一韵到底，
+        全曲正好构成常见韵式（如两段AA、BB合为AABB）时返回该韵式
+        """
         if len(rhyme_pairs) == 0:
             return '无押韵'
         
-        # 简化模式识别
-        if len(lines) >= 4:
-            # 检查AABB模式
-            if (0, 1) in rhyme_pairs and (2, 3) in rhyme_pairs:
-                return 'AABB'
-            # 检查ABAB模式
-            if (0, 2) in rhyme_pairs and (1, 3) in rhyme_pairs:
-                return 'ABAB'
-            # 检查AAAA模式
-            if all((i, i+1) in rhyme_pairs for i in range(min(3, len(lines)-1))):
-                return 'AAAA'
+        if not quatrain_patterns:
+            if set(scheme) == {'A'}:
+                return '一韵到底'
+            if scheme in self.NAMED_PATTERNS:
+                return scheme
+        
+        counts = Counter(p for p in quatrain_patterns if p in self.NAMED_PATTERNS)
+        if counts:
+            best, count = max(counts.items(), key=lambda item: (item[1], -self.NAMED_PATTERNS.index(item[0])))
+            if count * 2 >= len(quatrain_patterns):
+                return best
         
         return '自由押韵'
     
-    def analyze_syllables(self, lyrics: str) -> Dict:
-        """分析音节和节奏"""
+    def analyze_syllables(self, lyrics: str, prosody: Dict = None) -> Dict:
+        """分析音节和节奏（音节数来自声律分析，pypinyin不可用时以字符数近似）"""
         lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
         
-        syllable_counts = []
-        for line in lines:
+        if prosody is None and self.pinyin_table is not None:
+            prosody = analyze_prosody(lines, self.pinyin_table)
+        
+        if prosody is not None:
+            syllable_counts = prosody['syllable_counts']
+        else:
             # 简单计算：字符数作为音节数近似
-            count = len(line.replace(' ', '').replace('，', '').replace('。', ''))
-            syllable_counts.append(count)
+            syllable_counts = [len(line.replace(' ', '').replace('，', '').replace('。', '')) for line in lines]
         
         return {
             'syllable_counts': syllable_counts,
             'avg_syllables': round(sum(syllable_counts) / len(syllable_counts), 2) if syllable_counts else 0,
-            'rhythm_consistency': self._calculate_consistency(syllable_counts)
+            'rhythm_consistency': self._calculate_consistency(syllable_counts),
+            'length_histogram': prosody['length_histogram'] if prosody else {}
         }
     
     def _calculate_consistency(self, counts: List[int]) -> float:
@@ -162,23 +249,31 @@ class RhythmAnalyzer:
             return 1.0
         
         # 计算标准差，值越小越一致
-        import numpy as np
-        std = np.std(counts)
-        max_count = max(counts) if counts else 1
-        consistency = max(0, 1 - std / max_count)
+        counts = np.asarray(counts, dtype=np.float64)
+        max_count = counts.max() or 1
+        consistency = max(0, 1 - counts.std() / max_count)
         
-        return round(consistency, 2)
+        return round(float(consistency), 2)
     
     def analyze_rhythm(self, lyrics: str) -> Dict:
         """完整韵律分析"""
         rhyme_analysis = self.analyze_rhyme_pattern(lyrics)
-        syllable_analysis = self.analyze_syllables(lyrics)
         
-        return {
+        prosody = None
+        if self.pinyin_table is not None:
+            lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
+            prosody = analyze_prosody(lines, self.pinyin_table)
+        syllable_analysis = self.analyze_syllables(lyrics, prosody)
+        
+        result = {
             'rhyme_pattern': rhyme_analysis,
             'syllable_analysis': syllable_analysis,
             'overall_score': round((rhyme_analysis['quality_score'] + syllable_analysis['rhythm_consistency']) / 2, 2)
         }
+        if prosody is not None:
+            result['prosody'] = {key: value for key, value in prosody.items()
+                                 if key not in ('syllable_counts', 'length_histogram')}
+        return result
 
 
 
@@ -0,0 +1,239 @@
+"""
+拼音韵母查找表
+预先为CJK汉字区间的每个字计算韵母（不带声调）、声调和韵组，按码位存成紧凑数组，
+查询时只需一次数组读取，并支持整段文本的批量转换
+
+文件格式（同一前缀的两个文件）：
+    <prefix>.json  元数据：pypinyin版本、起始码位、韵母表
+    <prefix>.npy   uint8数组，形状为(码位数, 2)，每行为[韵母编号, 声调]，加载时以mmap方式映射
+
+命令行：
+    python -m nlp_engine.rhythm.pinyin_table data/pinyin_table
+"""
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..utils.lazy import lazy_resource
+from ..utils.paths import atomic_files, data_path
+
+
+# 韵母分组（同组韵母视为押韵）
+RHYME_GROUPS = {
+    'a': ['a', 'ia', 'ua'],
+    'o': ['o', 'uo'],
+    'e': ['e', 'ie', 'ue', 'üe'],
+    'i': ['i', 'ai', 'ei', 'ui', 'üi'],
+    'u': ['u', 'ou', 'iu'],
+    'v': ['v', 'ü'],
+    'an': ['an', 'ian', 'uan', 'üan'],
+    'en': ['en', 'in', 'un', 'ün'],
+    'ang': ['ang', 'iang', 'uang'],
+    'eng': ['eng', 'ing', 'ong', 'iong'],
+    'ao': ['ao', 'iao'],
+    'ei': ['ei', 'uei'],
+    'ou': ['ou', 'iou']
+}
+
+# pypinyin严格模式下的韵母写法 -> 韵母分组中的写法
+FINAL_ALIASES = {
+    've': 'üe',
+    'van': 'üan',
+    'vn': 'ün',
+    'uen': 'un',
+    'uai': 'ai',
+    'ueng': 'eng'
+}
+
+NO_READING = 0  # 韵母编号0：该码位没有读音（非汉字或未收录）
+
+
+def rhyme_group_map(finals: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """计算每个韵母所属的韵组
+
+    RHYME_GROUPS中有交叉的组（如i组与ei组都含ei）合并为一个韵组；
+    不在任何组中的韵母单独成组。返回 (韵母编号 -> 韵组编号数组, 韵组名称列表)，
+    没有读音的编号对应韵组-1。
+    """
+    # 并查集合并有交叉的组，韵组以最先出现的组名命名
+    parent: Dict[str, str] = {}
+
+    def find(x: str) -> str:
+        while parent.setdefault(x, x) != x:
+            x = parent[x]
+        return x
+
+    for name, members in RHYME_GROUPS.items():
+        for member in members:
+            root, other = find(name), find(member)
+            if root != other:
+                parent[other] = root
+    names: List[str] = []
+    group_of: Dict[str, str] = {}
+    for name, members in RHYME_GROUPS.items():
+        root = find(name)
+        if root not in names:
+            names.append(root)
+        for member in members:
+            group_of[member] = root
+
+    groups = np.full(len(finals), -1, dtype=np.int16)
+    for i, final in enumerate(finals):
+        if i == NO_READING:
+            continue
+        key = FINAL_ALIASES.get(final, final)
+        name = group_of.get(key)
+        if name is None:
+            name = key
+            group_of[key] = name
+            names.append(name)
+        groups[i] = names.index(name)
+    return groups, names
+
+
+class PinyinTable:
+    """按码位索引的韵母/声调表
+
+    覆盖CJK扩展A和基本区（U+3400 - U+9FFF）。每个字取单字读音，
+    与pinyin(字, style=Style.FINALS)的结果一致；声调1-4，轻声为5，无声调为0。
+    """
+
+    BASE = 0x3400
+    END = 0xA000
+
+    def __init__(self, finals: List[str], table: np.ndarray):
+        self.finals = finals
+        self.table = table
+        self.final_index: Dict[str, int] = {f: i for i, f in enumerate(finals) if i != NO_READING}
+        self.groups, self.group_names = rhyme_group_map(finals)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    # ---------- 构建 / 保存 / 加载 ----------
+
+    @classmethod
+    def build(cls) -> 'PinyinTable':
+        """用pypinyin逐字计算（约1秒），通常只在首次使用时执行一次并缓存到磁盘"""
+        from pypinyin import pinyin, Style
+        finals: List[str] = [None]
+        index: Dict[str, int] = {}
+        table = np.zeros((cls.END - cls.BASE, 2), dtype=np.uint8)
+        for i, cp in enumerate(range(cls.BASE, cls.END)):
+            ch = chr(cp)
+            final = pinyin(ch, style=Style.FINALS, heteronym=False)[0][0]
+            if final == ch:
+                continue  # 没有读音时pypinyin原样返回该字符
+            if final not in index:
+                index[final] = len(finals)
+                finals.append(final)
+            toned = pinyin(ch, style=Style.FINALS_TONE3, heteronym=False, neutral_tone_with_five=True)[0][0]
+            table[i, 0] = index[final]
+            table[i, 1] = int(toned[-1]) if toned[-1:].isdigit() else 0
+        return cls(finals, table)
+
+    def save(self, prefix: str):
+        """保存为 <prefix>.json + <prefix>.npy（先写临时文件再替换，避免读到半成品）"""
+        from pypinyin import __version__ as pypinyin_version
+        meta = {'pypinyin': pypinyin_version, 'base': self.BASE, 'end': self.END, 'finals': self.finals[1:]}
+        # 多个worker可能同时首次构建并保存，临时文件各自唯一命名；数组先于元数据替换
+        with atomic_files(prefix + '.npy', prefix + '.json') as (table_tmp, meta_tmp):
+            with open(table_tmp, 'wb') as f:
+                np.save(f, np.asarray(self.table, dtype=np.uint8))
+            with open(meta_tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> 'PinyinTable':
+        """加载查找表，数组以只读mmap映射，多进程共享同一份页缓存"""
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('base') != cls.BASE or meta.get('end') != cls.END:
+            raise ValueError(f"拼音表码位范围不匹配: {meta.get('base')}-{meta.get('end')}")
+        table = np.load(prefix + '.npy', mmap_mode='r' if mmap else None)
+        if table.shape != (cls.END - cls.BASE, 2):
+            raise ValueError(f"拼音表损坏: 形状为{table.shape}")
+        return cls([None] + meta['finals'], table)
+
+    @classmethod
+    def load_or_build(cls, prefix: str = None) -> 'PinyinTable':
+        """优先加载磁盘上的表（pypinyin版本一致时），否则现场构建并尝试写入缓存"""
+        from pypinyin import __version__ as pypinyin_version
+        prefix = prefix or os.environ.get('PINYIN_TABLE_PATH') or data_path('pinyin_table')
+        try:
+            with open(prefix + '.json', 'r', encoding='utf-8') as f:
+                if json.load(f).get('pypinyin') == pypinyin_version:
+                    return cls.load(prefix)
+        except (OSError, ValueError):
+            pass
+
+        table = cls.build()
+        try:
+            table.save(prefix)
+        except OSError as e:
+            print(f"拼音表缓存写入失败: {e}")
+        return table
+
+    # ---------- 查询 ----------
+
+    def lookup(self, ch: str) -> Optional[Tuple[str, int, int]]:
+        """单字查询，返回 (韵母, 声调, 韵组编号)；不在表中或没有读音时返回None"""
+        offset = ord(ch) - self.BASE
+        if offset < 0 or offset >= len(self.table):
+            return None
+        final_id, tone = self.table[offset]
+        if final_id == NO_READING:
+            return None
+        return self.finals[final_id], int(tone), int(self.groups[final_id])
+
+    def final_of(self, ch: str) -> Optional[str]:
+        """单字韵母（不带声调）"""
+        entry = self.lookup(ch)
+        return entry[0] if entry else None
+
+    def tone_of(self, ch: str) -> int:
+        """单字声调（1-4，轻声5，未知0）"""
+        entry = self.lookup(ch)
+        return entry[1] if entry else 0
+
+    def group_of(self, ch: str) -> int:
+        """单字韵组编号（未知为-1）"""
+        entry = self.lookup(ch)
+        return entry[2] if entry else -1
+
+    def encode(self, text: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """整段文本批量转换，返回与字符一一对应的 (韵母编号, 声调, 韵组编号) 数组
+
+        不在表中的字符韵母编号为0、声调为0、韵组为-1。
+        """
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64) - self.BASE
+        inside = (codes >= 0) & (codes < len(self.table))
+        rows = np.asarray(self.table)[np.where(inside, codes, 0)]
+        final_ids = np.where(inside, rows[:, 0], NO_READING).astype(np.int64)
+        tones = np.where(inside, rows[:, 1], 0).astype(np.int8)
+        groups = self.groups[final_ids]
+        return final_ids, tones, groups
+
+
+# 共享拼音表，首次使用或预热时加载（磁盘上没有时构建并缓存）
+PINYIN_TABLE = lazy_resource('pinyin_table', PinyinTable.load_or_build, '拼音韵母查找表')
+
+
+def get_pinyin_table() -> PinyinTable:
+    """获取共享拼音表"""
+    return PINYIN_TABLE.get()
+
+
+def main(argv: List[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    prefix = argv[0] if argv else data_path('pinyin_table')
+    table = PinyinTable.build()
+    table.save(prefix)
+    print(f"已生成拼音表：{len(table)}个码位，{len(table.finals) - 1}个韵母 -> {prefix}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+声律分析模块
+整首歌词一次性转换成逐字的韵母、声调、平仄数组，再用NumPy在全曲范围内统计
+音节数、句长分布、平仄规律、句内押韵和多音节押韵
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from .pinyin_table import PinyinTable, get_pinyin_table
+
+# 平仄：阴平、阳平为平，上声、去声为仄，轻声和未知不计
+TONE_CLASS = np.array([0, 1, 1, 2, 2, 0], dtype=np.int8)
+TONE_LABELS = {0: '·', 1: '平', 2: '仄'}
+
+TAIL_SYLLABLES = 3  # 多音节押韵最多比较句末三个音节
+RHYME_DISTANCES = (1, 2)  # 多音节押韵比较相邻句和隔句
+
+
+def _syllable_layout(lines: List[str], table: PinyinTable):
+    """把所有句子拼接后一次转换，返回每个音节所在的句子、句内位置以及韵组和平仄
+
+    音节：拼音表中有读音的汉字各算一个，连续的英文字母算一个。
+    """
+    text = '\n'.join(lines)
+    final_ids, tones, groups = table.encode(text)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+    is_letter = ((codes >= ord('a')) & (codes <= ord('z'))) | ((codes >= ord('A')) & (codes <= ord('Z')))
+    letter_start = is_letter & ~np.concatenate(([False], is_letter[:-1]))
+    is_syllable = (final_ids != 0) | letter_start
+
+    line_of_char = np.cumsum(codes == ord('\n'))
+    syllable_line = line_of_char[is_syllable]
+    syllable_groups = np.where(final_ids[is_syllable] != 0, groups[is_syllable], -1)
+    syllable_tones = TONE_CLASS[np.clip(tones[is_syllable], 0, 5)]
+
+    counts = np.bincount(syllable_line, minlength=len(lines))
+    line_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = np.arange(len(syllable_line)) - line_starts[syllable_line]
+    return counts, syllable_line, position, syllable_groups, syllable_tones
+
+
+def analyze_prosody(lines: List[str], table: PinyinTable = None) -> Dict:
+    """分析一组句子（已去掉空行）的音节、平仄和押韵结构"""
+    table = table or get_pinyin_table()
+    n_lines = len(lines)
+    if n_lines == 0:
+        return {
+            'syllable_counts': [],
+            'length_histogram': {},
+            'tone_patterns': [],
+            'tone_ratio': {'平': 0, '仄': 0},
+            'alternation_rate': 0,
+            'couplet_tone_match': 0,
+            'internal_rhymes': [],
+            'internal_rhyme_density': 0,
+            'multi_syllable_rhymes': []
+        }
+
+    counts, line_idx, position, groups, tone_classes = _syllable_layout(lines, table)
+    width = max(int(counts.max()), 1)
+
+    # 句子 × 句内位置 的矩阵，空位为-1
+    group_matrix = np.full((n_lines, width), -1, dtype=np.int32)
+    tone_matrix = np.full((n_lines, width), -1, dtype=np.int8)
+    group_matrix[line_idx, position] = groups
+    tone_matrix[line_idx, position] = tone_classes
+    valid = np.arange(width)[None, :] < counts[:, None]
+
+    # 句长分布
+    histogram = np.bincount(counts)
+    length_histogram = {str(length): int(n) for length, n in enumerate(histogram) if n}
+
+    # 平仄序列和比例
+    labels = np.array([TONE_LABELS[0], TONE_LABELS[1], TONE_LABELS[2]])
+    tone_patterns = [''.join(labels[tone_matrix[i, :counts[i]]]) for i in range(n_lines)]
+    ping = int(np.count_nonzero(tone_classes == 1))
+    ze = int(np.count_nonzero(tone_classes == 2))
+    total_toned = max(ping + ze, 1)
+
+    # “二四六分明”：句内第2、4、6字的平仄交替
+    pairs = [(1, 3), (3, 5)]
+    checked = np.zeros(n_lines, dtype=np.int32)
+    alternating = np.zeros(n_lines, dtype=np.int32)
+    for a, b in pairs:
+        if b >= width:
+            break
+        both = (tone_matrix[:, a] > 0) & (tone_matrix[:, b] > 0)
+        checked += both
+        alternating += both & (tone_matrix[:, a] != tone_matrix[:, b])
+    alternation_rate = float(alternating.sum() / checked.sum()) if checked.sum() else 0.0
+
+    # 对句收平：上句句末为仄、下句句末为平
+    end_tones = tone_matrix[np.arange(n_lines), np.maximum(counts - 1, 0)]
+    end_tones = np.where(counts > 0, end_tones, 0)
+    n_couplets = n_lines // 2
+    if n_couplets:
+        upper, lower = end_tones[0:2 * n_couplets:2], end_tones[1:2 * n_couplets:2]
+        couplet_tone_match = float(np.mean((upper == 2) & (lower == 1)))
+    else:
+        couplet_tone_match = 0.0
+
+    # 句内押韵：句中（非句末）与句末字同韵组的音节
+    end_groups = group_matrix[np.arange(n_lines), np.maximum(counts - 1, 0)]
+    inner = valid & (np.arange(width)[None, :] < (counts - 1)[:, None])
+    internal = inner & (group_matrix == end_groups[:, None]) & (end_groups[:, None] >= 0)
+    internal_counts = internal.sum(axis=1)
+    internal_rhymes = [{'line': int(i), 'count': int(internal_counts[i])}
+                       for i in np.flatnonzero(internal_counts)]
+
+    # 多音节押韵：句末连续多个音节韵组相同（如双押、三押）
+    tail = np.full((n_lines, TAIL_SYLLABLES), -1, dtype=np.int32)
+    for k in range(TAIL_SYLLABLES):
+        column = counts - 1 - k
+        tail[:, k] = np.where(column >= 0, group_matrix[np.arange(n_lines), np.maximum(column, 0)], -1)
+    multi_syllable_rhymes = []
+    for distance in RHYME_DISTANCES:
+        if n_lines <= distance:
+            continue
+        same = (tail[:-distance] == tail[distance:]) & (tail[:-distance] >= 0)
+        # 从句末开始连续相同的音节数
+        run = np.cumprod(same, axis=1).sum(axis=1)
+        for i in np.flatnonzero(run >= 2):
+            multi_syllable_rhymes.append({'line1': int(i), 'line2': int(i + distance), 'length': int(run[i])})
+    multi_syllable_rhymes.sort(key=lambda pair: (pair['line1'], pair['line2']))
+
+    return {
+        'syllable_counts': counts.tolist(),
+        'length_histogram': length_histogram,
+        'tone_patterns': tone_patterns,
+        'tone_ratio': {'平': round(ping / total_toned, 2), '仄': round(ze / total_toned, 2)},
+        'alternation_rate': round(alternation_rate, 2),
+        'couplet_tone_match': round(couplet_tone_match, 2),
+        'internal_rhymes': internal_rhymes,
+        'internal_rhyme_density': round(float(internal_counts.sum()) / max(int(counts.sum()), 1), 3),
+        'multi_syllable_rhymes': multi_syllable_rhymes
+    }
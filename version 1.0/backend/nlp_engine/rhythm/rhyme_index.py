@@ -0,0 +1,247 @@
+"""
+押韵词典索引
+离线用pypinyin为jieba词典中的词标注末字（及倒数第二字）的韵母、声调和韵组，
+按（韵组, 词频降序）排好后存成可内存映射的数组，查询同韵字词只需二分定位加切片
+
+文件格式（同一前缀的三个文件）：
+    <prefix>.json  元数据：pypinyin/jieba版本、韵母表、韵组名称、词数
+    <prefix>.npy   int32数组，形状为(词数, 6)，每行为[韵组, 韵母编号, 声调, 倒数第二字韵组, 词频, 词的字节偏移]
+    <prefix>.txt   所有词的UTF-8文本首尾相接，按字节偏移截取
+
+命令行：
+    python -m nlp_engine.rhythm.rhyme_index data/rhyme_index
+"""
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ..utils.lazy import JIEBA, lazy_resource
+from ..utils.paths import atomic_files, data_path
+from .pinyin_table import FINAL_ALIASES, RHYME_GROUPS, get_pinyin_table
+
+COL_GROUP, COL_FINAL, COL_TONE, COL_GROUP2, COL_FREQ, COL_OFFSET = range(6)
+
+
+class RhymeIndex:
+    """押韵词典索引
+
+    韵组、韵母编号与共享拼音表（PinyinTable）一致；单字词的倒数第二字韵组为-1。
+    """
+
+    MAX_WORD_LENGTH = 4  # 歌词替换用词，只收录四字以内的词
+
+    def __init__(self, finals: List[str], rows: np.ndarray, text: np.ndarray, group_names: List[str]):
+        self.finals = finals
+        self.final_index: Dict[str, int] = {f: i for i, f in enumerate(finals) if f is not None}
+        self.group_names = group_names
+        self.group_index: Dict[str, int] = {name: i for i, name in enumerate(group_names)}
+        self.rows = rows
+        self.text = text
+        # 各韵组在rows中的起止位置（rows按韵组排序）
+        self.group_offsets = np.searchsorted(np.asarray(rows[:, COL_GROUP]), np.arange(len(group_names) + 1))
+
+    def __len__(self) -> int:
+        return len(self.rows) - 1  # 不含哨兵行
+
+    # ---------- 构建 / 保存 / 加载 ----------
+
+    @classmethod
+    def build(cls, dict_path: str = None, min_freq: int = 1) -> 'RhymeIndex':
+        """从jieba词典构建（约半分钟，通常离线执行一次）
+
+        按整词取拼音，多音字按词语读音处理（如“音乐”的“乐”读yue）。
+        """
+        from pypinyin import lazy_pinyin, Style
+        table = get_pinyin_table()
+        if dict_path:
+            dict_file = open(dict_path, 'rb')
+        else:
+            dict_file = JIEBA.get().get_dict_file()
+
+        entries = []
+        with dict_file:
+            for raw in dict_file:
+                parts = raw.decode('utf-8').strip().split(' ')
+                word = parts[0]
+                freq = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+                if freq < min_freq or not 0 < len(word) <= cls.MAX_WORD_LENGTH:
+                    continue
+                if any(table.lookup(ch) is None for ch in word):
+                    continue  # 只收录拼音表中的汉字组成的词
+                syllables = lazy_pinyin(word, style=Style.FINALS_TONE3, neutral_tone_with_five=True)
+                if len(syllables) != len(word):
+                    continue
+                last_final, last_tone = cls._split_tone(syllables[-1])
+                final_id = table.final_index.get(last_final)
+                if not final_id:
+                    continue
+                group2 = -1
+                if len(syllables) > 1:
+                    prev_id = table.final_index.get(cls._split_tone(syllables[-2])[0])
+                    group2 = int(table.groups[prev_id]) if prev_id else -1
+                entries.append((int(table.groups[final_id]), final_id, last_tone, group2, -freq, word))
+
+        entries.sort(key=lambda entry: (entry[0], entry[4], entry[5]))  # 韵组内按词频降序
+        encoded = [word.encode('utf-8') for *_, word in entries]
+        offsets = np.zeros(len(entries) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        if offsets[-1] > np.iinfo(np.int32).max:
+            raise ValueError("词典过大，字节偏移超出int32范围")
+
+        rows = np.zeros((len(entries) + 1, 6), dtype=np.int32)
+        if entries:
+            rows[:-1, :5] = [entry[:5] for entry in entries]
+        rows[:-1, COL_FREQ] *= -1
+        rows[:, COL_OFFSET] = offsets
+        # 最后一行为哨兵：只用于记录文本结束位置，韵组取最大值使其排在末尾
+        rows[-1, COL_GROUP] = len(table.group_names)
+        text = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(list(table.finals), rows, text, list(table.group_names))
+
+    @staticmethod
+    def _split_tone(syllable: str):
+        """'ang1' -> ('ang', 1)，无声调数字时声调为0"""
+        if syllable[-1:].isdigit():
+            return syllable[:-1], int(syllable[-1])
+        return syllable, 0
+
+    def save(self, prefix: str):
+        """保存为 <prefix>.json/.npy/.txt（先写临时文件再替换，避免读到半成品）"""
+        from pypinyin import __version__ as pypinyin_version
+        import jieba
+        meta = {'pypinyin': pypinyin_version, 'jieba': jieba.__version__,
+                'finals': self.finals[1:], 'groups': self.group_names, 'words': len(self)}
+        with atomic_files(prefix + '.txt', prefix + '.npy', prefix + '.json') as (text_tmp, rows_tmp, meta_tmp):
+            with open(text_tmp, 'wb') as f:
+                f.write(np.asarray(self.text, dtype=np.uint8).tobytes())
+            with open(rows_tmp, 'wb') as f:
+                np.save(f, np.asarray(self.rows, dtype=np.int32))
+            with open(meta_tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> 'RhymeIndex':
+        """加载索引，数组和词文本以只读mmap映射"""
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        rows = np.load(prefix + '.npy', mmap_mode='r' if mmap else None)
+        if os.path.getsize(prefix + '.txt'):
+            text = np.memmap(prefix + '.txt', dtype=np.uint8, mode='r') if mmap else \
+                np.fromfile(prefix + '.txt', dtype=np.uint8)
+        else:
+            text = np.zeros(0, dtype=np.uint8)
+        if rows.ndim != 2 or rows.shape[1] != 6 or len(rows) != meta['words'] + 1:
+            raise ValueError(f"押韵索引损坏: 形状为{rows.shape}")
+        return cls([None] + meta['finals'], rows, text, meta['groups'])
+
+    @classmethod
+    def load_default(cls, prefix: str = None) -> 'RhymeIndex':
+        """加载预先生成的索引（RHYME_INDEX_PATH，默认data/rhyme_index）
+
+        构建整个词典需要较长时间，只在离线命令中进行；索引不存在时抛出FileNotFoundError，
+        调用方退回备用方案。pypinyin版本与生成时不同时照常加载，并提示重新生成。
+        """
+        from pypinyin import __version__ as pypinyin_version
+        prefix = prefix or os.environ.get('RHYME_INDEX_PATH') or data_path('rhyme_index')
+        if not os.path.exists(prefix + '.json'):
+            raise FileNotFoundError(f"押韵索引不存在: {prefix}（请运行 python -m nlp_engine.rhythm.rhyme_index 生成）")
+        with open(prefix + '.json', 'r', encoding='utf-8') as f:
+            built_with = json.load(f).get('pypinyin')
+        if built_with != pypinyin_version:
+            print(f"押韵索引由pypinyin {built_with}生成，当前为{pypinyin_version}，建议重新生成")
+        return cls.load(prefix)
+
+    # ---------- 查询 ----------
+
+    def word_at(self, i: int) -> str:
+        start, end = int(self.rows[i, COL_OFFSET]), int(self.rows[i + 1, COL_OFFSET])
+        return bytes(self.text[start:end]).decode('utf-8')
+
+    def resolve(self, rhyme: str) -> Optional[Dict]:
+        """解析目标韵：汉字（取末字读音）、韵母（如ang、iou、ü）或RHYME_GROUPS中的写法（如ui、un）
+
+        返回 {'group': 韵组编号, 'final': 韵母编号或None}，无法识别时返回None。
+        """
+        rhyme = (rhyme or '').strip()
+        if not rhyme:
+            return None
+        entry = get_pinyin_table().lookup(rhyme[-1])
+        if entry is not None:
+            if not entry[0]:
+                return None
+            return {'group': entry[2], 'final': self.final_index[entry[0]]}
+
+        rhyme = rhyme.lower().replace('ü', 'v')
+        if rhyme in self.final_index:
+            final_id = self.final_index[rhyme]
+            return {'group': self._group_of_final(final_id), 'final': final_id}
+        alias = FINAL_ALIASES.get(rhyme, rhyme).replace('v', 'ü')
+        for name, members in RHYME_GROUPS.items():
+            if alias == name or alias in members:
+                for member in [name] + members:
+                    final_id = self.final_index.get(member.replace('ü', 'v'))
+                    if final_id:
+                        return {'group': self._group_of_final(final_id), 'final': None}
+        return None
+
+    def _group_of_final(self, final_id: int) -> int:
+        return int(get_pinyin_table().groups[final_id])
+
+    def candidates(self, group: int, final: int = None, tone: int = None, length: int = None,
+                   prev_group: int = None, limit: int = 50, exclude: str = None) -> List[Dict]:
+        """同韵字词（按词频降序）
+
+        - final: 只要韵母完全相同的词（否则同韵组即可）
+        - tone: 只要末字声调相同的词
+        - length: 只要指定字数的词
+        - prev_group: 多音节押韵，要求倒数第二字也属于该韵组
+        """
+        start, end = int(self.group_offsets[group]), int(self.group_offsets[group + 1])
+        block = np.asarray(self.rows[start:end])
+        mask = np.ones(len(block), dtype=bool)
+        if final is not None:
+            mask &= block[:, COL_FINAL] == final
+        if tone is not None:
+            mask &= block[:, COL_TONE] == tone
+        if prev_group is not None:
+            mask &= block[:, COL_GROUP2] == prev_group
+        if length is not None:
+            # UTF-8下常用汉字都是3字节，用字节长度过滤字数
+            byte_length = np.asarray(self.rows[start + 1:end + 1, COL_OFFSET]) - block[:, COL_OFFSET]
+            mask &= byte_length == length * 3
+
+        results = []
+        for i in np.flatnonzero(mask):
+            word = self.word_at(start + int(i))
+            if word == exclude:
+                continue
+            row = block[i]
+            results.append({'word': word, 'final': self.finals[row[COL_FINAL]],
+                            'tone': int(row[COL_TONE]), 'freq': int(row[COL_FREQ])})
+            if len(results) >= limit:
+                break
+        return results
+
+
+# 共享押韵索引，首次使用或预热时从磁盘加载（须先用命令行生成；加载失败时下次使用再重试）
+RHYME_INDEX = lazy_resource('rhyme_index', RhymeIndex.load_default, '押韵词典索引')
+
+
+def get_rhyme_index() -> RhymeIndex:
+    """获取共享押韵索引"""
+    return RHYME_INDEX.get()
+
+
+def main(argv: List[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    prefix = argv[0] if argv else data_path('rhyme_index')
+    index = RhymeIndex.build()
+    index.save(prefix)
+    print(f"已生成押韵索引：{len(index)}个词 -> {prefix}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
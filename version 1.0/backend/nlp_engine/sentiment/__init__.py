@@ -1,6 +1,8 @@
 from .analyzer import SentimentAnalyzer
+from .lexicon import EmotionLexicon
+from .batch_scorer import BatchSentimentScorer, score_batch
 
-__all__ = ['SentimentAnalyzer']
+__all__ = ['SentimentAnalyzer', 'EmotionLexicon', 'BatchSentimentScorer', 'score_batch']
 
 
 
@@ -3,10 +3,27 @@
 提供逐句情感检测、情感强度分析和整体情感基调判断
 使用更丰富的情感词汇
 """
-import jieba
-from snownlp import SnowNLP
-import numpy as np
-from typing import List, Dict, Tuple
+import os
+import re
+from typing import List, Dict, Tuple, Optional, Iterator
+from .lexicon import EmotionLexicon, DEFAULT_LEXICON
+from .batch_scorer import get_default_scorer
+from ..utils.cache import LRUCache
+
+
+_WHITESPACE = re.compile(r'\s+')
+_shared_cache = None
+
+
+def get_sentiment_cache() -> LRUCache:
+    """获取进程内共享的逐句情感结果缓存（容量由环境变量配置）"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = LRUCache(
+            max_entries=int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', 20000)),
+            max_bytes=int(os.environ.get('SENTIMENT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+        )
+    return _shared_cache
 
 
 class SentimentAnalyzer:
@@ -28,50 +45,46 @@ class SentimentAnalyzer:
         'powerful': ['力量', '强大', '有力', '强劲', '雄浑', '磅礴', '震撼', '强烈', '威猛', '雄壮']
     }
     
-    def __init__(self):
+    def __init__(self, lexicon_paths: List[str] = None, use_cache: bool = None,
+                 cache: Optional[LRUCache] = None):
         self.positive_threshold = 0.6
         self.negative_threshold = 0.4
+        
+        # 情感词典：默认使用模块加载时编译好的共享词典，可追加外部词典文件
+        if lexicon_paths is None:
+            env_paths = os.environ.get('EMOTION_LEXICON_PATHS', '')
+            lexicon_paths = [p for p in env_paths.split(os.pathsep) if p]
+        self.lexicon = EmotionLexicon.from_files(lexicon_paths) if lexicon_paths else DEFAULT_LEXICON
+        
+        # 逐句结果缓存：默认共享进程级缓存；自定义词典的结果不同，使用独立缓存
+        if use_cache is None:
+            use_cache = os.environ.get('SENTIMENT_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no', 'off')
+        if not use_cache:
+            self.cache = None
+        elif cache is not None:
+            self.cache = cache
+        elif self.lexicon is DEFAULT_LEXICON:
+            self.cache = get_sentiment_cache()
+        else:
+            self.cache = LRUCache(max_entries=get_sentiment_cache().max_entries,
+                                  max_bytes=get_sentiment_cache().max_bytes)
     
-    def _detect_emotion_type(self, sentence: str) -> str:
-        """检测情感类型（更细致的分类，改进算法）"""
-        words = jieba.cut(sentence)
-        word_list = list(words)
-        
-        # 扩展情感词汇库，增加更多情感类型
-        extended_emotions = {
-            'joyful': ['快乐', '开心', '喜悦', '欢快', '兴奋', '愉悦', '欣喜', '畅快', '爽朗', '明媚', '欢乐', '高兴', '愉快'],
-            'melancholic': ['忧郁', '悲伤', '哀伤', '凄凉', '落寞', '惆怅', '伤感', '悲凉', '凄美', '黯然', '难过', '痛苦', '伤心'],
-            'romantic': ['浪漫', '温柔', '甜蜜', '温馨', '缠绵', '深情', '柔情', '缱绻', '旖旎', '爱恋', '心动', '情意'],
-            'passionate': ['激情', '热烈', '炽热', '狂热', '奔放', '激昂', '澎湃', '燃烧', '沸腾', '狂热', '热情'],
-            'peaceful': ['平静', '安宁', '宁静', '祥和', '恬淡', '淡泊', '静谧', '悠然', '舒缓', '平和', '安静', '宁静'],
-            'nostalgic': ['怀旧', '怀念', '追忆', '回忆', '缅怀', '思念', '眷恋', '留恋', '回味', '追思', '往事', '过去'],
-            'hopeful': ['希望', '期待', '憧憬', '向往', '期盼', '展望', '希冀', '渴望', '盼望', '期待', '梦想'],
-            'lonely': ['孤独', '寂寞', '孤单', '孤寂', '落单', '形单影只', '孑然', '孤身', '独处', '孤零', '独自'],
-            'energetic': ['活力', '朝气', '蓬勃', '生机', '活力四射', '充满活力', '精神', '振奋', '昂扬', '蓬勃', '活跃'],
-            'mysterious': ['神秘', '深邃', '幽深', '玄妙', '奥秘', '神秘莫测', '深不可测', '幽玄', '玄奥', '神秘', '未知'],
-            'dreamy': ['梦幻', '朦胧', '迷离', '虚幻', '缥缈', '如幻', '似梦', '迷蒙', '恍惚', '梦幻', '梦境'],
-            'powerful': ['力量', '强大', '有力', '强劲', '雄浑', '磅礴', '震撼', '强烈', '威猛', '雄壮', '强大'],
-            'warm': ['温暖', '暖和', '温馨', '暖意', '和煦', '暖阳', '温情', '暖心'],
-            'cool': ['清凉', '清爽', '凉爽', '清冷', '冷静', '冷静', '淡然'],
-            'sad': ['难过', '伤心', '痛苦', '悲伤', '哀痛', '痛心', '心碎'],
-            'angry': ['愤怒', '生气', '恼火', '愤慨', '怒火', '气愤'],
-            'calm': ['冷静', '镇定', '沉着', '平静', '淡定', '从容'],
-            'excited': ['激动', '兴奋', '振奋', '激昂', '热血', '澎湃']
-        }
+    def _score_sentence(self, sentence: str) -> float:
+        """计算单句情感得分（SnowNLP朴素贝叶斯模型，0-1）"""
+        return self.scorer.score_batch([sentence])[0]
+    
+    def _detect_emotion_type(self, sentence: str, nlp_score: float = None) -> str:
+        """检测情感类型（更细致的分类，改进算法）
         
-        emotion_scores = {}
-        for emotion_type, emotion_words in extended_emotions.items():
-            # 计算匹配度，考虑词频和权重
-            score = 0
-            for word in word_list:
-                if word in emotion_words:
-                    score += 1
-            if score > 0:
-                emotion_scores[emotion_type] = score
+        关键词匹配使用预编译的情感词典，在原句上一次扫描完成；
+        nlp_score可由调用方传入已计算好的情感得分，避免重复计算
+        """
+        # 计算匹配度（按情感类别统计命中次数）
+        emotion_scores = self.lexicon.match(sentence)
         
-        # 同时使用SnowNLP进行情感分析
-        s = SnowNLP(sentence)
-        nlp_score = s.sentiments
+        # 同时使用SnowNLP进行情感分析（已有得分时直接复用）
+        if nlp_score is None:
+            nlp_score = self._score_sentence(sentence)
         
         # 结合关键词匹配和NLP分析
         if emotion_scores:
@@ -141,10 +154,58 @@ class SentimentAnalyzer:
         }
         return translations.get(emotion_type, '中性平和')
     
-    def analyze_sentence(self, sentence: str) -> Dict:
-        """分析单句情感"""
-        s = SnowNLP(sentence)
-        sentiment_score = s.sentiments
+    @property
+    def scorer(self):
+        """批量情感打分器（SnowNLP模型的向量化版本，首次使用时加载）"""
+        return get_default_scorer()
+    
+    @staticmethod
+    def _normalize_line(line: str) -> str:
+        """归一化句子作为缓存键（去除首尾空白，合并连续空白）"""
+        return _WHITESPACE.sub(' ', line.strip())
+    
+    def analyze_lines(self, lines: List[str]) -> List[Dict]:
+        """批量分析多句情感
+        
+        先查缓存，未命中的句子去重后一次批量打分，结果写回缓存；
+        重复出现的句子（副歌、叠句）只计算一次
+        """
+        keys = [self._normalize_line(line) for line in lines]
+        results = {}
+        if self.cache is not None:
+            for key in set(keys):
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[key] = cached
+        
+        missing = list(dict.fromkeys(key for key in keys if key not in results))
+        if missing:
+            scores = self.scorer.score_batch(missing)
+            for key, score in zip(missing, scores):
+                analysis = self.analyze_sentence(key, score)
+                results[key] = (analysis['score'], analysis['category'], analysis['emotion_type'])
+                if self.cache is not None:
+                    self.cache.put(key, results[key])
+        
+        analyses = []
+        for line, key in zip(lines, keys):
+            score, category, emotion_type = results[key]
+            analyses.append({
+                'sentence': line,
+                'score': score,
+                'category': category,
+                'emotion_type': emotion_type,
+                'intensity': abs(score - 0.5) * 2
+            })
+        return analyses
+    
+    def analyze_sentence(self, sentence: str, sentiment_score: float = None) -> Dict:
+        """分析单句情感（单次打分，结果同时用于类别和情感类型判断）
+        
+        sentiment_score可由批量打分预先算好后传入；未传入时经由缓存计算
+        """
+        if sentiment_score is None:
+            return self.analyze_lines([sentence])[0]
         
         # 判断情感类别
         if sentiment_score >= self.positive_threshold:
@@ -155,7 +216,7 @@ class SentimentAnalyzer:
             category = 'neutral'
         
         # 检测更细致的情感类型
-        emotion_type = self._detect_emotion_type(sentence)
+        emotion_type = self._detect_emotion_type(sentence, sentiment_score)
         
         return {
             'sentence': sentence,
@@ -167,38 +228,61 @@ class SentimentAnalyzer:
     
     def analyze_lyrics(self, lyrics: str) -> Dict:
         """分析整首歌词的情感"""
-        # 按行分割歌词
-        lines = [line.strip() for line in lyrics.split('\n') if line.strip()]
-        
         sentence_analyses = []
-        for line in lines:
-            analysis = self.analyze_sentence(line)
-            sentence_analyses.append(analysis)
-        
-        # 计算整体统计
-        scores = [a['score'] for a in sentence_analyses]
-        avg_score = np.mean(scores) if scores else 0.5
+        summary = {}
+        # 整首歌词一次批量分析（命中缓存的句子不再打分）
+        for record in self.analyze_lyrics_iter(lyrics, chunk_size=0):
+            if record['type'] == 'line':
+                sentence_analyses.append({k: v for k, v in record.items() if k not in ('type', 'index')})
+            else:
+                summary = record
         
         # 情感变化曲线数据
         timeline = [{'index': i, 'score': a['score'], 'category': a['category'], 
                     'emotion_type': a['emotion_type']} 
                    for i, a in enumerate(sentence_analyses)]
         
-        # 情感分布统计（按情感类型）
+        return {
+            'sentence_analyses': sentence_analyses,
+            'overall_score': summary['overall_score'],
+            'overall_tone': summary['overall_tone'],
+            'score_explanation': summary['score_explanation'],
+            'timeline': timeline,
+            'category_distribution': summary['category_distribution'],
+            'emotion_distribution': summary['emotion_distribution'],
+            'intensity_curve': [a['intensity'] for a in sentence_analyses]
+        }
+    
+    def analyze_lyrics_iter(self, lyrics: str, chunk_size: int = 16) -> Iterator[Dict]:
+        """流式分析歌词情感
+        
+        每算完一批（chunk_size行，0表示整首一批）就逐行产出
+        {'type': 'line', 'index': 行号, 'sentence', 'score', 'category', 'emotion_type', 'intensity'}，
+        最后产出一条 {'type': 'summary', ...} 汇总记录（整体得分、基调和分布统计）。
+        汇总只累计计数和得分，不保留逐句结果，长文本内存占用保持平稳。
+        """
+        score_sum = 0.0
         emotion_counts = {}
-        for analysis in sentence_analyses:
-            emotion = analysis['emotion_type']
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+        weighted_emotions = {}
+        category_counts = {'positive': 0, 'negative': 0, 'neutral': 0}
+        
+        index = 0
+        for batch in self._iter_line_batches(lyrics, chunk_size):
+            for analysis in self.analyze_lines(batch):
+                score_sum += analysis['score']
+                emotion = analysis['emotion_type']
+                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+                weighted_emotions[emotion] = weighted_emotions.get(emotion, 0) + analysis['intensity']
+                category_counts[analysis['category']] += 1
+                
+                yield {'type': 'line', 'index': index, **analysis}
+                index += 1
+        
+        # 计算整体统计
+        avg_score = score_sum / index if index else 0.5
         
         # 整体基调判断（改进算法，考虑权重和情感强度）
         if emotion_counts:
-            # 计算加权平均，考虑情感强度
-            weighted_emotions = {}
-            for analysis in sentence_analyses:
-                emotion = analysis['emotion_type']
-                intensity = analysis['intensity']
-                weighted_emotions[emotion] = weighted_emotions.get(emotion, 0) + intensity
-            
             if weighted_emotions:
                 # 选择加权得分最高的情感
                 overall_tone = max(weighted_emotions.items(), key=lambda x: x[1])[0]
@@ -221,23 +305,30 @@ class SentimentAnalyzer:
         # 情感得分说明：基于SnowNLP的情感分析，0-1之间，0.5为中性，越接近1越积极，越接近0越消极
         score_explanation = f"情感得分基于文本情感分析模型计算，范围0-1，{avg_score:.2f}表示{'非常积极' if avg_score >= 0.7 else '较为积极' if avg_score >= 0.6 else '中性偏积极' if avg_score >= 0.55 else '中性' if 0.45 <= avg_score <= 0.55 else '中性偏消极' if avg_score >= 0.4 else '较为消极' if avg_score >= 0.3 else '非常消极'}"
         
-        # 传统分类统计（用于兼容）
-        category_counts = {
-            'positive': sum(1 for a in sentence_analyses if a['category'] == 'positive'),
-            'negative': sum(1 for a in sentence_analyses if a['category'] == 'negative'),
-            'neutral': sum(1 for a in sentence_analyses if a['category'] == 'neutral')
-        }
-        
-        return {
-            'sentence_analyses': sentence_analyses,
+        yield {
+            'type': 'summary',
+            'total_lines': index,
             'overall_score': float(avg_score),
             'overall_tone': overall_tone,
             'score_explanation': score_explanation,
-            'timeline': timeline,
+            # 传统分类统计（用于兼容）
             'category_distribution': category_counts,
-            'emotion_distribution': emotion_counts,
-            'intensity_curve': [a['intensity'] for a in sentence_analyses]
+            'emotion_distribution': emotion_counts
         }
+    
+    def _iter_line_batches(self, lyrics: str, chunk_size: int) -> Iterator[List[str]]:
+        """按行分割歌词，每chunk_size个非空行为一批（chunk_size<=0时整首为一批）"""
+        batch = []
+        for line in lyrics.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(line)
+            if 0 < chunk_size <= len(batch):
+                yield batch
+                batch = []
+        if batch:
+            yield batch
 
 
 
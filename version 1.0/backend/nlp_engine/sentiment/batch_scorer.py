@@ -0,0 +1,128 @@
+"""
+批量情感打分模块
+将SnowNLP训练好的朴素贝叶斯模型转换为NumPy对数概率表，用稀疏矩阵一次性为多句歌词打分
+"""
+from functools import lru_cache
+from typing import Dict, List
+
+import numpy as np
+
+from ..utils.lazy import lazy_resource
+
+
+# SnowNLP在导入时即加载分词和情感模型（耗时数秒），因此只在打分器构建时才导入
+
+
+@lru_cache(maxsize=65536)
+def _segment_run(run: str) -> tuple:
+    """切分一段连续汉字（歌词中短语重复度高，按片段缓存结果）"""
+    from snownlp import seg as snow_seg
+    return tuple(snow_seg.single_seg(run))
+
+
+class BatchSentimentScorer:
+    """批量情感打分器
+
+    与SnowNLP的计算完全等价：
+        log P(c|句子) ∝ log P(c) + Σ log P(词|c)
+    区别在于词表的对数概率在加载时转成 (词表大小+1) × 2 的矩阵（最后一行为未登录词），
+    多句歌词组成稀疏词频矩阵后一次矩阵乘法即可得到全部得分。
+    """
+
+    NEUTRAL_SCORE = 0.5
+
+    def __init__(self, classifier=None):
+        # classifier为snownlp.sentiment.Sentiment实例，默认使用SnowNLP自带模型
+        from snownlp import sentiment as snow_sentiment
+        self._sentiment = classifier or snow_sentiment.classifier
+        bayes = self._sentiment.classifier
+        labels = list(bayes.d.keys())
+        if set(labels) != {'pos', 'neg'}:
+            raise ValueError(f"不支持的情感模型类别: {labels}")
+        self.labels = ['neg', 'pos']
+
+        vocab = set()
+        for label in self.labels:
+            vocab.update(bayes.d[label].d.keys())
+        self.vocab: Dict[str, int] = {word: i for i, word in enumerate(sorted(vocab))}
+        self._unknown = len(self.vocab)
+
+        # 对数概率表：每行一个词，每列一个类别，最后一行为未登录词（加一平滑）
+        self.log_prob = np.empty((len(self.vocab) + 1, len(self.labels)), dtype=np.float64)
+        self.log_prior = np.empty(len(self.labels), dtype=np.float64)
+        for j, label in enumerate(self.labels):
+            prob = bayes.d[label]
+            counts = np.full(len(self.vocab) + 1, prob.none, dtype=np.float64)
+            for word, count in prob.d.items():
+                counts[self.vocab[word]] = count
+            self.log_prob[:, j] = np.log(counts / prob.total)
+            self.log_prior[j] = np.log(prob.getsum()) - np.log(bayes.total)
+
+    def tokenize(self, line: str) -> List[str]:
+        """与SnowNLP一致的分词和停用词过滤（等价于Sentiment.handle）"""
+        from snownlp import normal as snow_normal
+        from snownlp import seg as snow_seg
+        words = []
+        for part in snow_seg.re_zh.split(line):
+            part = part.strip()
+            if not part:
+                continue
+            if snow_seg.re_zh.match(part):
+                words.extend(_segment_run(part))
+            else:
+                words.extend(word for word in part.split() if word)
+        return snow_normal.filter_stop(words)
+
+    def count_matrix(self, token_lists: List[List[str]]):
+        """构建稀疏词频矩阵（句子数 × (词表大小+1)，scipy CSR格式）"""
+        from scipy import sparse
+        indptr = [0]
+        indices = []
+        for tokens in token_lists:
+            indices.extend(self.vocab.get(token, self._unknown) for token in tokens)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.float64)
+        matrix = sparse.csr_matrix((data, np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+                                   shape=(len(token_lists), len(self.vocab) + 1))
+        matrix.sum_duplicates()
+        return matrix
+
+    def score_tokens(self, token_lists: List[List[str]]) -> np.ndarray:
+        """为已分词的句子批量打分，返回积极概率数组
+
+        没有任何有效词的句子（空行、纯标点或只有停用词）按中性返回NEUTRAL_SCORE，
+        而不是只由类别先验得到的概率（SnowNLP对空句直接报错，原逐句流程按0.5处理）
+        """
+        if not token_lists:
+            return np.empty(0, dtype=np.float64)
+        joint = self.count_matrix(token_lists) @ self.log_prob + self.log_prior
+        # P(pos) = 1 / (1 + exp(log P(neg) - log P(pos)))，用对数差避免溢出
+        diff = joint[:, 0] - joint[:, 1]
+        with np.errstate(over='ignore'):
+            scores = 1.0 / (1.0 + np.exp(diff))
+        empty = np.array([not tokens for tokens in token_lists], dtype=bool)
+        scores[empty] = self.NEUTRAL_SCORE
+        return scores
+
+    def score_batch(self, lines: List[str]) -> List[float]:
+        """批量打分：重复的句子只分词一次"""
+        unique = {}
+        for line in lines:
+            if line not in unique:
+                unique[line] = len(unique)
+        scores = self.score_tokens([self.tokenize(line) for line in unique])
+        return [float(scores[unique[line]]) for line in lines]
+
+
+# 基于SnowNLP默认模型的共享打分器，首次使用或预热时构建
+SENTIMENT_MODEL = lazy_resource('sentiment_model', BatchSentimentScorer, 'SnowNLP情感模型（批量打分表）')
+
+
+def get_default_scorer() -> BatchSentimentScorer:
+    """获取基于SnowNLP默认模型的共享打分器（首次调用时构建）"""
+    return SENTIMENT_MODEL.get()
+
+
+def score_batch(lines: List[str]) -> List[float]:
+    """批量计算多句歌词的情感得分（0-1，越接近1越积极）"""
+    return get_default_scorer().score_batch(lines)
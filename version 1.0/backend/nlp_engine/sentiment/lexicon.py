@@ -0,0 +1,102 @@
+"""
+情感词典模块
+将情感词汇编译为词语→情感类别的索引，并用Aho-Corasick自动机在原句上一次扫描完成匹配
+"""
+import os
+from typing import Dict, Iterable, List
+
+from ..utils.automaton import AhoCorasick
+
+
+# 扩展情感词汇库（18类）
+EXTENDED_EMOTIONS = {
+    'joyful': ['快乐', '开心', '喜悦', '欢快', '兴奋', '愉悦', '欣喜', '畅快', '爽朗', '明媚', '欢乐', '高兴', '愉快'],
+    'melancholic': ['忧郁', '悲伤', '哀伤', '凄凉', '落寞', '惆怅', '伤感', '悲凉', '凄美', '黯然', '难过', '痛苦', '伤心'],
+    'romantic': ['浪漫', '温柔', '甜蜜', '温馨', '缠绵', '深情', '柔情', '缱绻', '旖旎', '爱恋', '心动', '情意'],
+    'passionate': ['激情', '热烈', '炽热', '狂热', '奔放', '激昂', '澎湃', '燃烧', '沸腾', '狂热', '热情'],
+    'peaceful': ['平静', '安宁', '宁静', '祥和', '恬淡', '淡泊', '静谧', '悠然', '舒缓', '平和', '安静', '宁静'],
+    'nostalgic': ['怀旧', '怀念', '追忆', '回忆', '缅怀', '思念', '眷恋', '留恋', '回味', '追思', '往事', '过去'],
+    'hopeful': ['希望', '期待', '憧憬', '向往', '期盼', '展望', '希冀', '渴望', '盼望', '期待', '梦想'],
+    'lonely': ['孤独', '寂寞', '孤单', '孤寂', '落单', '形单影只', '孑然', '孤身', '独处', '孤零', '独自'],
+    'energetic': ['活力', '朝气', '蓬勃', '生机', '活力四射', '充满活力', '精神', '振奋', '昂扬', '蓬勃', '活跃'],
+    'mysterious': ['神秘', '深邃', '幽深', '玄妙', '奥秘', '神秘莫测', '深不可测', '幽玄', '玄奥', '神秘', '未知'],
+    'dreamy': ['梦幻', '朦胧', '迷离', '虚幻', '缥缈', '如幻', '似梦', '迷蒙', '恍惚', '梦幻', '梦境'],
+    'powerful': ['力量', '强大', '有力', '强劲', '雄浑', '磅礴', '震撼', '强烈', '威猛', '雄壮', '强大'],
+    'warm': ['温暖', '暖和', '温馨', '暖意', '和煦', '暖阳', '温情', '暖心'],
+    'cool': ['清凉', '清爽', '凉爽', '清冷', '冷静', '冷静', '淡然'],
+    'sad': ['难过', '伤心', '痛苦', '悲伤', '哀痛', '痛心', '心碎'],
+    'angry': ['愤怒', '生气', '恼火', '愤慨', '怒火', '气愤'],
+    'calm': ['冷静', '镇定', '沉着', '平静', '淡定', '从容'],
+    'excited': ['激动', '兴奋', '振奋', '激昂', '热血', '澎湃']
+}
+
+
+class EmotionLexicon:
+    """编译后的情感词典
+
+    - word_index: 词语 → 情感类别列表（倒排索引，一个词可属于多个类别）
+    - 匹配：在原句上运行自动机，取最左最长的互不重叠命中，
+      多字词条（如“形单影只”）不依赖jieba的分词结果
+    """
+
+    def __init__(self, emotions: Dict[str, List[str]] = None):
+        self.word_index: Dict[str, List[str]] = {}
+        self.categories: List[str] = []
+        self._automaton = AhoCorasick()
+        for category, words in (emotions or {}).items():
+            self.add_words(category, words)
+        self._automaton.build()
+
+    def add_words(self, category: str, words: Iterable[str]):
+        """向词典中加入某一情感类别的词语"""
+        if category not in self.categories:
+            self.categories.append(category)
+        for word in words:
+            word = word.strip()
+            if not word:
+                continue
+            categories = self.word_index.setdefault(word, [])
+            if category not in categories:
+                categories.append(category)
+            self._automaton.add(word, category)
+
+    def load_file(self, path: str):
+        """加载外部词典文件
+
+        文件为UTF-8文本，每行“词语 情感类别”（空白或制表符分隔），
+        以#开头的行为注释。加载完成后自动重建自动机。
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split()
+                if len(parts) < 2:
+                    continue
+                self.add_words(parts[1], [parts[0]])
+        self._automaton.build()
+
+    def match(self, text: str) -> Dict[str, int]:
+        """统计句子命中各情感类别的次数（按类别在词典中的顺序）"""
+        counts = {}
+        for _, _, categories in self._automaton.find_longest(text):
+            for category in categories:
+                counts[category] = counts.get(category, 0) + 1
+        order = {category: i for i, category in enumerate(self.categories)}
+        return dict(sorted(counts.items(), key=lambda x: order[x[0]]))
+
+    @classmethod
+    def from_files(cls, paths: Iterable[str], emotions: Dict[str, List[str]] = None) -> 'EmotionLexicon':
+        """基于内置词汇创建词典，并追加外部词典文件"""
+        lexicon = cls(EXTENDED_EMOTIONS if emotions is None else emotions)
+        for path in paths:
+            if path and os.path.exists(path):
+                lexicon.load_file(path)
+            elif path:
+                print(f"情感词典文件不存在: {path}")
+        return lexicon
+
+
+# 默认词典：模块加载时编译一次，所有分析器共享
+DEFAULT_LEXICON = EmotionLexicon(EXTENDED_EMOTIONS)
@@ -1,6 +1,7 @@
 from .extractor import ThemeExtractor
+from .idf import CorpusIDF
 
-__all__ = ['ThemeExtractor']
+__all__ = ['ThemeExtractor', 'CorpusIDF']
 
 
 
@@ -2,10 +2,14 @@
 主题提取模块
 自动提取关键词、主题聚类、生成词云数据
 """
-import jieba
-import jieba.analyse
-from collections import Counter
-from typing import List, Dict, Tuple
+import os
+from bisect import bisect_right
+import numpy as np
+from typing import List, Dict, Tuple, Optional
+from ..utils.automaton import AhoCorasick
+from ..utils.lazy import JIEBA, JIEBA_ANALYSE, JIEBA_IDF
+from ..utils.paths import data_path
+from .idf import CorpusIDF
 
 
 class ThemeExtractor:
@@ -23,95 +27,209 @@ class ThemeExtractor:
         '快乐': ['笑', '开心', '快乐', '幸福', '喜悦', '欢乐']
     }
     
-    def __init__(self):
-        # 加载自定义词典
-        jieba.initialize()
+    # 扩展主题关键词库（分类用）
+    EXTENDED_THEMES = {
+        '爱情': ['爱', '恋', '情', '心', '思念', '拥抱', '吻', '温柔', '浪漫', '甜蜜', '恋人', '情侣', '相爱', '深情'],
+        '励志': ['梦想', '坚持', '努力', '奋斗', '成功', '希望', '未来', '勇敢', '坚强', '拼搏', '追求', '目标'],
+        '怀旧': ['回忆', '过去', '曾经', '青春', '时光', '岁月', '怀念', '往事', '从前', '旧时', '记忆'],
+        '友情': ['朋友', '兄弟', '友谊', '陪伴', '一起', '共同', '支持', '伙伴', '知己', '同伴'],
+        '孤独': ['孤独', '寂寞', '独自', '一个人', '空虚', '失落', '孤单', '孤寂', '落寞'],
+        '自由': ['自由', '飞翔', '天空', '风', '无拘无束', '释放', '解脱', '自在'],
+        '悲伤': ['哭', '泪', '痛', '伤', '失去', '离别', '痛苦', '难过', '伤心', '哀伤'],
+        '快乐': ['笑', '开心', '快乐', '幸福', '喜悦', '欢乐', '高兴', '愉快', '欣喜'],
+        '自然': ['山', '海', '风', '雨', '云', '月', '星', '花', '树', '鸟', '自然', '风景'],
+        '城市': ['城市', '街道', '霓虹', '灯火', '高楼', '都市', '繁华', '喧嚣'],
+        '夜晚': ['夜', '夜晚', '深夜', '星空', '月亮', '黑暗', '寂静', '宁静'],
+        '旅行': ['旅行', '远方', '旅程', '出发', '到达', '风景', '探索', '冒险'],
+        '成长': ['成长', '长大', '经历', '变化', '成熟', '蜕变', '进步'],
+        '离别': ['离别', '分别', '再见', '离开', '远去', '告别', '分离']
+    }
+    
+    # 实体识别词表：词中含人称/场景字即视为人物/场景
+    PERSON_PATTERNS = ['你', '我', '他', '她', '我们', '你们']
+    SCENE_KEYWORDS = ['夜', '雨', '风', '海', '山', '城市', '街', '房间', '窗', '门']
+    ENTITY_TYPES = ('person', 'scene', 'emotion')
+    
+    _entity_matcher = None  # 实体词表编译后的AhoCorasick自动机
+    _theme_index = None  # EXTENDED_THEMES编译后的(词表, 主题×词表矩阵, 各主题关键词数)
+    
+    def __init__(self, idf_path: str = None):
+        # 分词词典在首次分析时加载（或由预热提前加载），构造本身不做重量级初始化
+        # 歌词语料IDF表（前缀路径），存在时替代jieba通用IDF表
+        self.idf_path = idf_path or os.environ.get('LYRICS_IDF_PATH') or data_path('lyrics_idf')
+        self._corpus_idf = None
+        self._idf_checked = False
+    
+    @property
+    def corpus_idf(self) -> Optional[CorpusIDF]:
+        """语料IDF表（首次使用时加载，文件不存在时为None）"""
+        if not self._idf_checked:
+            self._idf_checked = True
+            if os.path.exists(self.idf_path + '.vocab') and os.path.exists(self.idf_path + '.npy'):
+                try:
+                    self._corpus_idf = CorpusIDF.load(self.idf_path)
+                except Exception as e:
+                    print(f"加载语料IDF表失败: {e}")
+        return self._corpus_idf
     
     def extract_keywords(self, lyrics: str, top_k: int = 20) -> List[Dict]:
         """提取关键词"""
+        # 有语料IDF表时使用歌词语料的IDF
+        if self.corpus_idf is not None:
+            return self.extract_keywords_batch([lyrics], top_k)[0]
+        
         # 使用TF-IDF提取关键词
-        keywords = jieba.analyse.extract_tags(lyrics, topK=top_k, withWeight=True)
+        keywords = JIEBA_ANALYSE.get().extract_tags(lyrics, topK=top_k, withWeight=True)
         
         return [{'word': word, 'weight': float(weight)} for word, weight in keywords]
     
+    def extract_keywords_batch(self, lyrics_list: List[str], top_k: int = 20) -> List[List[Dict]]:
+        """批量提取关键词（一次向量化计算所有歌词的TF-IDF）
+        
+        优先使用语料IDF表，没有时使用jieba通用IDF表
+        """
+        return [[{'word': word, 'weight': weight} for word, weight in keywords]
+                for keywords in self._keyword_table().extract_keywords_batch(lyrics_list, top_k)]
+    
+    def extract_keywords_tokens(self, token_lists: List[List[str]], top_k: int = 20) -> List[List[Dict]]:
+        """对已分词的歌词（jieba的原始切分结果）批量提取关键词，IDF表的选择与extract_keywords_batch相同"""
+        return [[{'word': word, 'weight': weight} for word, weight in keywords]
+                for keywords in self._keyword_table().extract_keywords_tokens(token_lists, top_k)]
+    
+    def _keyword_table(self) -> CorpusIDF:
+        """关键词提取使用的IDF表：语料IDF表，没有时为jieba通用IDF表"""
+        table = self.corpus_idf
+        return table if table is not None else JIEBA_IDF.get()
+    
     def classify_theme(self, lyrics: str) -> List[Dict]:
         """主题分类（改进算法，更准确）"""
-        # 分词
-        words = jieba.cut(lyrics)
-        word_list = [w for w in words if len(w.strip()) > 0]
-        word_counter = Counter(word_list)
-        total_words = len(word_list)
-        
-        # 扩展主题关键词库
-        extended_themes = {
-            '爱情': ['爱', '恋', '情', '心', '思念', '拥抱', '吻', '温柔', '浪漫', '甜蜜', '恋人', '情侣', '相爱', '深情'],
-            '励志': ['梦想', '坚持', '努力', '奋斗', '成功', '希望', '未来', '勇敢', '坚强', '拼搏', '追求', '目标'],
-            '怀旧': ['回忆', '过去', '曾经', '青春', '时光', '岁月', '怀念', '往事', '从前', '旧时', '记忆'],
-            '友情': ['朋友', '兄弟', '友谊', '陪伴', '一起', '共同', '支持', '伙伴', '知己', '同伴'],
-            '孤独': ['孤独', '寂寞', '独自', '一个人', '空虚', '失落', '孤单', '孤寂', '落寞'],
-            '自由': ['自由', '飞翔', '天空', '风', '无拘无束', '释放', '解脱', '自在'],
-            '悲伤': ['哭', '泪', '痛', '伤', '失去', '离别', '痛苦', '难过', '伤心', '哀伤'],
-            '快乐': ['笑', '开心', '快乐', '幸福', '喜悦', '欢乐', '高兴', '愉快', '欣喜'],
-            '自然': ['山', '海', '风', '雨', '云', '月', '星', '花', '树', '鸟', '自然', '风景'],
-            '城市': ['城市', '街道', '霓虹', '灯火', '高楼', '都市', '繁华', '喧嚣'],
-            '夜晚': ['夜', '夜晚', '深夜', '星空', '月亮', '黑暗', '寂静', '宁静'],
-            '旅行': ['旅行', '远方', '旅程', '出发', '到达', '风景', '探索', '冒险'],
-            '成长': ['成长', '长大', '经历', '变化', '成熟', '蜕变', '进步'],
-            '离别': ['离别', '分别', '再见', '离开', '远去', '告别', '分离']
-        }
+        return self.classify_theme_batch([lyrics])[0]
+    
+    def classify_theme_batch(self, lyrics_list: List[str]) -> List[List[Dict]]:
+        """批量主题分类：所有歌词的词频矩阵与主题×词表矩阵一次稀疏相乘"""
+        jieba = JIEBA.get()
+        token_lists = [[w for w in jieba.cut(lyrics) if len(w.strip()) > 0] for lyrics in lyrics_list]
+        return self.classify_theme_tokens(token_lists)
+    
+    def classify_theme_tokens(self, token_lists: List[List[str]]) -> List[List[Dict]]:
+        """对已分词的文本批量主题分类
         
-        theme_scores = {}
-        for theme, keywords in extended_themes.items():
-            # 计算匹配的关键词数量和权重
-            matched_keywords = [kw for kw in keywords if word_counter.get(kw, 0) > 0]
-            if matched_keywords:
-                # 计算总匹配次数
-                total_matches = sum(word_counter.get(kw, 0) for kw in matched_keywords)
-                # 计算匹配的关键词比例
-                keyword_ratio = len(matched_keywords) / len(keywords)
-                # 计算在总词数中的比例
-                word_ratio = total_matches / total_words if total_words > 0 else 0
-                # 综合得分
-                score = total_matches * 0.6 + keyword_ratio * 10 + word_ratio * 100
-                theme_scores[theme] = score
+        每个主题的得分：
+            总匹配次数 × 0.6 + 匹配关键词比例 × 10 + 匹配词占总词数比例 × 100
+        其中总匹配次数 = 词频向量 · 主题关键词向量，匹配关键词数 = 词是否出现 · 主题关键词向量
+        """
+        from scipy import sparse
+        vocab, theme_matrix, keyword_counts = self._get_theme_index()
+        themes = list(self.EXTENDED_THEMES.keys())
         
-        # 按分数排序，返回所有有得分的主题
-        sorted_themes = sorted(theme_scores.items(), key=lambda x: x[1], reverse=True)
+        # 文档×主题词表的词频矩阵（非主题词只计入总词数）
+        rows, cols = [], []
+        total_words = np.zeros(len(token_lists), dtype=np.float64)
+        for i, tokens in enumerate(token_lists):
+            total_words[i] = len(tokens)
+            for word in tokens:
+                col = vocab.get(word)
+                if col is not None:
+                    rows.append(i)
+                    cols.append(col)
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(token_lists), len(vocab)))
         
-        # 归一化得分到0-1范围
-        if sorted_themes:
-            max_score = sorted_themes[0][1]
-            normalized = [{'theme': theme, 'score': round(score / max_score, 2) if max_score > 0 else 0} 
-                          for theme, score in sorted_themes]
-            return normalized[:10]  # 返回前10个主题
+        total_matches = (counts @ theme_matrix.T).toarray()
+        matched_keywords = ((counts > 0).astype(np.float64) @ theme_matrix.T).toarray()
+        keyword_ratio = matched_keywords / keyword_counts
+        with np.errstate(divide='ignore', invalid='ignore'):
+            word_ratio = np.where(total_words[:, None] > 0, total_matches / total_words[:, None], 0.0)
+        scores = total_matches * 0.6 + keyword_ratio * 10 + word_ratio * 100
         
-        return []
+        results = []
+        for i in range(len(token_lists)):
+            hit = np.flatnonzero(matched_keywords[i] > 0)
+            if len(hit) == 0:
+                results.append([])
+                continue
+            # 按分数降序排序（分数相同保持主题库顺序）
+            ordered = hit[np.argsort(-scores[i, hit], kind='stable')]
+            # 归一化得分到0-1范围
+            max_score = float(scores[i, ordered[0]])
+            normalized = [{'theme': themes[t], 'score': round(float(scores[i, t]) / max_score, 2) if max_score > 0 else 0}
+                          for t in ordered]
+            results.append(normalized[:10])  # 返回前10个主题
+        return results
+    
+    @classmethod
+    def _get_theme_index(cls):
+        """主题关键词库编译成的稀疏矩阵（主题数×词表大小），首次使用时构建一次"""
+        if cls._theme_index is None:
+            from scipy import sparse
+            vocab: Dict[str, int] = {}
+            rows, cols = [], []
+            for t, keywords in enumerate(cls.EXTENDED_THEMES.values()):
+                for keyword in keywords:
+                    rows.append(t)
+                    cols.append(vocab.setdefault(keyword, len(vocab)))
+            # 重复出现的关键词会累加为2，与逐个关键词计数的结果一致
+            theme_matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                             shape=(len(cls.EXTENDED_THEMES), len(vocab)))
+            keyword_counts = np.array([len(keywords) for keywords in cls.EXTENDED_THEMES.values()],
+                                      dtype=np.float64)
+            cls._theme_index = (vocab, theme_matrix, keyword_counts)
+        return cls._theme_index
     
     def extract_entities(self, lyrics: str) -> Dict:
-        """提取实体（人物、场景等）"""
-        words = jieba.cut(lyrics)
-        word_list = [w for w in words if len(w.strip()) > 0]
+        """提取实体（人物、场景、情感词），并给出每个实体在原文中的字符位置
         
-        # 简单的人物识别（包含常见人称）
-        persons = [w for w in word_list if any(p in w for p in ['你', '我', '他', '她', '我们', '你们'])]
+        整段歌词只用自动机扫描一次，命中结果按分词的字符区间归到对应的词上：
+        含人称或场景字的词记为人物/场景，与情感词完全相同的词记为情感词。
+        """
+        tokens = [(w, start, end) for w, start, end in JIEBA.get().tokenize(lyrics) if w.strip()]
+        starts = [start for _, start, _ in tokens]
         
-        # 场景词（包含常见场景词）
-        scene_keywords = ['夜', '雨', '风', '海', '山', '城市', '街', '房间', '窗', '门']
-        scenes = [w for w in word_list if any(sk in w for sk in scene_keywords)]
+        token_types: Dict[int, set] = {}
+        for start, end, values in self._get_entity_matcher().iter_matches(lyrics):
+            t = bisect_right(starts, start) - 1
+            if t < 0 or end > tokens[t][2]:
+                continue  # 命中跨越了分词边界
+            _, token_start, token_end = tokens[t]
+            for entity_type in values:
+                if entity_type == 'emotion' and (start != token_start or end != token_end):
+                    continue  # 情感词要求整词匹配
+                token_types.setdefault(t, set()).add(entity_type)
+        
+        persons, scenes, emotion_words, entity_spans = [], [], [], []
+        for t in sorted(token_types):
+            word, start, end = tokens[t]
+            for entity_type in self.ENTITY_TYPES:
+                if entity_type in token_types[t]:
+                    entity_spans.append({'text': word, 'type': entity_type, 'start': start, 'end': end})
+            if 'person' in token_types[t]:
+                persons.append(word)
+            if 'scene' in token_types[t]:
+                scenes.append(word)
+            if 'emotion' in token_types[t]:
+                emotion_words.append(word)
         
         return {
-            'persons': list(set(persons))[:10],
-            'scenes': list(set(scenes))[:10],
-            'emotion_words': self._extract_emotion_words(word_list)
+            'persons': list(dict.fromkeys(persons))[:10],
+            'scenes': list(dict.fromkeys(scenes))[:10],
+            'emotion_words': emotion_words[:15],
+            'entity_spans': entity_spans
         }
     
-    def _extract_emotion_words(self, words: List[str]) -> List[str]:
-        """提取情感词"""
-        emotion_keywords = []
-        for theme, keywords in self.THEME_KEYWORDS.items():
-            emotion_keywords.extend(keywords)
-        
-        return [w for w in words if w in emotion_keywords][:15]
+    @classmethod
+    def _get_entity_matcher(cls) -> AhoCorasick:
+        """人物、场景、情感词编译成的多模式匹配自动机，首次使用时构建一次"""
+        if cls._entity_matcher is None:
+            matcher = AhoCorasick()
+            for pattern in cls.PERSON_PATTERNS:
+                matcher.add(pattern, 'person')
+            for pattern in cls.SCENE_KEYWORDS:
+                matcher.add(pattern, 'scene')
+            for keywords in cls.THEME_KEYWORDS.values():
+                for keyword in keywords:
+                    matcher.add(keyword, 'emotion')
+            matcher.build()
+            cls._entity_matcher = matcher
+        return cls._entity_matcher
     
     def analyze_theme(self, lyrics: str) -> Dict:
         """完整主题分析"""
@@ -0,0 +1,238 @@
+"""
+语料IDF模块
+基于自有歌词语料拟合IDF表，以紧凑的二进制格式保存（可内存映射），并批量提取关键词
+
+文件格式（同一前缀的两个文件）：
+    <prefix>.vocab  UTF-8词表，每行一个词，行号即词的编号
+    <prefix>.npy    float32 IDF数组，与词表一一对应，加载时以mmap方式映射
+
+命令行：
+    python -m nlp_engine.theme.idf fit songs.jsonl data/lyrics_idf
+    python -m nlp_engine.theme.idf keywords songs.jsonl --idf data/lyrics_idf --top-k 20
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from ..utils.lazy import JIEBA, JIEBA_ANALYSE, JIEBA_IDF
+from ..utils.paths import atomic_files
+
+
+class CorpusIDF:
+    """语料IDF表
+
+    分词和过滤规则与jieba.analyse.extract_tags一致（去掉单字和停用词），
+    未登录词使用IDF中位数，因此可直接替换jieba自带的通用IDF表。
+    """
+
+    def __init__(self, vocab: List[str], idf: np.ndarray, median_idf: float = None):
+        self.words = vocab
+        self.vocab: Dict[str, int] = {word: i for i, word in enumerate(vocab)}
+        self.idf = idf
+        if median_idf is None:
+            median_idf = float(np.sort(np.asarray(idf))[len(idf) // 2]) if len(idf) else 0.0
+        self.median_idf = median_idf
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    # ---------- 分词 ----------
+
+    @staticmethod
+    def filter_tokens(words: Iterable[str]) -> List[str]:
+        """过滤单字和停用词（与jieba.analyse一致）"""
+        stop_words = JIEBA_ANALYSE.get().default_tfidf.stop_words
+        return [w for w in words if len(w.strip()) >= 2 and w.lower() not in stop_words]
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """分词并过滤单字和停用词（与jieba.analyse一致）"""
+        return cls.filter_tokens(JIEBA.get().cut(text))
+
+    # ---------- 拟合 / 保存 / 加载 ----------
+
+    @classmethod
+    def fit(cls, documents: Iterable[str], min_df: int = 1) -> 'CorpusIDF':
+        """在语料上拟合IDF：idf = ln((1 + N) / (1 + df)) + 1"""
+        df: Dict[str, int] = {}
+        n_docs = 0
+        for doc in documents:
+            n_docs += 1
+            for word in set(cls.tokenize(doc)):
+                df[word] = df.get(word, 0) + 1
+
+        vocab = sorted(word for word, count in df.items() if count >= min_df)
+        counts = np.fromiter((df[word] for word in vocab), dtype=np.float64, count=len(vocab))
+        idf = (np.log((1.0 + n_docs) / (1.0 + counts)) + 1.0).astype(np.float32)
+        return cls(vocab, idf)
+
+    @classmethod
+    def from_jieba(cls) -> 'CorpusIDF':
+        """使用jieba自带的通用IDF表"""
+        idf_freq, median = JIEBA_ANALYSE.get().default_tfidf.idf_loader.get_idf()
+        vocab = list(idf_freq.keys())
+        idf = np.fromiter(idf_freq.values(), dtype=np.float64, count=len(vocab))
+        return cls(vocab, idf, median)
+
+    def save(self, prefix: str):
+        """保存为 <prefix>.vocab + <prefix>.npy（先写临时文件再替换，避免读到半成品）"""
+        with atomic_files(prefix + '.vocab', prefix + '.npy') as (vocab_tmp, idf_tmp):
+            with open(vocab_tmp, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(self.words))
+            with open(idf_tmp, 'wb') as f:
+                np.save(f, np.asarray(self.idf, dtype=np.float32))
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> 'CorpusIDF':
+        """加载IDF表，IDF数组以只读mmap映射，多进程共享同一份页缓存"""
+        with open(prefix + '.vocab', 'r', encoding='utf-8') as f:
+            content = f.read()
+        vocab = content.split('\n') if content else []
+        idf = np.load(prefix + '.npy', mmap_mode='r' if mmap else None)
+        if len(idf) != len(vocab):
+            raise ValueError(f"IDF表损坏: 词表{len(vocab)}项，IDF数组{len(idf)}项")
+        return cls(vocab, idf)
+
+    # ---------- 批量关键词提取 ----------
+
+    def extract_keywords_batch(self, documents: List[str], top_k: int = 20) -> List[List[Tuple[str, float]]]:
+        """批量提取关键词"""
+        jieba = JIEBA.get()
+        return self.extract_keywords_tokens([jieba.cut(doc) for doc in documents], top_k)
+
+    def extract_keywords_tokens(self, token_lists: List[Iterable[str]],
+                                top_k: int = 20) -> List[List[Tuple[str, float]]]:
+        """对已分词的文档（jieba的原始切分结果）批量提取关键词
+
+        所有文档组成一个稀疏词频矩阵，一次计算TF-IDF权重，再对全部非零元素
+        按（文档, 权重降序）排序后截取每个文档的前top_k个，整个过程没有逐文档的排序循环。
+        未登录词在本批次内临时编号，使用IDF中位数。
+        """
+        if not token_lists:
+            return []
+
+        extra: Dict[str, int] = {}
+        rows, cols = [], []
+        for i, tokens in enumerate(token_lists):
+            for word in self.filter_tokens(tokens):
+                col = self.vocab.get(word)
+                if col is None:
+                    col = extra.get(word)
+                    if col is None:
+                        col = len(self.words) + len(extra)
+                        extra[word] = col
+                rows.append(i)
+                cols.append(col)
+
+        if not rows:
+            return [[] for _ in token_lists]
+
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        n_docs = len(token_lists)
+
+        # 合并同一文档中的重复词：按(文档, 词)编码后取唯一值并计数
+        width = len(self.words) + len(extra)
+        unique_keys, counts = np.unique(rows * width + cols, return_counts=True)
+        doc_ids = unique_keys // width
+        term_ids = unique_keys % width
+
+        idf = np.concatenate([np.asarray(self.idf, dtype=np.float64),
+                              np.full(len(extra), self.median_idf, dtype=np.float64)])
+        totals = np.bincount(doc_ids, weights=counts, minlength=n_docs)
+        weights = counts * idf[term_ids] / totals[doc_ids]
+
+        # 每个文档内按权重降序（权重相同按词序，结果稳定）
+        order = np.lexsort((term_ids, -weights, doc_ids))
+        doc_ids, term_ids, weights = doc_ids[order], term_ids[order], weights[order]
+        starts = np.searchsorted(doc_ids, np.arange(n_docs))
+        rank = np.arange(len(doc_ids)) - starts[doc_ids]
+        keep = rank < top_k if top_k else np.ones(len(doc_ids), dtype=bool)
+
+        extra_words = sorted(extra, key=extra.get)
+        results: List[List[Tuple[str, float]]] = [[] for _ in token_lists]
+        for doc, term, weight in zip(doc_ids[keep], term_ids[keep], weights[keep]):
+            word = self.words[term] if term < len(self.words) else extra_words[term - len(self.words)]
+            results[doc].append((word, float(weight)))
+        return results
+
+
+def _read_documents(path: str) -> List[str]:
+    """读取语料：NDJSON（每行一个含lyrics字段的对象）或目录下的.txt文件（每个文件一首）"""
+    if os.path.isdir(path):
+        documents = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.txt'):
+                with open(os.path.join(path, name), 'r', encoding='utf-8') as f:
+                    documents.append(f.read())
+        return documents
+    documents = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                documents.append(json.loads(line).get('lyrics', ''))
+    return documents
+
+
+_worker_tables: Dict[str, CorpusIDF] = {}
+
+
+def _keywords_worker(job: Tuple[str, List[str], int]) -> List[List[Tuple[str, float]]]:
+    """批量关键词提取任务（每个进程只加载一次IDF表）"""
+    idf_prefix, documents, top_k = job
+    key = idf_prefix or ''
+    if key not in _worker_tables:
+        _worker_tables[key] = CorpusIDF.load(idf_prefix) if idf_prefix else JIEBA_IDF.get()
+    return _worker_tables[key].extract_keywords_batch(documents, top_k)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='歌词语料IDF表：拟合与批量关键词提取')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    fit_parser = sub.add_parser('fit', help='在语料上拟合IDF表')
+    fit_parser.add_argument('corpus', help='NDJSON文件或.txt文件目录')
+    fit_parser.add_argument('output', help='输出文件前缀')
+    fit_parser.add_argument('--min-df', type=int, default=1)
+
+    kw_parser = sub.add_parser('keywords', help='批量提取关键词（输出NDJSON）')
+    kw_parser.add_argument('corpus', help='NDJSON文件或.txt文件目录')
+    kw_parser.add_argument('--idf', help='IDF表前缀（默认使用jieba通用IDF表）')
+    kw_parser.add_argument('--top-k', type=int, default=20)
+    kw_parser.add_argument('--batch-size', type=int, default=2000)
+    kw_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    args = parser.parse_args(argv)
+    documents = _read_documents(args.corpus)
+
+    if args.command == 'fit':
+        table = CorpusIDF.fit(documents, min_df=args.min_df)
+        table.save(args.output)
+        print(f"已拟合IDF表：{len(documents)}篇文档，{len(table)}个词 -> {args.output}", file=sys.stderr)
+    else:
+        batches = [(args.idf, documents[start:start + args.batch_size], args.top_k)
+                   for start in range(0, len(documents), args.batch_size)]
+        if args.workers > 1:
+            # 分词是主要开销，多进程并行；IDF数组为mmap，各进程共享同一份页缓存
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                results = pool.map(_keywords_worker, batches)
+        else:
+            results = map(_keywords_worker, batches)
+
+        index = 0
+        for batch_keywords in results:
+            for keywords in batch_keywords:
+                record = {'index': index,
+                          'keywords': [{'word': w, 'weight': round(wt, 6)} for w, wt in keywords]}
+                print(json.dumps(record, ensure_ascii=False))
+                index += 1
+
+
+if __name__ == '__main__':
+    main()
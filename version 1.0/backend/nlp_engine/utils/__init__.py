@@ -1,8 +1,9 @@
 # 工具模块
-
-
-
-
-
-
-
+from .automaton import AhoCorasick
+from .cache import LRUCache
+from .lazy import LazyResource, lazy_resource, warm_up
+from .paths import data_path
+from .ranking import top_k_indices, select_top_k
+
+__all__ = ['AhoCorasick', 'LRUCache', 'LazyResource', 'lazy_resource', 'warm_up', 'data_path',
+           'top_k_indices', 'select_top_k']
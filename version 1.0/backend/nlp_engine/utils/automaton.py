@@ -0,0 +1,97 @@
+"""
+多模式匹配自动机
+基于Aho-Corasick算法，一次扫描文本即可找出所有词典词条
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple, Any
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配自动机
+
+    构建完成后匹配耗时与文本长度（加命中数）成正比，与词典大小无关。
+    每个词条可附带一个值（如情感类别），同一词条多次加入时值会合并为列表。
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]] = None):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[int] = [-1]  # 输出链接：沿失败链最近的词条结尾节点
+        self._values: List[List[Any]] = [[]]
+        self._depth: List[int] = [0]
+        self._built = False
+        if patterns:
+            for pattern, value in patterns:
+                self.add(pattern, value)
+            self.build()
+
+    def __len__(self) -> int:
+        return sum(1 for values in self._values if values)
+
+    def add(self, pattern: str, value: Any = None):
+        """加入一个词条（加入后需重新build）"""
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(-1)
+                self._values.append([])
+                self._depth.append(self._depth[node] + 1)
+            node = nxt
+        if value not in self._values[node]:
+            self._values[node].append(value)
+        self._built = False
+
+    def build(self):
+        """广度优先计算失败指针和输出链接"""
+        queue = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._output[child] = -1
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                fail_node = self._fail[child]
+                self._output[child] = fail_node if self._values[fail_node] else self._output[fail_node]
+                queue.append(child)
+
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, List[Any]]]:
+        """遍历所有命中（含重叠），返回 (起始位置, 结束位置, 值列表)"""
+        if not self._built:
+            self.build()
+        goto, fail, output, values, depth = self._goto, self._fail, self._output, self._values, self._depth
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if values[node] else output[node]
+            while hit > 0:
+                yield i + 1 - depth[hit], i + 1, values[hit]
+                hit = output[hit]
+
+    def find_longest(self, text: str) -> List[Tuple[int, int, List[Any]]]:
+        """最左最长、互不重叠的命中（与分词粒度一致，如“活力四射”不会再计入“活力”）"""
+        matches = sorted(self.iter_matches(text), key=lambda m: (m[0], m[0] - m[1]))
+        result = []
+        last_end = 0
+        for start, end, value in matches:
+            if start >= last_end:
+                result.append((start, end, value))
+                last_end = end
+        return result
@@ -0,0 +1,135 @@
+"""
+延迟加载模块
+重量级资源（分词词典、情感模型等）在首次使用或显式预热时才加载，并记录加载耗时
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class LazyResource:
+    """延迟加载的资源：首次get()时调用loader，之后直接返回结果（线程安全）"""
+
+    def __init__(self, name: str, loader: Callable[[], Any], description: str = ''):
+        self.name = name
+        self.description = description
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded = False
+        self.load_seconds: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        """获取资源，未加载时先加载"""
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - start, 4)
+                self.loaded_at = time.time()
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def status(self) -> Dict:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'loaded': self._loaded,
+            'load_seconds': self.load_seconds,
+            'loaded_at': self.loaded_at,
+            'error': self.error
+        }
+
+
+_registry: Dict[str, LazyResource] = {}
+
+# 启动预热（NLP_WARMUP为background或blocking）默认加载的资源；押韵索引由离线命令生成，按需加载
+DEFAULT_WARMUP_RESOURCES = ('jieba', 'jieba_analyse', 'sentiment_model', 'pinyin_table')
+
+
+def lazy_resource(name: str, loader: Callable[[], Any], description: str = '') -> LazyResource:
+    """注册（或获取已注册的）延迟加载资源"""
+    if name not in _registry:
+        _registry[name] = LazyResource(name, loader, description)
+    return _registry[name]
+
+
+def resource_status() -> List[Dict]:
+    """所有已注册资源的加载状态"""
+    return [resource.status() for resource in _registry.values()]
+
+
+def _names_from_env(name: str) -> Optional[List[str]]:
+    """读取逗号分隔的资源名列表，未设置时返回None，all表示全部已注册资源"""
+    value = os.environ.get(name)
+    if value is None:
+        return None
+    if value.strip().lower() == 'all':
+        return list(_registry)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def warmup_resources() -> List[str]:
+    """启动时预热的资源：NLP_WARMUP为off时为空，否则为NLP_WARMUP_RESOURCES或默认列表"""
+    if os.environ.get('NLP_WARMUP', 'off').lower() not in ('background', 'blocking'):
+        return []
+    names = _names_from_env('NLP_WARMUP_RESOURCES')
+    return list(DEFAULT_WARMUP_RESOURCES) if names is None else names
+
+
+def ready_resources() -> List[str]:
+    """就绪检查要求已加载的资源：NLP_READY_RESOURCES，默认与启动时预热的资源相同"""
+    names = _names_from_env('NLP_READY_RESOURCES')
+    return warmup_resources() if names is None else names
+
+
+def warm_up(names: Iterable[str] = None) -> List[Dict]:
+    """预热：加载指定（默认全部）资源，单个资源失败不影响其他资源"""
+    selected = list(names) if names is not None else list(_registry)
+    for name in selected:
+        resource = _registry.get(name)
+        if resource is None:
+            continue
+        try:
+            resource.get()
+        except Exception as e:
+            print(f"资源预热失败 {name}: {e}")
+    return [_registry[name].status() for name in selected if name in _registry]
+
+
+def _load_jieba():
+    import jieba
+    jieba.initialize()
+    return jieba
+
+
+def _load_jieba_analyse():
+    _load_jieba()
+    import jieba.analyse
+    return jieba.analyse
+
+
+def _load_jieba_idf():
+    from ..theme.idf import CorpusIDF
+    return CorpusIDF.from_jieba()
+
+
+# 公共分词资源：jieba词典和jieba.analyse自带的IDF表
+JIEBA = lazy_resource('jieba', _load_jieba, 'jieba分词词典')
+JIEBA_ANALYSE = lazy_resource('jieba_analyse', _load_jieba_analyse, 'jieba关键词提取（IDF表）')
+# jieba通用IDF表转换成的CorpusIDF（没有语料IDF表时用于批量关键词提取），每个进程只构建一份
+JIEBA_IDF = lazy_resource('jieba_idf', _load_jieba_idf, 'jieba通用IDF表（批量关键词提取）')
@@ -0,0 +1,47 @@
+"""
+数据目录
+NLP引擎生成的索引、词表等数据文件默认与数据库放在同一个data目录下
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, List
+
+
+def data_dir() -> str:
+    """数据目录：优先使用环境变量NLP_DATA_DIR，默认为项目根目录下的data"""
+    path = os.environ.get('NLP_DATA_DIR')
+    if not path:
+        backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        path = os.path.join(backend_dir, '..', 'data')
+    return os.path.normpath(path)
+
+
+def data_path(*parts: str) -> str:
+    """数据目录下的文件路径"""
+    return os.path.join(data_dir(), *parts)
+
+
+@contextmanager
+def atomic_files(*paths: str) -> Iterator[List[str]]:
+    """原子写入一组文件：为每个目标文件在同目录下创建唯一命名的临时文件，
+    调用方写完后按顺序替换为目标文件；出错时删除临时文件，目标文件保持不变
+
+    临时文件由tempfile.mkstemp创建，多个进程同时写同一目标也不会互相覆盖半成品。
+    写入.npy时须传入文件对象（np.save对文件名会自动补后缀）。
+    """
+    tmp_paths = []
+    try:
+        for path in paths:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+            os.close(fd)
+            tmp_paths.append(tmp)
+        yield tmp_paths
+        for tmp, path in zip(tmp_paths, paths):
+            os.replace(tmp, path)
+    finally:
+        for tmp in tmp_paths:
+            if os.path.exists(tmp):
+                os.remove(tmp)
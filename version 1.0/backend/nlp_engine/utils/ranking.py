@@ -0,0 +1,39 @@
+"""
+Top-k选择
+得分保存在NumPy数组中，用argpartition在O(n)内选出前k个，只对入选的元素排序；
+得分相同时按次序键排序，结果与完整排序后取前k个一致且可复现
+"""
+from typing import List, Sequence, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+
+def top_k_indices(scores, k: int, tie_break=None) -> np.ndarray:
+    """得分最高的k个下标，按得分降序
+
+    - tie_break: 与scores等长的次序键，得分相同时键小的在前；默认为下标（保持原顺序，与稳定排序一致）
+    - NaN视为最低分
+    """
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    n = len(scores)
+    k = max(0, min(int(k), n))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    keys = np.arange(n) if tie_break is None else np.asarray(tie_break).ravel()
+    neg = -np.where(np.isnan(scores), -np.inf, scores)
+
+    if k < n:
+        # 第k名的得分；与它同分的元素都保留为候选，再由次序键决定取舍
+        kth = np.partition(neg, k - 1)[k - 1]
+        candidates = np.flatnonzero(neg <= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.lexsort((keys[candidates], neg[candidates]))
+    return candidates[order[:k]]
+
+
+def select_top_k(items: Sequence[T], scores, k: int, tie_break=None) -> List[T]:
+    """按得分取前k个元素（得分相同时保持原顺序或按tie_break）"""
+    return [items[i] for i in top_k_indices(scores, k, tie_break)]
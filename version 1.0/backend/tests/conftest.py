@@ -0,0 +1,54 @@
+"""
+测试公共配置
+数据目录、曲库目录、数据库都指向临时目录，测试不会写入项目的data目录
+"""
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+_tmp_root = tempfile.mkdtemp(prefix='lyrics-tests-')
+os.environ['NLP_DATA_DIR'] = os.path.join(_tmp_root, 'data')
+os.environ['CATALOG_DIR'] = os.path.join(_tmp_root, 'catalog')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp_root, 'test.db')
+os.environ['MUSIC_CACHE_PATH'] = 'none'
+os.environ['CATALOG_INGEST_WORKERS'] = '1'
+os.environ['NLP_WARMUP'] = 'off'
+os.environ.pop('ADMIN_TOKEN', None)
+
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
+LINES = [
+    '我爱你就像爱春天', '你是我心中最美的风景', '孤独的夜晚我形单影只', '回忆过去那些美好时光',
+    '青春岁月永远难忘', '追逐梦想永不放弃', '坚持到底成功在望', '寂寞的城市霓虹闪烁',
+    '风吹过山岗带走思念', '月光洒在故乡的小路', '自由的灵魂燃烧激情', '雨后的天空挂着彩虹',
+    '离别的车站泪水模糊', '朋友的笑容温暖人心', '黑夜里寻找一束光明', '大海的尽头是远方'
+]
+
+
+def make_songs(n: int, seed: int = 0, start: int = 0):
+    """生成n首测试歌曲（每首4行，从固定句库中随机抽取）"""
+    rng = random.Random(seed)
+    return [{
+        'id': start + i,
+        'title': f'歌曲{start + i}',
+        'artist': f'歌手{(start + i) % 7}',
+        'lyrics': '\n'.join(rng.sample(LINES, 4)),
+        'theme': rng.choice(['爱情', '励志', '怀旧']),
+        'style': rng.choice(['流行', '摇滚', '抒情'])
+    } for i in range(n)]
+
+
+@pytest.fixture
+def songs():
+    return make_songs(12)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
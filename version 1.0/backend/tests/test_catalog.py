@@ -0,0 +1,120 @@
+"""
+持久化曲库：歌曲表、特征数组、版本目录，以及推荐器曲库的保存/加载
+"""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from nlp_engine.recommendation import CatalogStore, MusicRecommender
+from nlp_engine.recommendation.catalog import FeatureList, SongList, SongTable, write_song_table
+
+
+def test_song_table_round_trip(tmp_path, songs):
+    path = str(tmp_path / 'songs.db')
+    write_song_table(path, songs)
+    table = SongTable(path)
+
+    assert len(table) == len(songs)
+    assert list(table) == songs
+    assert table.get_many([3, 0, 3]) == [songs[3], songs[0], songs[3]]
+    assert table.get_fields([1, 2], 'style') == [songs[1]['style'], songs[2]['style']]
+    assert table.find_row(songs[5]) == 5
+    with pytest.raises(ValueError):
+        table.get_fields([0], 'lyrics')
+
+
+def test_song_list_appends_after_table(tmp_path, songs):
+    path = str(tmp_path / 'songs.db')
+    write_song_table(path, songs[:8])
+    song_list = SongList(SongTable(path))
+    for song in songs[8:]:
+        song_list.append(song)
+
+    assert len(song_list) == len(songs)
+    assert list(song_list) == songs
+    assert song_list.get_many([9, 2]) == [songs[9], songs[2]]
+    assert song_list.get_fields([10, 1], 'artist') == [songs[10]['artist'], songs[1]['artist']]
+    assert song_list.index_of(songs[9]) == 9
+    assert song_list.index_of(songs[4]) == 4
+    with pytest.raises(IndexError):
+        song_list[len(songs)]
+
+
+def test_feature_list_round_trip(tmp_path, songs):
+    recommender = MusicRecommender()
+    features, _ = recommender._extract_features_tokens([song['lyrics'] for song in songs])
+    theme_order = list(recommender.theme_extractor.EXTENDED_THEMES)
+    feature_list = FeatureList(theme_order)
+    for feature in features:
+        feature_list.append(feature)
+    prefix = str(tmp_path / 'features')
+    feature_list.save(prefix)
+
+    loaded = FeatureList.load(prefix, theme_order)
+    assert len(loaded) == len(features)
+    for row, expected in enumerate(features):
+        actual = loaded[row]
+        assert actual['themes'] == expected['themes']
+        assert actual['theme_names'] == expected['theme_names']
+        np.testing.assert_allclose(actual['theme_vector'], expected['theme_vector'])
+        assert actual['sentiment_score'] == expected['sentiment_score']
+        assert actual['sentiment_tone'] == expected['sentiment_tone']
+        assert actual['rhyme_group'] == expected['rhyme_group']
+        assert actual['rhyme_ratio'] == expected['rhyme_ratio']
+    np.testing.assert_array_equal(loaded.theme_indicators(), feature_list.theme_indicators())
+
+    with pytest.raises(ValueError):
+        FeatureList.load(prefix, list(reversed(theme_order)))
+
+
+def test_recommender_catalog_round_trip(tmp_path, songs):
+    recommender = MusicRecommender()
+    recommender.add_songs_to_database(songs)
+    before = recommender.recommend_songs(songs[0]['lyrics'], top_k=5)
+    recommender.save_catalog(str(tmp_path / 'v1'))
+
+    loaded = MusicRecommender()
+    loaded.load_catalog(str(tmp_path / 'v1'))
+    after = loaded.recommend_songs(songs[0]['lyrics'], top_k=5)
+
+    assert len(loaded.song_database) == len(songs)
+    assert [(r['song'], r['similarity']) for r in after] == [(r['song'], r['similarity']) for r in before]
+
+
+def test_catalog_store_publish_and_cleanup(tmp_path):
+    store = CatalogStore(str(tmp_path), retain_seconds=0)
+    assert store.current() is None
+    os.makedirs(tmp_path / 'ingest-abc')
+    os.makedirs(tmp_path / 'uploads')
+
+    versions = []
+    for _ in range(CatalogStore.KEEP_VERSIONS + 2):
+        version = store.new_version()
+        store.publish(version)
+        versions.append(version)
+        assert store.current() == version
+
+    remaining = sorted(name for name in os.listdir(tmp_path) if name[:1].isdigit())
+    assert remaining == [os.path.basename(v) for v in versions[-CatalogStore.KEEP_VERSIONS:]]
+    assert os.path.isdir(tmp_path / 'ingest-abc') and os.path.isdir(tmp_path / 'uploads')
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_replaced_versions_are_kept_for_retain_seconds(tmp_path):
+    store = CatalogStore(str(tmp_path), retain_seconds=600)
+    versions = []
+    for _ in range(CatalogStore.KEEP_VERSIONS + 2):
+        version = store.new_version()
+        store.publish(version)
+        versions.append(version)
+    # 刚被替换的旧版本仍可能有进程在读取，不删除
+    assert all(os.path.isdir(v) for v in versions)
+
+    # 前两个版本被替换已超过保留时间
+    old = time.time() - 3600
+    for version in versions[:3]:
+        os.utime(version, (old, old))
+    store.publish(store.new_version())
+    assert [os.path.isdir(v) for v in versions] == [False, False, True, True, True]
@@ -0,0 +1,87 @@
+"""
+共享HTTP会话：进程内复用、fork后重建、keep-alive连接复用、超时
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils import http_session
+from app.utils.http_session import get_session, http_timeout
+from app.utils.music_api_client import MusicAPIClient
+
+
+@pytest.fixture
+def fresh_session(monkeypatch):
+    monkeypatch.setattr(http_session, '_session', None)
+    monkeypatch.setattr(http_session, '_session_pid', None)
+
+
+@pytest.fixture
+def server():
+    """本地HTTP/1.1服务器，记录每个请求所用连接的客户端端口"""
+    ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            body = b'{}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Set-Cookie', 'session=abc; Path=/')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}', ports
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_one_session_per_process(fresh_session, monkeypatch):
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(get_session())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(session is sessions[0] for session in sessions)
+
+    # fork出的子进程（pid不同）重建自己的会话
+    monkeypatch.setattr(http_session.os, 'getpid', lambda: -1)
+    assert get_session() is not sessions[0]
+    assert get_session() is get_session()
+
+
+def test_pool_size_from_env(fresh_session, monkeypatch):
+    monkeypatch.setenv('HTTP_POOL_MAXSIZE', '3')
+    adapter = get_session().get_adapter('https://music.163.com')
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_retries.total == 0
+
+
+def test_connections_are_reused_and_cookies_dropped(fresh_session, server):
+    url, ports = server
+    client = MusicAPIClient(cache=None)
+    for _ in range(5):
+        assert client._get(url + '/search').status_code == 200
+    assert len(ports) == 5 and len(set(ports)) == 1
+    assert not get_session().cookies
+
+
+def test_http_timeout(monkeypatch):
+    monkeypatch.delenv('HTTP_CONNECT_TIMEOUT', raising=False)
+    assert http_timeout(10) == (5.0, 10)
+    assert http_timeout(10, connect=2) == (2, 10)
+    monkeypatch.setenv('HTTP_CONNECT_TIMEOUT', '1.5')
+    assert http_timeout(30) == (1.5, 30)
+    monkeypatch.setenv('MUSIC_API_READ_TIMEOUT', '7')
+    assert MusicAPIClient(cache=None).timeout == (1.5, 7.0)
@@ -0,0 +1,98 @@
+"""
+语料IDF表：拟合、保存/加载、批量关键词提取，以及jieba通用IDF表的共享实例
+"""
+import math
+import os
+
+import jieba.analyse
+import numpy as np
+import pytest
+
+from nlp_engine.theme import ThemeExtractor
+from nlp_engine.theme.idf import CorpusIDF
+from nlp_engine.utils import lazy
+from nlp_engine.utils.paths import atomic_files
+from conftest import LINES, make_songs
+
+DOCUMENTS = [song['lyrics'] for song in make_songs(20)]
+
+
+def test_fit_idf_formula():
+    docs = ['梦想 坚持 梦想', '梦想 远方', '孤独 夜晚']
+    table = CorpusIDF.fit(docs)
+    assert table.words == sorted(table.words)
+    assert float(table.idf[table.vocab['梦想']]) == pytest.approx(math.log(4 / 3) + 1, rel=1e-6)
+    assert float(table.idf[table.vocab['远方']]) == pytest.approx(math.log(4 / 2) + 1, rel=1e-6)
+    assert CorpusIDF.fit(docs, min_df=2).words == ['梦想']
+
+
+def test_save_load_round_trip(tmp_path):
+    table = CorpusIDF.fit(DOCUMENTS)
+    prefix = str(tmp_path / 'lyrics_idf')
+    table.save(prefix)
+    assert sorted(os.listdir(tmp_path)) == ['lyrics_idf.npy', 'lyrics_idf.vocab']
+
+    loaded = CorpusIDF.load(prefix)
+    assert isinstance(loaded.idf, np.memmap)
+    assert loaded.words == table.words
+    np.testing.assert_array_equal(np.asarray(loaded.idf), table.idf)
+    assert loaded.median_idf == table.median_idf
+    assert loaded.extract_keywords_batch(DOCUMENTS[:3], 5) == table.extract_keywords_batch(DOCUMENTS[:3], 5)
+
+
+def test_failed_save_keeps_previous_files(tmp_path):
+    prefix = str(tmp_path / 'lyrics_idf')
+    CorpusIDF.fit(DOCUMENTS[:5]).save(prefix)
+    broken = CorpusIDF.fit(DOCUMENTS)
+    broken.idf = object()  # 写IDF数组时出错
+    with pytest.raises(Exception):
+        broken.save(prefix)
+    assert sorted(os.listdir(tmp_path)) == ['lyrics_idf.npy', 'lyrics_idf.vocab']
+    assert len(CorpusIDF.load(prefix)) == len(CorpusIDF.fit(DOCUMENTS[:5]))
+
+
+def test_atomic_files_use_unique_temp_names(tmp_path):
+    target = str(tmp_path / 'table.json')
+    with atomic_files(target) as (first,):
+        with atomic_files(target) as (second,):
+            assert first != second and os.path.dirname(first) == str(tmp_path)
+            with open(second, 'w') as f:
+                f.write('second')
+        with open(first, 'w') as f:
+            f.write('first')
+    with open(target) as f:
+        assert f.read() == 'first'
+    assert os.listdir(tmp_path) == ['table.json']
+
+
+def test_batch_keywords_match_single_extraction():
+    table = CorpusIDF.fit(DOCUMENTS)
+    batch = table.extract_keywords_batch(DOCUMENTS[:5], top_k=4)
+    for doc, keywords in zip(DOCUMENTS[:5], batch):
+        assert keywords == table.extract_keywords_batch([doc], top_k=4)[0]
+        assert len(keywords) == 4
+        assert [w for w, _ in keywords] == [w for w, _ in sorted(keywords, key=lambda kw: -kw[1])]
+    # 未登录词使用IDF中位数
+    word, weight = table.extract_keywords_batch(['霹雳霹雳'], top_k=1)[0][0]
+    assert word == '霹雳' and weight == pytest.approx(table.median_idf)
+    assert table.extract_keywords_batch(['的了', ''], top_k=3) == [[], []]
+
+
+def test_jieba_table_matches_extract_tags():
+    table = CorpusIDF.from_jieba()
+    for doc in DOCUMENTS[:5] + [LINES[0] * 2 + LINES[7]]:
+        expected = dict(jieba.analyse.extract_tags(doc, topK=None, withWeight=True))
+        actual = dict(table.extract_keywords_batch([doc], top_k=0)[0])
+        assert actual == pytest.approx(expected)
+
+
+def test_extractor_shares_registered_jieba_table(tmp_path):
+    missing = str(tmp_path / 'missing')
+    a, b = ThemeExtractor(idf_path=missing), ThemeExtractor(idf_path=missing)
+    assert a._keyword_table() is b._keyword_table() is lazy.JIEBA_IDF.get()
+    assert lazy.JIEBA_IDF.loaded and 'jieba_idf' in {r['name'] for r in lazy.resource_status()}
+
+    CorpusIDF.fit(DOCUMENTS).save(str(tmp_path / 'lyrics_idf'))
+    corpus = ThemeExtractor(idf_path=str(tmp_path / 'lyrics_idf'))
+    assert corpus._keyword_table() is corpus.corpus_idf
+    assert corpus.extract_keywords(DOCUMENTS[0], 3) == corpus.extract_keywords_batch([DOCUMENTS[0]], 3)[0]
@@ -0,0 +1,173 @@
+"""
+曲库批量入库：文件解析、检查点续传、版本发布，以及管理接口
+"""
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from nlp_engine.recommendation import CatalogStore, MusicRecommender
+from nlp_engine.recommendation.ingest import ingest_songs, read_songs
+from conftest import make_songs
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _load(store):
+    recommender = MusicRecommender()
+    recommender.load_catalog(store.current())
+    return recommender
+
+
+def test_read_ndjson_skips_songs_without_lyrics(tmp_path, songs):
+    path = tmp_path / 'songs.jsonl'
+    records = songs[:3] + [{'id': 'x', 'title': '无歌词'}, {'id': 'y', 'lyrics': '  '}]
+    path.write_text('\n'.join(json.dumps(r, ensure_ascii=False) for r in records) + '\n\n', encoding='utf-8')
+    assert read_songs(str(path)) == songs[:3]
+
+
+def test_read_csv(tmp_path, songs):
+    path = tmp_path / 'songs.csv'
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['id', 'title', 'artist', 'lyrics', 'theme', 'style'])
+        writer.writeheader()
+        writer.writerows(songs[:4])
+        writer.writerow({'id': 99, 'title': '无歌词'})
+    loaded = read_songs(str(path))
+    assert [song['title'] for song in loaded] == [song['title'] for song in songs[:4]]
+    assert loaded[0]['lyrics'] == songs[0]['lyrics']
+    assert loaded[0]['id'] == str(songs[0]['id'])  # CSV字段均为字符串
+
+
+def test_ingest_publishes_new_versions(tmp_path):
+    store = CatalogStore(str(tmp_path))
+    first = ingest_songs(make_songs(6), store, workers=1, chunk_size=4)
+    first_version = store.current()
+    assert first['total'] == 6 and first['chunks'] == 2
+    assert os.path.basename(first_version) == first['version']
+
+    second = ingest_songs(make_songs(5, seed=1, start=6), store, workers=1)
+    assert store.current() != first_version
+    assert second['total'] == 11
+    assert [song['id'] for song in _load(store).song_database] == list(range(11))
+    # 旧版本保留，仍在使用它的进程可以继续读取
+    old = MusicRecommender()
+    old.load_catalog(first_version)
+    assert len(old.song_database) == 6
+
+    replaced = ingest_songs(make_songs(3, seed=2, start=100), store, replace=True, workers=1)
+    assert replaced['total'] == 3
+    assert [song['id'] for song in _load(store).song_database] == [100, 101, 102]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('ingest-')]
+
+
+def test_ingest_resumes_from_checkpoints(tmp_path):
+    store = CatalogStore(str(tmp_path))
+    songs = make_songs(7)
+
+    def interrupt(done, total):
+        if done == 2:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        ingest_songs(songs, store, workers=1, chunk_size=3, progress=interrupt)
+    assert store.current() is None
+    checkpoints = [name for name in os.listdir(tmp_path) if name.startswith('ingest-')]
+    assert len(checkpoints) == 1
+    assert len(os.listdir(tmp_path / checkpoints[0])) == 2
+
+    # 输入或块大小不同时不使用这些检查点
+    other = CatalogStore(str(tmp_path / 'other'))
+    assert ingest_songs(songs, other, workers=1, chunk_size=2)['resumed_chunks'] == 0
+
+    summary = ingest_songs(songs, store, workers=1, chunk_size=3)
+    assert summary['resumed_chunks'] == 2 and summary['chunks'] == 3
+    assert not os.path.exists(tmp_path / checkpoints[0])
+
+    resumed = _load(store)
+    fresh = _load(other)
+    assert list(resumed.song_database) == songs
+    query = songs[0]['lyrics']
+    assert [(r['song'], r['similarity']) for r in resumed.recommend_songs(query, 5)] == \
+        [(r['song'], r['similarity']) for r in fresh.recommend_songs(query, 5)]
+
+
+def test_concurrent_ingests_keep_all_songs(tmp_path):
+    store = CatalogStore(str(tmp_path))
+    ingest_songs(make_songs(3), store, workers=1)
+    batches = [make_songs(4, seed=i, start=100 * i) for i in range(1, 4)]
+    threads = [threading.Thread(target=ingest_songs, args=(batch, store), kwargs={'workers': 1})
+               for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [song['id'] for song in _load(store).song_database]
+    assert ids[:3] == [0, 1, 2]
+    assert sorted(ids[3:]) == [song['id'] for batch in batches for song in batch]
+
+
+def test_ingest_endpoint_requires_admin_token(app, monkeypatch):
+    client = app.test_client()
+    body = '\n'.join(json.dumps(song, ensure_ascii=False) for song in make_songs(2))
+
+    monkeypatch.delenv('ADMIN_TOKEN', raising=False)
+    assert client.post('/api/recommendation/catalog/ingest', data=body).status_code == 403
+    assert client.post('/api/recommendation/catalog/ingest', data=body,
+                       headers={'X-Admin-Token': ''}).status_code == 403
+
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    assert client.post('/api/recommendation/catalog/ingest', data=body).status_code == 403
+    assert client.post('/api/recommendation/catalog/ingest', data=body,
+                       headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/api/recommendation/catalog/ingest/unknown').status_code == 403
+    assert client.get('/api/recommendation/catalog/ingest/unknown',
+                      headers={'X-Admin-Token': 'secret'}).status_code == 404
+
+
+def test_ingest_endpoint_swaps_catalog(app, monkeypatch):
+    from app.api.recommendation import service
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    headers = {'X-Admin-Token': 'secret'}
+    client = app.test_client()
+    body = '\n'.join(json.dumps(song, ensure_ascii=False) for song in make_songs(4, start=500))
+
+    response = client.post('/api/recommendation/catalog/ingest?replace=true', data=body, headers=headers)
+    assert response.status_code == 202
+    job_id = response.get_json()['data']['id']
+
+    deadline = time.time() + 120
+    while True:
+        job = client.get(f'/api/recommendation/catalog/ingest/{job_id}', headers=headers).get_json()['data']
+        if job['status'] != 'running' or time.time() > deadline:
+            break
+        time.sleep(0.2)
+    assert job['status'] == 'completed', job['error']
+    assert job['result']['total'] == 4
+    assert service.catalog_version == service.catalog.current()
+    assert [song['id'] for song in service.recommender.song_database] == [500, 501, 502, 503]
+    assert not os.listdir(os.path.join(service.catalog.root, 'uploads'))
+
+
+def test_ingest_endpoint_rejects_oversized_uploads(app, monkeypatch):
+    from app.api.recommendation import service
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    monkeypatch.setenv('CATALOG_UPLOAD_MAX_BYTES', '64')
+    client = app.test_client()
+    body = '\n'.join(json.dumps(song, ensure_ascii=False) for song in make_songs(2))
+    response = client.post('/api/recommendation/catalog/ingest', data=body, headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 413
+
+    # 没有Content-Length的分块上传在写入时截止
+    response = client.post('/api/recommendation/catalog/ingest', input_stream=io.BytesIO(body.encode('utf-8')),
+                           headers={'X-Admin-Token': 'secret', 'Transfer-Encoding': 'chunked'},
+                           environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
+    upload_dir = os.path.join(service.catalog.root, 'uploads')
+    assert not os.path.isdir(upload_dir) or not os.listdir(upload_dir)
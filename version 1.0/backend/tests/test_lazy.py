@@ -0,0 +1,102 @@
+"""
+延迟加载资源、启动预热配置，以及就绪检查和预热接口
+"""
+import threading
+import time
+
+import pytest
+
+from nlp_engine.utils import lazy
+from nlp_engine.utils.lazy import LazyResource, ready_resources, warm_up, warmup_resources
+
+
+@pytest.fixture
+def register(monkeypatch):
+    """临时注册资源，测试结束后从注册表移除"""
+    def register(name, loader):
+        resource = LazyResource(name, loader, '测试资源')
+        monkeypatch.setitem(lazy._registry, name, resource)
+        return resource
+    return register
+
+
+def test_loads_once_across_threads():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    resource = LazyResource('slow', loader)
+    assert not resource.loaded
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resource.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len({id(r) for r in results}) == 1
+    status = resource.status()
+    assert status['loaded'] and status['load_seconds'] >= 0.05 and status['error'] is None
+
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError('文件不存在')
+        return 'ok'
+
+    resource = LazyResource('flaky', loader)
+    with pytest.raises(OSError):
+        resource.get()
+    assert not resource.loaded and resource.status()['error'] == '文件不存在'
+    assert resource.get() == 'ok' and resource.status()['error'] is None
+
+
+def test_warm_up_skips_failures_and_unknown_names(register, capsys):
+    register('test_ok', lambda: 1)
+    register('test_broken', lambda: 1 / 0)
+    statuses = warm_up(['test_broken', 'test_ok', 'unknown'])
+    assert [(s['name'], s['loaded']) for s in statuses] == [('test_broken', False), ('test_ok', True)]
+    assert '资源预热失败 test_broken' in capsys.readouterr().out
+
+
+def test_warmup_and_ready_resources_from_env(monkeypatch):
+    monkeypatch.setenv('NLP_WARMUP', 'off')
+    monkeypatch.delenv('NLP_WARMUP_RESOURCES', raising=False)
+    monkeypatch.delenv('NLP_READY_RESOURCES', raising=False)
+    assert warmup_resources() == [] and ready_resources() == []
+
+    monkeypatch.setenv('NLP_WARMUP', 'background')
+    assert warmup_resources() == list(lazy.DEFAULT_WARMUP_RESOURCES)
+    assert ready_resources() == list(lazy.DEFAULT_WARMUP_RESOURCES)
+    monkeypatch.setenv('NLP_WARMUP_RESOURCES', ' jieba, sentiment_model ,')
+    assert ready_resources() == ['jieba', 'sentiment_model']
+    monkeypatch.setenv('NLP_READY_RESOURCES', '')
+    assert ready_resources() == []
+    monkeypatch.setenv('NLP_READY_RESOURCES', 'all')
+    assert set(ready_resources()) == set(lazy._registry)
+
+
+def test_ready_and_warmup_endpoints(app, register, monkeypatch):
+    client = app.test_client()
+    register('test_model', lambda: 'model')
+    monkeypatch.setenv('NLP_READY_RESOURCES', 'test_model')
+
+    response = client.get('/api/health/ready')
+    assert response.status_code == 503
+    data = response.get_json()['data']
+    assert not data['ready'] and data['missing'] == ['test_model']
+    assert {'sentiment', 'music_api'} <= set(data['caches'])
+
+    response = client.post('/api/health/warmup', json={'resources': ['test_model']})
+    assert response.status_code == 200
+    assert [s['name'] for s in response.get_json()['data']] == ['test_model']
+    response = client.get('/api/health/ready')
+    assert response.status_code == 200 and response.get_json()['data']['missing'] == []
+
+    assert client.get('/api/health/live').status_code == 200
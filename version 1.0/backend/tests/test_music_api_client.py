@@ -0,0 +1,75 @@
+"""
+音乐平台API客户端：并发批量获取歌词
+"""
+import threading
+import time
+
+from app.utils.music_api_client import MusicAPIClient, ResponseCache
+
+
+class SlowLyrics:
+    """模拟平台歌词接口：每次请求耗时delay秒，记录请求次数和最大并发数"""
+
+    def __init__(self, delay=0.2, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, song_id, platform):
+        with self._lock:
+            self.calls.append(song_id)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay * (1 if song_id != 'slow' else 3))
+            if song_id in self.failing:
+                raise ConnectionError(song_id)
+            return f'{song_id}的歌词'
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def _client(monkeypatch, fetch, max_workers=8):
+    client = MusicAPIClient(cache=ResponseCache())
+    client.max_workers = max_workers
+    monkeypatch.setattr(client, '_get_song_lyrics', fetch)
+    return client
+
+
+def test_lyrics_fetched_concurrently_once_per_song(monkeypatch):
+    fetch = SlowLyrics()
+    client = _client(monkeypatch, fetch)
+    ids = [str(i) for i in range(6)] + ['0', '3']
+    started = time.time()
+    results = dict(client.get_song_lyrics_many(ids))
+    assert time.time() - started < 0.6
+    assert results == {str(i): f'{i}的歌词' for i in range(6)}
+    assert sorted(fetch.calls) == [str(i) for i in range(6)]
+
+    # 第二次全部命中缓存
+    assert dict(client.get_song_lyrics_many(ids)) == results
+    assert len(fetch.calls) == 6
+
+
+def test_results_arrive_in_completion_order(monkeypatch):
+    client = _client(monkeypatch, SlowLyrics(delay=0.1))
+    order = [song_id for song_id, _ in client.get_song_lyrics_many(['slow', 'a', 'b'])]
+    assert order[-1] == 'slow'
+
+
+def test_concurrency_is_bounded(monkeypatch):
+    fetch = SlowLyrics(delay=0.05)
+    client = _client(monkeypatch, fetch)
+    assert len(list(client.get_song_lyrics_many([str(i) for i in range(12)], max_workers=3))) == 12
+    assert fetch.peak <= 3
+
+
+def test_failed_requests_yield_none(monkeypatch, capsys):
+    client = _client(monkeypatch, SlowLyrics(delay=0.01, failing={'b'}))
+    assert dict(client.get_song_lyrics_many(['a', 'b'])) == {'a': 'a的歌词', 'b': None}
+    assert '获取歌词失败' in capsys.readouterr().out
+    assert list(client.get_song_lyrics_many([])) == []
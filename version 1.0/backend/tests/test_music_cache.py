@@ -0,0 +1,85 @@
+"""
+音乐平台响应缓存：内存/磁盘两级命中、TTL过期、空结果缓存，以及客户端命中缓存时不发请求
+"""
+import time
+
+import pytest
+
+from app.utils.music_api_client import MusicAPIClient, ResponseCache
+
+
+def test_memory_and_disk_hits(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(path=path)
+    assert cache.get('search', 'k') is ResponseCache.MISS
+    cache.set('search', 'k', [{'id': 1, 'name': '歌曲'}])
+    assert cache.get('search', 'k') == [{'id': 1, 'name': '歌曲'}]
+    assert cache.stats()['memory']['hits'] == 1
+
+    # 另一个实例（如另一个worker）从磁盘读取，之后进入自己的内存缓存
+    other = ResponseCache(path=path)
+    assert other.get('search', 'k') == [{'id': 1, 'name': '歌曲'}]
+    assert other.get('search', 'k') == [{'id': 1, 'name': '歌曲'}]
+    stats = other.stats()
+    assert stats['disk_enabled'] and stats['disk_hits'] == 1 and stats['memory']['hits'] == 1
+    assert stats['misses'] == 0 and stats['hit_rate'] == 1.0
+
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+    cache = ResponseCache(path=str(tmp_path / 'cache.db'), ttls={'search': 10})
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    cache.set('search', 'k', ['a'])
+    cache.set('lyrics', 'k', '歌词')
+
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert cache.get('search', 'k') is ResponseCache.MISS
+    assert ResponseCache(path=str(tmp_path / 'cache.db')).get('search', 'k') is ResponseCache.MISS
+    assert cache.get('lyrics', 'k') == '歌词'  # 歌词永不过期
+
+
+def test_negative_results_use_negative_ttl():
+    cache = ResponseCache(negative_ttl=5)
+    now = time.time()
+    cache.set('song_info', 'missing', None)
+    cache.set('search', 'empty', [])
+    assert cache.get('song_info', 'missing') is None
+    assert cache.get('search', 'empty') == []
+    assert cache.stats()['negative_hits'] == 2
+    assert not cache.stats()['disk_enabled']
+
+    entry = cache.memory.get('song_info:missing')
+    assert entry[0] == pytest.approx(now + 5, abs=1)
+
+
+def test_cached_values_are_isolated():
+    cache = ResponseCache()
+    value = [{'id': 1}]
+    cache.set('search', 'k', value)
+    value.append({'id': 2})
+    cache.get('search', 'k')[0]['id'] = 99
+    assert cache.get('search', 'k') == [{'id': 1}]
+
+
+def test_client_hit_skips_network(monkeypatch):
+    client = MusicAPIClient(cache=ResponseCache())
+    calls = []
+    monkeypatch.setattr(client, '_search_songs', lambda keyword, platform, limit: calls.append(keyword) or [{'id': 1}])
+    assert client.search_songs('晴天') == [{'id': 1}]
+    assert client.search_songs('晴天') == [{'id': 1}]
+    assert client.search_songs('晴天', platform='qq') == [{'id': 1}]  # 不同平台分开缓存
+    assert calls == ['晴天', '晴天']
+
+    def no_network(*args, **kwargs):
+        raise AssertionError('命中缓存时不应发起请求')
+
+    client.cache.set('lyrics', 'netease:42', '缓存的歌词')
+    client.cache.set('song_info', 'netease:42', None)
+    monkeypatch.setattr(client, '_get', no_network)
+    assert client.get_song_lyrics('42') == '缓存的歌词'
+    assert client.get_song_info('42') is None
+
+
+def test_client_cache_can_be_disabled(monkeypatch):
+    monkeypatch.setenv('MUSIC_CACHE_ENABLED', 'false')
+    assert MusicAPIClient().cache is None
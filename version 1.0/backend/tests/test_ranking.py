@@ -0,0 +1,43 @@
+"""
+Top-k选择：与完整排序后取前k个一致（包括同分和NaN）
+"""
+import numpy as np
+import pytest
+
+from nlp_engine.utils.ranking import select_top_k, top_k_indices
+
+
+def _reference(scores, k, keys=None):
+    """完整排序：得分降序，同分按次序键（默认下标）升序，NaN最低"""
+    keys = range(len(scores)) if keys is None else keys
+    order = sorted(range(len(scores)), key=lambda i: (-(scores[i] if scores[i] == scores[i] else -np.inf), keys[i]))
+    return order[:max(0, k)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_full_sort_with_ties(seed):
+    rng = np.random.default_rng(seed)
+    scores = np.round(rng.random(200), 1)  # 大量同分
+    scores[rng.integers(0, 200, size=5)] = np.nan
+    for k in (1, 5, 37, 199, 200, 250):
+        assert top_k_indices(scores, k).tolist() == _reference(scores.tolist(), k)
+
+
+def test_tie_break_keys():
+    scores = [0.5, 0.9, 0.5, 0.5, 0.9]
+    keys = [40, 30, 10, 20, 0]
+    assert top_k_indices(scores, 4, tie_break=keys).tolist() == [4, 1, 2, 3]
+    assert top_k_indices(scores, 4, tie_break=keys).tolist() == _reference(scores, 4, keys)
+
+
+def test_edge_cases():
+    assert top_k_indices([], 3).tolist() == []
+    assert top_k_indices([0.3, 0.1], 0).tolist() == []
+    assert top_k_indices([0.3, 0.1], -1).tolist() == []
+    assert top_k_indices([[0.1, 0.3], [0.2, 0.0]], 2).tolist() == [1, 2]
+
+
+def test_select_top_k():
+    items = ['a', 'b', 'c', 'd']
+    assert select_top_k(items, [0.2, 0.8, 0.8, 0.1], 3) == ['b', 'c', 'a']
+    assert select_top_k(items, [0.2, 0.8, 0.8, 0.1], 2, tie_break=[0, 9, 1, 2]) == ['c', 'b']
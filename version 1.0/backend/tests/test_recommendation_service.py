@@ -0,0 +1,154 @@
+"""
+推荐服务：平台搜索结果的打分与推荐理由（音乐平台API用本地假数据代替）
+"""
+import time
+
+import jieba
+import jieba.analyse
+import pytest
+
+from app.services.recommendation_service import RecommendationService
+from nlp_engine.theme import ThemeExtractor
+from conftest import LINES, make_songs
+
+QUERY = '我爱你就像爱春天\n你是我心中最美的风景\n回忆过去那些美好时光'
+
+
+class FakeMusicAPI:
+    """按固定曲目返回搜索结果和歌词，并记录调用"""
+
+    def __init__(self, songs, delay=0.0, failing=()):
+        self.songs = {f"p{song['id']}": song for song in songs}
+        self.delay = delay
+        self.failing = set(failing)
+        self.searches = []
+        self.lyrics_requests = []
+
+    def search_songs(self, keyword, platform='netease', limit=10):
+        self.searches.append((keyword, limit))
+        time.sleep(self.delay)
+        if keyword in self.failing:
+            raise ConnectionError(keyword)
+        return [{'id': song_id, 'title': song['title'], 'artist': song['artist']}
+                for song_id, song in self.songs.items()][:limit]
+
+    def get_song_lyrics_many(self, song_ids, platform='netease'):
+        for song_id in song_ids:
+            self.lyrics_requests.append(song_id)
+            yield song_id, self.songs[song_id]['lyrics']
+
+
+@pytest.fixture
+def service(app):
+    service = RecommendationService()
+    service.music_api = FakeMusicAPI(make_songs(20))
+    with app.app_context():
+        yield service
+
+
+def test_explanations_only_for_returned_songs(service, monkeypatch):
+    calls = []
+    generate = service._generate_explanation
+    monkeypatch.setattr(service, '_generate_explanation',
+                        lambda *args: calls.append(args) or generate(*args))
+    result = service.recommend(QUERY, top_k=3)
+    recommendations = result['recommendations']
+    assert len(recommendations) == 3 and len(calls) == 3
+    assert all(rec['platform'] == 'netease' and rec['explanation'] for rec in recommendations)
+    similarities = [rec['similarity'] for rec in recommendations]
+    assert similarities == sorted(similarities, reverse=True)
+
+    calls.clear()
+    plain = service.recommend(QUERY, top_k=3, explain=False)['recommendations']
+    assert not calls
+    assert all(rec['explanation'] is None for rec in plain)
+    assert [rec['song']['id'] for rec in plain] == [rec['song']['id'] for rec in recommendations]
+
+
+def _search_inputs(service, query):
+    tokens = service._segment(query)
+    keywords = service._extract_keywords_from_lyrics(tokens)
+    themes = service._extract_themes_from_lyrics(tokens)
+    return tokens, keywords, themes, service._extract_phrases(tokens)[:2]
+
+
+def test_phrase_searches_only_when_results_are_short(service):
+    tokens, keywords, themes, phrases = _search_inputs(service, QUERY)
+    assert phrases
+    songs = service._search_candidates(tokens, keywords, themes, 3)
+    assert len(songs) == 6
+    assert sorted(service.music_api.searches) == sorted([(q, 6) for q in keywords[:3] + themes[:2]])
+
+    service.music_api = FakeMusicAPI(make_songs(4))
+    songs = service._search_candidates(tokens, keywords, themes, 3)
+    assert len(songs) == 4
+    assert sorted(service.music_api.searches[-len(phrases):]) == sorted((p, 3) for p in phrases)
+
+
+def test_eager_phrase_searches(service):
+    tokens, keywords, themes, phrases = _search_inputs(service, QUERY)
+    service.eager_phrase_search = True
+    songs = service._search_candidates(tokens, keywords, themes, 3)
+    assert len(songs) == 6
+    # 结果已足够，提前发出的关键短语搜索不并入，但同样会调用平台接口
+    expected = sorted([(q, 6) for q in keywords[:3] + themes[:2]] + [(p, 3) for p in phrases])
+    deadline = time.time() + 5
+    while len(service.music_api.searches) < len(expected) and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(service.music_api.searches) == expected
+
+
+def test_searches_run_concurrently_and_skip_failures(service, capsys):
+    tokens, keywords, themes, _ = _search_inputs(service, QUERY)
+    service.music_api = FakeMusicAPI(make_songs(20), delay=0.3, failing={keywords[0]})
+    started = time.time()
+    songs = service._search_candidates(tokens, keywords, themes, 3)
+    assert time.time() - started < 0.9  # 5次搜索并发进行，约一次请求的耗时
+    assert len(songs) == 6
+    assert '音乐平台API调用失败' in capsys.readouterr().out
+
+
+def test_candidate_lyrics_requested_once(service):
+    api = service.music_api
+    original = api.search_songs
+
+    def search_with_duplicates(keyword, platform='netease', limit=10):
+        # 同一首歌以不同的标题出现两次（去重按标题和歌手），歌词只请求一次，两个位置都参与排序
+        songs = original(keyword, platform, limit)
+        return songs + [dict(songs[0], title=songs[0]['title'] + '（现场版）')]
+
+    api.search_songs = search_with_duplicates
+    recommendations = service.recommend(QUERY, top_k=10, explain=False)['recommendations']
+    assert sorted(api.lyrics_requests) == sorted(api.songs)
+    assert len(recommendations) == 10
+    assert all(rec['song']['lyrics'] == api.songs[rec['song']['id']]['lyrics'] for rec in recommendations)
+
+    everything = service.recommend(QUERY, top_k=30, explain=False)['recommendations']
+    assert len(everything) == len(api.songs) + 1
+    duplicated = [rec for rec in everything if rec['song']['id'] == 'p0']
+    assert len(duplicated) == 2 and duplicated[0]['similarity'] == duplicated[1]['similarity']
+
+
+def test_each_lyric_segmented_once(service, monkeypatch):
+    segmented = []
+    segment = service._segment
+    monkeypatch.setattr(service, '_segment', lambda lyrics: segmented.append(lyrics) or segment(lyrics))
+    service.recommend(QUERY, top_k=3)
+    assert segmented[0] == QUERY
+    assert sorted(segmented[1:]) == sorted(service.music_api.songs[song_id]['lyrics']
+                                           for song_id in service.music_api.lyrics_requests)
+
+
+@pytest.mark.parametrize('lyrics', [QUERY, LINES[2] + LINES[7] + LINES[12], '\n'.join(LINES[8:12])])
+def test_token_features_match_text_features(service, lyrics):
+    """由一次分词结果计算的关键词、主题和内容词与按原文分别计算的结果一致"""
+    tokens = service._segment(lyrics)
+    expected = jieba.analyse.extract_tags(lyrics, topK=5, withWeight=True)
+    keywords = service.recommender.theme_extractor.extract_keywords_tokens([tokens], top_k=5)[0]
+    assert [k['weight'] for k in keywords] == pytest.approx([weight for _, weight in expected])
+    assert {k['word'] for k in keywords} == {word for word, _ in expected}
+
+    assert service._extract_themes_from_lyrics(tokens) == \
+        [t['theme'] for t in ThemeExtractor().classify_theme(lyrics)[:3]]
+    stopwords = {'的', '了', '在', '是', '我', '你', '他', '她', '它', '这', '那', '有', '和', '与', '或'}
+    assert service._content_words(tokens) == {w for w in jieba.cut(lyrics) if len(w) > 1 and w not in stopwords}
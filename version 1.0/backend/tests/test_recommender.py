@@ -0,0 +1,91 @@
+"""
+推荐器：预计算的歌曲特征、向量化打分与逐首计算一致
+"""
+import numpy as np
+import pytest
+
+from nlp_engine.recommendation import MusicRecommender
+from conftest import make_songs
+
+
+@pytest.fixture(scope='module')
+def recommender():
+    recommender = MusicRecommender()
+    recommender.add_songs_to_database(make_songs(12))
+    return recommender
+
+
+def _feature_fields(features):
+    return {key: value for key, value in features.items() if key != 'theme_vector'}
+
+
+def test_stored_features_match_extract_features(recommender):
+    for song, stored in zip(recommender.song_database, recommender.song_features):
+        fresh = recommender.extract_features(song['lyrics'])
+        assert _feature_fields(stored) == _feature_fields(fresh)
+        assert np.allclose(stored['theme_vector'], fresh['theme_vector'])
+
+
+def test_get_song_features_uses_stored_features(recommender):
+    song = recommender.song_database[3]
+    stored = recommender.get_song_features(song)
+    assert stored is recommender.song_features[3]
+
+    # 未入库的歌曲现场计算
+    outside = {'id': 'new', 'lyrics': '月光洒在故乡的小路\n风吹过山岗带走思念'}
+    assert _feature_fields(recommender.get_song_features(outside)) == \
+        _feature_fields(recommender.extract_features(outside['lyrics']))
+
+
+def test_recommend_analyzes_only_the_query(recommender, monkeypatch):
+    calls = []
+    analyze = recommender.sentiment_analyzer.analyze_lyrics
+    monkeypatch.setattr(recommender.sentiment_analyzer, 'analyze_lyrics',
+                        lambda lyrics: calls.append(lyrics) or analyze(lyrics))
+    query = '青春岁月永远难忘\n追逐梦想永不放弃'
+    assert len(recommender.recommend_songs(query, top_k=3)) == 3
+    assert calls == [query]
+
+
+def test_vectorized_scores_match_pairwise_similarity(recommender):
+    query = '孤独的夜晚我形单影只\n寂寞的城市霓虹闪烁\n离别的车站泪水模糊'
+    (query_features,), (query_tokens,) = recommender._extract_features_tokens([query])
+    rows = np.arange(len(recommender.song_database))
+    text_sims = recommender.text_index.similarities(tokens=query_tokens, rows=None)
+    scores = recommender._score_rows(query_features, rows, text_sims)
+    expected = [recommender._feature_similarity(query_features, recommender.song_features[row], text_sims[row])
+                for row in rows]
+    assert np.allclose(scores, expected, atol=1e-3)
+
+    results = recommender.recommend_songs(query, top_k=len(rows), explain=False)
+    by_id = {result['song']['id']: result['similarity'] for result in results}
+    assert np.allclose([by_id[song['id']] for song in recommender.song_database], scores)
+
+
+def test_rhyme_profile(recommender):
+    assert recommender._rhyme_profile('') == (-1, 0.0)
+    group, ratio = recommender._rhyme_profile('天上的月亮\n思念的故乡\n遥远的地方\n我爱你就像爱春天')
+    table = recommender.rhythm_analyzer.pinyin_table
+    if table is None:
+        assert (group, ratio) == (-1, 0.0)
+    else:
+        assert group == recommender.rhythm_analyzer.rhyme_class('故乡')
+        assert ratio == 0.75
+
+
+def test_explanations_only_for_winners(recommender, monkeypatch):
+    calls = []
+    generate = recommender._generate_reasons
+    monkeypatch.setattr(recommender, '_generate_reasons',
+                        lambda query, song: calls.append(song) or generate(query, song))
+    query = '月光洒在故乡的小路\n风吹过山岗带走思念'
+    results = recommender.recommend_songs(query, top_k=3)
+    assert len(calls) == 3
+    for result in results:
+        assert result['explanation'] == recommender.explain_recommendation(query, result['song'])
+
+    calls.clear()
+    plain = recommender.recommend_songs(query, top_k=3, explain=False)
+    assert not calls
+    assert all(set(result) == {'song', 'similarity'} for result in plain)
+    assert [(r['song'], r['similarity']) for r in plain] == [(r['song'], r['similarity']) for r in results]
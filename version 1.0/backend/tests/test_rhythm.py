@@ -0,0 +1,119 @@
+"""
+韵律分析：全曲韵式标注与押韵模式识别、向量化声律分析
+"""
+from collections import Counter
+
+import pytest
+
+from nlp_engine.rhythm import RhythmAnalyzer, analyze_prosody
+from nlp_engine.rhythm.pinyin_table import get_pinyin_table
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return RhythmAnalyzer()
+
+
+def pattern_of(analyzer, lyrics):
+    return analyzer.analyze_rhyme_pattern(lyrics)
+
+
+def test_quatrain_patterns(analyzer):
+    assert pattern_of(analyzer, '春天开满了花\n我们回到家\n月光照四方\n一起把歌唱')['pattern'] == 'AABB'
+    result = pattern_of(analyzer, '春天开满了花\n月光照四方\n我们回到家\n一起把歌唱')
+    assert result['pattern'] == 'ABAB' and result['scheme'] == 'ABAB'
+    assert pattern_of(analyzer, '一朵花\n回到家\n想着他\n说句话')['pattern'] == 'AAAA'
+    assert pattern_of(analyzer, '今天\n下雨\n没有\n风')['pattern'] == '无押韵'
+
+
+def test_short_stanzas_fall_back_to_song_scheme(analyzer):
+    # 两三句一段、全曲同韵
+    result = pattern_of(analyzer, '一朵花\n回到家\n\n想着他\n说句话')
+    assert result['scheme'] == 'AAAA' and result['pattern'] == '一韵到底'
+    assert pattern_of(analyzer, '一朵花\n回到家\n想着他')['pattern'] == '一韵到底'
+    # 两段各自同韵，合起来为AABB
+    result = pattern_of(analyzer, '一朵花\n回到家\n\n月光照四方\n一起把歌唱')
+    assert result['pattern'] == 'AABB'
+    assert [s['scheme'] for s in result['stanzas']] == ['AA', 'AA']
+    assert pattern_of(analyzer, '一朵花\n回到家\n\n月光照四方\n今天')['pattern'] == '自由押韵'
+
+
+def test_scheme_pairs_and_punctuation(analyzer):
+    lyrics = '春天开满了花！\n\n月光照四方，\n今天下雨\n我们回到家。\n一起把歌唱'
+    result = analyzer.analyze_rhyme_pattern(lyrics)
+    assert result['scheme'] == 'ABCAB'  # 句末标点不影响韵类
+    assert [(p['line1'], p['line2']) for p in result['rhyme_pairs']] == [(0, 3), (1, 4)]
+    assert [(s['start_line'], s['end_line']) for s in result['stanzas']] == [(0, 0), (1, 4)]
+    assert result['total_lines'] == 5 and result['rhyme_count'] == 2
+    assert analyzer.analyze_rhyme_pattern('只有一句')['pattern'] == 'N/A'
+
+
+def test_label_scheme_beyond_26_classes():
+    labels = RhythmAnalyzer._label_scheme(list(range(28)) + [None, 0])
+    assert labels == 'ABCDEFGHIJKLMNOPQRSTUVWXYZ' + 'AAAB' + 'X' + 'A'
+
+
+def reference_syllables(line, table):
+    """逐字计算的音节（韵组, 平仄），用于核对向量化结果"""
+    syllables = []
+    previous_letter = False
+    for ch in line:
+        entry = table.lookup(ch)
+        is_letter = ch.isascii() and ch.isalpha()
+        if entry is not None:
+            tone_class = {1: 1, 2: 1, 3: 2, 4: 2}.get(entry[1], 0)
+            syllables.append((entry[2], tone_class))
+        elif is_letter and not previous_letter:
+            syllables.append((-1, 0))
+        previous_letter = is_letter
+    return syllables
+
+
+PROSODY_LINES = ['春风吹过山岗', '我在 hello world 里等你', '月光照在小路上，', '一起唱', '我们的故乡', '想你想到天亮']
+
+
+def test_prosody_matches_per_line_reference():
+    table = get_pinyin_table()
+    result = analyze_prosody(PROSODY_LINES, table)
+    reference = [reference_syllables(line, table) for line in PROSODY_LINES]
+
+    assert result['syllable_counts'] == [len(s) for s in reference]
+    assert result['syllable_counts'][1] == 7  # 英文单词各算一个音节
+    assert result['tone_patterns'] == [''.join('·平仄'[tone] for _, tone in s) for s in reference]
+    histogram = Counter(len(s) for s in reference)
+    assert result['length_histogram'] == {str(n): histogram[n] for n in sorted(histogram)}
+
+    tones = [tone for s in reference for _, tone in s]
+    ping, ze = tones.count(1), tones.count(2)
+    assert result['tone_ratio'] == {'平': round(ping / (ping + ze), 2), '仄': round(ze / (ping + ze), 2)}
+
+    internal = []
+    for i, s in enumerate(reference):
+        end = s[-1][0]
+        count = sum(1 for group, _ in s[:-1] if end >= 0 and group == end)
+        if count:
+            internal.append({'line': i, 'count': count})
+    assert result['internal_rhymes'] == internal
+
+    multi = []
+    for distance in (1, 2):
+        for i in range(len(reference) - distance):
+            a, b = reference[i][::-1], reference[i + distance][::-1]
+            run = 0
+            while run < min(3, len(a), len(b)) and a[run][0] == b[run][0] >= 0:
+                run += 1
+            if run >= 2:
+                multi.append({'line1': i, 'line2': i + distance, 'length': run})
+    assert result['multi_syllable_rhymes'] == sorted(multi, key=lambda p: (p['line1'], p['line2']))
+
+
+def test_prosody_of_empty_input():
+    result = analyze_prosody([])
+    assert result['syllable_counts'] == [] and result['multi_syllable_rhymes'] == []
+
+
+def test_analyze_rhythm_reports_prosody(analyzer):
+    result = analyzer.analyze_rhythm('\n'.join(PROSODY_LINES))
+    assert result['syllable_analysis']['syllable_counts'] == analyze_prosody(PROSODY_LINES)['syllable_counts']
+    assert {'tone_patterns', 'multi_syllable_rhymes'} <= set(result['prosody'])
+    assert 'syllable_counts' not in result['prosody']
@@ -0,0 +1,143 @@
+"""
+韵律分析用的持久化查找表：拼音韵母表与押韵词典索引
+"""
+import os
+import threading
+
+import numpy as np
+import pytest
+from pypinyin import Style, pinyin
+
+from nlp_engine.rhythm.pinyin_table import PinyinTable, get_pinyin_table
+from nlp_engine.rhythm.rhyme_index import RhymeIndex
+
+DICT_WORDS = [('好', 500), ('到', 300), ('高', 200), ('微笑', 120), ('味道', 80),
+              ('天', 400), ('春天', 150), ('思念', 90), ('音乐', 60), ('abc', 10)]
+
+
+@pytest.fixture(scope='module')
+def table():
+    return get_pinyin_table()
+
+
+@pytest.fixture
+def dict_path(tmp_path):
+    path = tmp_path / 'dict.txt'
+    path.write_text(''.join(f'{word} {freq} n\n' for word, freq in DICT_WORDS), encoding='utf-8')
+    return str(path)
+
+
+def test_pinyin_table_save_load_round_trip(tmp_path, table):
+    prefix = str(tmp_path / 'pinyin_table')
+    table.save(prefix)
+    loaded = PinyinTable.load(prefix)
+
+    assert isinstance(loaded.table, np.memmap)
+    np.testing.assert_array_equal(np.asarray(loaded.table), np.asarray(table.table))
+    assert loaded.finals == table.finals
+    assert loaded.lookup('好') == table.lookup('好')
+    assert loaded.lookup('好')[:2] == ('ao', 3)
+    assert loaded.lookup('A') is None
+    for a, b in zip(loaded.encode('春天的花a'), table.encode('春天的花a')):
+        np.testing.assert_array_equal(a, b)
+
+    # 已缓存且pypinyin版本一致时直接加载，不重新构建
+    assert isinstance(PinyinTable.load_or_build(prefix).table, np.memmap)
+
+
+def test_concurrent_saves_publish_a_complete_table(tmp_path, table):
+    prefix = str(tmp_path / 'pinyin_table')
+    threads = [threading.Thread(target=table.save, args=(prefix,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(os.listdir(tmp_path)) == ['pinyin_table.json', 'pinyin_table.npy']
+    np.testing.assert_array_equal(np.asarray(PinyinTable.load(prefix).table), np.asarray(table.table))
+
+
+def test_table_matches_pypinyin(table):
+    # 每隔97个码位抽样，与pypinyin逐字的结果比较
+    for cp in range(PinyinTable.BASE, PinyinTable.END, 97):
+        ch = chr(cp)
+        final = pinyin(ch, style=Style.FINALS, heteronym=False)[0][0]
+        assert table.final_of(ch) == (None if final == ch else final)
+    assert table.lookup('妈')[:2] == ('a', 1)
+    assert table.tone_of('吗') == 5
+    assert table.group_of('!') == -1
+    final_ids, tones, groups = table.encode('天a')
+    assert list(final_ids[1:]) == [0] and list(tones) == [1, 0] and groups[1] == -1
+
+
+def test_rhyme_index_build_and_round_trip(tmp_path, dict_path):
+    index = RhymeIndex.build(dict_path=dict_path)
+    assert len(index) == len(DICT_WORDS) - 1  # 非汉字词不收录
+    prefix = str(tmp_path / 'rhyme_index')
+    index.save(prefix)
+    loaded = RhymeIndex.load(prefix)
+    assert len(loaded) == len(index)
+    np.testing.assert_array_equal(np.asarray(loaded.rows), np.asarray(index.rows))
+
+    target = loaded.resolve('ao')
+    words = [c['word'] for c in loaded.candidates(target['group'], final=target['final'])]
+    assert words == ['好', '到', '高', '味道']  # 按词频降序
+    group_words = [c['word'] for c in loaded.candidates(target['group'])]
+    assert group_words == ['好', '到', '高', '微笑', '味道']  # iao与ao同属一个韵组
+    assert [c['word'] for c in loaded.candidates(target['group'], length=2)] == ['微笑', '味道']
+    assert [c['word'] for c in loaded.candidates(target['group'], tone=4)] == ['到', '微笑', '味道']
+    assert [c['word'] for c in loaded.candidates(target['group'], limit=2, exclude='好')] == ['到', '高']
+
+    # 汉字目标取末字读音；多音字按词语读音标注
+    by_char = loaded.resolve('春天')
+    assert {c['word'] for c in loaded.candidates(by_char['group'], final=by_char['final'])} == {'天', '春天', '思念'}
+    assert loaded.resolve('abc') is None
+    yue = loaded.resolve('ue')
+    assert '音乐' in [c['word'] for c in loaded.candidates(yue['group'])]
+
+
+def test_rhyme_index_load_default_missing(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        RhymeIndex.load_default(str(tmp_path / 'missing'))
+
+
+@pytest.fixture
+def generator(dict_path, monkeypatch):
+    from nlp_engine.generation import generator as generator_module
+    index = RhymeIndex.build(dict_path=dict_path)
+    monkeypatch.setattr(generator_module, 'get_rhyme_index', lambda: index)
+    return generator_module.LyricsGenerator()
+
+
+def test_rhyme_candidates_replace_last_word(generator):
+    result = generator.get_rhyme_candidates('今天天气真好。', 'ao')
+    assert result['rhyme_words'][:2] == ['到', '高']  # 与句末词“好”字数相同，排除原词
+    assert result['suggestions'][:2] == ['今天天气真到。', '今天天气真高。']
+    assert generator.get_rhyme_candidates('想起你的味道', '好')['rhyme_words'] == ['微笑']
+    assert generator.get_rhyme_candidates('今天天气真好', 'xyz') == \
+        {'rhyme_words': [], 'multi_syllable': [], 'suggestions': []}
+    assert generator.get_rhyme_candidates('。！', 'ao')['rhyme_words'] == []
+
+
+def test_rhyme_candidates_fall_back_without_index(monkeypatch, capsys):
+    from nlp_engine.generation import generator as generator_module
+
+    def missing():
+        raise FileNotFoundError('押韵索引不存在')
+
+    monkeypatch.setattr(generator_module, 'get_rhyme_index', missing)
+    result = generator_module.LyricsGenerator().get_rhyme_candidates('我想回家！', 'a')
+    assert '押韵索引加载失败' in capsys.readouterr().out
+    assert '家' not in result['rhyme_words']
+    assert result['suggestions'][:2] == ['我想回啊！', '我想回他！']
+
+
+def test_concurrent_rhyme_index_saves(tmp_path, dict_path):
+    index = RhymeIndex.build(dict_path=dict_path)
+    prefix = str(tmp_path / 'rhyme_index')
+    threads = [threading.Thread(target=index.save, args=(prefix,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(os.listdir(tmp_path)) == ['dict.txt', 'rhyme_index.json', 'rhyme_index.npy', 'rhyme_index.txt']
+    assert len(RhymeIndex.load_default(prefix)) == len(index)
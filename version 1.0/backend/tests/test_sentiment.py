@@ -0,0 +1,211 @@
+"""
+情感分析：逐句单次打分、情感词典匹配、批量打分、逐句结果缓存、流式分析
+"""
+import json
+
+import pytest
+from snownlp import sentiment as snow_sentiment
+
+from nlp_engine.sentiment import EmotionLexicon, SentimentAnalyzer, score_batch
+from nlp_engine.sentiment.analyzer import get_sentiment_cache
+from nlp_engine.sentiment.lexicon import DEFAULT_LEXICON
+from nlp_engine.utils.automaton import AhoCorasick
+from nlp_engine.utils.cache import LRUCache, estimate_size
+
+LYRICS = '我很快乐今天阳光明媚\n孤独的夜晚我很寂寞\n\n回忆过去那些美好时光\n我很快乐今天阳光明媚'
+
+
+@pytest.fixture
+def analyzer():
+    return SentimentAnalyzer(use_cache=False)
+
+
+@pytest.fixture
+def scored_lines(analyzer, monkeypatch):
+    """记录每次送去打分的句子"""
+    calls = []
+    scorer = analyzer.scorer
+    score_batch = scorer.score_batch
+    monkeypatch.setattr(scorer, 'score_batch', lambda lines: calls.append(list(lines)) or score_batch(lines))
+    return calls
+
+
+def test_analyze_sentence_scores_once(analyzer, scored_lines):
+    result = analyzer.analyze_sentence('孤独的夜晚我很寂寞')
+    assert scored_lines == [['孤独的夜晚我很寂寞']]
+    assert result['score'] == pytest.approx(snow_sentiment.classify('孤独的夜晚我很寂寞'))
+    assert result['intensity'] == pytest.approx(abs(result['score'] - 0.5) * 2)
+
+
+def test_precomputed_score_is_reused(analyzer, scored_lines):
+    result = analyzer.analyze_sentence('孤独的夜晚我很寂寞', 0.2)
+    assert scored_lines == []
+    assert result['score'] == 0.2 and result['category'] == 'negative'
+    assert result['emotion_type'] == '孤独寂寞'
+    assert analyzer._detect_emotion_type('今天', 0.8) == '欢快愉悦'
+    assert scored_lines == []
+
+
+def test_analyze_lyrics_scores_each_line_once(analyzer, scored_lines):
+    result = analyzer.analyze_lyrics(LYRICS)
+    lines = [line for line in LYRICS.split('\n') if line]
+    assert sorted(line for batch in scored_lines for line in batch) == sorted(set(lines))
+    assert [a['sentence'] for a in result['sentence_analyses']] == lines
+    for analysis in result['sentence_analyses']:
+        assert analysis['score'] == pytest.approx(snow_sentiment.classify(analysis['sentence']))
+    assert [t['index'] for t in result['timeline']] == list(range(len(lines)))
+    assert sum(result['category_distribution'].values()) == len(lines)
+
+
+def test_lexicon_matches_longest_entries():
+    lexicon = EmotionLexicon({'energetic': ['活力', '活力四射'], 'lonely': ['形单影只', '孤独']})
+    # 多字词条整体命中，不再计入其中的短词条；不依赖分词结果
+    assert lexicon.match('他活力四射却形单影只') == {'energetic': 1, 'lonely': 1}
+    assert lexicon.match('孤独孤独，活力') == {'energetic': 1, 'lonely': 2}
+    assert lexicon.match('没有情感词') == {}
+
+
+def test_lexicon_word_in_several_categories():
+    assert DEFAULT_LEXICON.word_index['兴奋'] == ['joyful', 'excited']
+    assert DEFAULT_LEXICON.match('兴奋') == {'joyful': 1, 'excited': 1}
+    assert list(DEFAULT_LEXICON.match('兴奋又孤独')) == ['joyful', 'lonely', 'excited']  # 按词典中的类别顺序
+
+
+def test_lexicon_loads_external_files(tmp_path, capsys):
+    path = tmp_path / 'lexicon.txt'
+    path.write_text('# 外部词典\n心花怒放 joyful\n失魂落魄\tsad\n格式不对\n', encoding='utf-8')
+    lexicon = EmotionLexicon.from_files([str(path), str(tmp_path / 'missing.txt')])
+    assert '情感词典文件不存在' in capsys.readouterr().out
+    assert lexicon.match('心花怒放') == {'joyful': 1}
+    assert lexicon.match('失魂落魄') == {'sad': 1}
+    assert '格式不对' not in lexicon.word_index
+    assert '心花怒放' not in DEFAULT_LEXICON.word_index
+
+    analyzer = SentimentAnalyzer(lexicon_paths=[str(path)], use_cache=False)
+    assert analyzer._detect_emotion_type('心花怒放心花怒放', 0.5) == '欢快愉悦'
+
+
+def test_automaton_reports_overlapping_matches():
+    automaton = AhoCorasick([('he', 1), ('she', 2), ('hers', 3), ('his', 4)])
+    assert sorted(automaton.iter_matches('ushers')) == [(1, 4, [2]), (2, 4, [1]), (2, 6, [3])]
+    assert automaton.find_longest('ushers') == [(1, 4, [2])]
+    assert len(automaton) == 4
+
+
+PARITY_LINES = [
+    '我很快乐今天阳光明媚', '孤独的夜晚我很寂寞', '回忆过去那些美好时光', '心碎了一地无法拼凑',
+    'I love you 我爱你', '2024年的夏天', '...', '你好！！你好？', '风吹过山岗 带走思念'
+]
+
+
+def test_score_batch_matches_snownlp():
+    scores = score_batch(PARITY_LINES + PARITY_LINES[:3])
+    assert len(scores) == len(PARITY_LINES) + 3
+    for line, score in zip(PARITY_LINES, scores):
+        assert score == pytest.approx(snow_sentiment.classify(line), abs=1e-9)
+    assert scores[-3:] == scores[:3]
+
+
+@pytest.mark.parametrize('line', ['', '   ', '，。！', '的了'])
+def test_score_batch_lines_without_tokens_are_neutral(line):
+    assert score_batch([line, '我很快乐']) == [0.5, pytest.approx(snow_sentiment.classify('我很快乐'))]
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a变为最近使用
+    cache.put('c', 3)
+    assert 'b' not in cache and cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.get('b', 'missing') == 'missing'
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1 and stats['hit_rate'] == 0.75
+
+
+def test_lru_cache_byte_limit():
+    value = 'x' * 100
+    limit = (estimate_size('k0') + estimate_size(value)) * 3
+    cache = LRUCache(max_entries=0, max_bytes=limit)
+    for i in range(5):
+        cache.put(f'k{i}', value)
+    assert len(cache) == 3 and cache.stats()['bytes'] <= limit
+    cache.put('huge', 'x' * limit)  # 单个条目超过上限时不缓存
+    assert 'huge' not in cache and len(cache) == 3
+    assert cache.pop('k4') == value and len(cache) == 2
+    cache.clear()
+    assert len(cache) == 0 and cache.stats()['bytes'] == 0
+
+
+def test_sentiment_cache_skips_scoring_repeated_lines(monkeypatch):
+    analyzer = SentimentAnalyzer(cache=LRUCache(max_entries=100))
+    calls = []
+    scorer = analyzer.scorer
+    score_batch_ = scorer.score_batch
+    monkeypatch.setattr(scorer, 'score_batch', lambda lines: calls.append(list(lines)) or score_batch_(lines))
+
+    first = analyzer.analyze_lyrics(LYRICS)
+    second = analyzer.analyze_lyrics(LYRICS)
+    assert len(calls) == 1 and len(calls[0]) == 3
+    assert [a['score'] for a in second['sentence_analyses']] == [a['score'] for a in first['sentence_analyses']]
+    assert analyzer.cache.stats()['hits'] == 3
+    # 句内连续空白归一化后共用缓存键
+    assert analyzer.analyze_lines(['风吹过  山岗', '风吹过 山岗'])[0]['score'] == \
+        analyzer.analyze_lines(['风吹过 山岗'])[0]['score']
+    assert calls[1:] == [['风吹过 山岗']]
+
+
+def test_custom_lexicon_uses_separate_cache(tmp_path):
+    path = tmp_path / 'lexicon.txt'
+    path.write_text('阳光 joyful\n', encoding='utf-8')
+    assert SentimentAnalyzer().cache is get_sentiment_cache()
+    assert SentimentAnalyzer(lexicon_paths=[str(path)]).cache is not get_sentiment_cache()
+    assert SentimentAnalyzer(use_cache=False).cache is None
+
+
+def test_stream_yields_lines_then_summary(analyzer, scored_lines):
+    lyrics = '\n'.join([LYRICS] * 3)
+    records = list(analyzer.analyze_lyrics_iter(lyrics, chunk_size=4))
+    lines, summary = records[:-1], records[-1]
+    assert [r['index'] for r in lines] == list(range(12))
+    assert [len(batch) for batch in scored_lines] == [3, 3, 3]  # 每批4行，批内重复句只打分一次
+    assert summary['type'] == 'summary' and summary['total_lines'] == 12
+
+    full = analyzer.analyze_lyrics(lyrics)
+    assert [r['score'] for r in lines] == [a['score'] for a in full['sentence_analyses']]
+    assert summary['overall_score'] == pytest.approx(sum(r['score'] for r in lines) / 12)
+    assert summary['overall_score'] == pytest.approx(full['overall_score'])
+    assert summary['overall_tone'] == full['overall_tone']
+    assert summary['emotion_distribution'] == full['emotion_distribution']
+
+
+def test_stream_of_empty_lyrics():
+    records = list(SentimentAnalyzer(use_cache=False).analyze_lyrics_iter('\n \n'))
+    assert len(records) == 1
+    assert records[0]['total_lines'] == 0 and records[0]['overall_score'] == 0.5
+
+
+@pytest.mark.parametrize('chunk_size, expected', [(0, 1), (-5, 1), ('3', 3), (10 ** 6, 256)])
+def test_stream_chunk_size_is_clamped(app, monkeypatch, chunk_size, expected):
+    from app.api.analysis import service
+    seen = []
+    analyze_lyrics_iter = service.sentiment_analyzer.analyze_lyrics_iter
+    monkeypatch.setattr(service.sentiment_analyzer, 'analyze_lyrics_iter',
+                        lambda lyrics, size: seen.append(size) or analyze_lyrics_iter(lyrics, size))
+    list(service.analyze_sentiment_stream(LYRICS, chunk_size))
+    assert seen == [expected]
+
+
+def test_stream_endpoint(app):
+    client = app.test_client()
+    response = client.post('/api/analysis/sentiment/stream', json={'lyrics': LYRICS, 'chunk_size': 2})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['type'] for r in records] == ['line'] * 4 + ['summary']
+
+    for chunk_size in ['x', None, True, [1]]:
+        response = client.post('/api/analysis/sentiment/stream', json={'lyrics': LYRICS, 'chunk_size': chunk_size})
+        assert response.status_code == 400
+    assert client.post('/api/analysis/sentiment/stream', json={'lyrics': ''}).status_code == 400
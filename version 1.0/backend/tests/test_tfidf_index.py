@@ -0,0 +1,90 @@
+"""
+曲库TF-IDF索引：保存/加载、增量添加与重新拟合
+"""
+import os
+import threading
+
+import numpy as np
+
+from nlp_engine.recommendation.tfidf_index import TfidfIndex
+from conftest import LINES, make_songs
+
+QUERIES = [LINES[0] + LINES[5], LINES[3], '完全无关的词语组合']
+
+
+def _texts(n, seed=0, start=0):
+    return [song['lyrics'] for song in make_songs(n, seed=seed, start=start)]
+
+
+def _assert_same_index(a: TfidfIndex, b: TfidfIndex):
+    assert len(a) == len(b)
+    assert a.vocab == b.vocab
+    np.testing.assert_allclose(np.asarray(a._idf), np.asarray(b._idf))
+    np.testing.assert_allclose(a.matrix.toarray(), b.matrix.toarray(), atol=1e-12)
+
+
+def test_save_load_round_trip(tmp_path):
+    index = TfidfIndex()
+    index.add(_texts(30))
+    prefix = str(tmp_path / 'tfidf')
+    index.save(prefix)
+
+    loaded = TfidfIndex.load(prefix)
+    _assert_same_index(index, loaded)
+    assert not loaded.matrix.data.flags.writeable  # 只读mmap映射，未复制到内存
+    for query in QUERIES:
+        np.testing.assert_allclose(loaded.similarities(query), index.similarities(query))
+    rows = np.array([5, 1, 20])
+    np.testing.assert_allclose(loaded.similarities(QUERIES[0], rows=rows), index.similarities(QUERIES[0])[rows])
+
+
+def test_incremental_add_then_refit_matches_full_fit():
+    texts = _texts(40)
+    full = TfidfIndex()
+    full.add(texts)
+
+    incremental = TfidfIndex(refit_ratio=1.0)  # 第二批不超过已拟合文档数，不自动重新拟合
+    incremental.add(texts[:25])
+    incremental.add(texts[25:])
+    assert incremental._n_fitted == 25
+    incremental.refit()
+
+    _assert_same_index(full, incremental)
+
+
+def test_automatic_refit_when_growth_exceeds_ratio():
+    index = TfidfIndex(refit_ratio=0.2)
+    index.add(_texts(20))
+    assert index._n_fitted == 20
+    index.add(_texts(3, seed=1, start=20))  # 15% 增量：沿用旧IDF
+    assert index._n_fitted == 20
+    index.add(_texts(3, seed=2, start=23))  # 累计30%：重新拟合
+    assert index._n_fitted == 26
+
+
+def test_append_after_load_matches_full_fit(tmp_path):
+    texts = _texts(30) + _texts(10, seed=3, start=30)
+    index = TfidfIndex()
+    index.add(texts[:30])
+    index.save(str(tmp_path / 'tfidf'))
+
+    loaded = TfidfIndex.load(str(tmp_path / 'tfidf'))
+    loaded.add(texts[30:])
+    loaded.refit()
+
+    full = TfidfIndex()
+    full.add(texts)
+    _assert_same_index(full, loaded)
+
+
+def test_concurrent_saves_leave_no_temp_files(tmp_path):
+    index = TfidfIndex()
+    index.add(_texts(20))
+    prefix = str(tmp_path / 'tfidf')
+    threads = [threading.Thread(target=index.save, args=(prefix,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    _assert_same_index(index, TfidfIndex.load(prefix))
@@ -0,0 +1,94 @@
+"""
+主题分类与实体提取：与原逐词循环实现的结果对比
+"""
+from collections import Counter
+
+import jieba
+import pytest
+
+from nlp_engine.theme import ThemeExtractor
+from conftest import LINES, make_songs
+
+DOCUMENTS = [song['lyrics'] for song in make_songs(30)] + [
+    '\n'.join(LINES), '我爱你 爱你 爱你 心心相印', '没有任何主题词的句子abc', '', '   '
+]
+
+
+def baseline_classify_theme(lyrics):
+    """原classify_theme的实现（逐主题、逐关键词计数）"""
+    word_list = [w for w in jieba.cut(lyrics) if len(w.strip()) > 0]
+    word_counter = Counter(word_list)
+    total_words = len(word_list)
+    theme_scores = {}
+    for theme, keywords in ThemeExtractor.EXTENDED_THEMES.items():
+        matched_keywords = [kw for kw in keywords if word_counter.get(kw, 0) > 0]
+        if matched_keywords:
+            total_matches = sum(word_counter.get(kw, 0) for kw in matched_keywords)
+            keyword_ratio = len(matched_keywords) / len(keywords)
+            word_ratio = total_matches / total_words if total_words > 0 else 0
+            theme_scores[theme] = total_matches * 0.6 + keyword_ratio * 10 + word_ratio * 100
+    sorted_themes = sorted(theme_scores.items(), key=lambda x: x[1], reverse=True)
+    if sorted_themes:
+        max_score = sorted_themes[0][1]
+        return [{'theme': theme, 'score': round(score / max_score, 2) if max_score > 0 else 0}
+                for theme, score in sorted_themes][:10]
+    return []
+
+
+def baseline_extract_entities(lyrics):
+    """原extract_entities的实现（逐词子串判断）"""
+    word_list = [w for w in jieba.cut(lyrics) if len(w.strip()) > 0]
+    persons = [w for w in word_list if any(p in w for p in ThemeExtractor.PERSON_PATTERNS)]
+    scenes = [w for w in word_list if any(sk in w for sk in ThemeExtractor.SCENE_KEYWORDS)]
+    emotion_keywords = [kw for keywords in ThemeExtractor.THEME_KEYWORDS.values() for kw in keywords]
+    return {'persons': set(persons), 'scenes': set(scenes),
+            'emotion_words': [w for w in word_list if w in emotion_keywords][:15]}
+
+
+@pytest.fixture(scope='module')
+def extractor():
+    return ThemeExtractor()
+
+
+def test_classify_theme_batch_matches_baseline(extractor):
+    batch = extractor.classify_theme_batch(DOCUMENTS)
+    assert len(batch) == len(DOCUMENTS)
+    for lyrics, themes in zip(DOCUMENTS, batch):
+        assert themes == baseline_classify_theme(lyrics)
+        assert extractor.classify_theme(lyrics) == themes
+
+
+def test_classify_theme_tokens_matches_text_input(extractor):
+    token_lists = [[w for w in jieba.cut(doc) if w.strip()] for doc in DOCUMENTS[:5]]
+    assert extractor.classify_theme_tokens(token_lists) == extractor.classify_theme_batch(DOCUMENTS[:5])
+    assert extractor.classify_theme_tokens([]) == []
+
+
+def test_duplicate_keywords_count_twice():
+    # “风”同时属于自由和自然；“风景”在自然和旅行中各出现一次
+    vocab, theme_matrix, keyword_counts = ThemeExtractor._get_theme_index()
+    column = theme_matrix[:, vocab['风']].toarray().ravel()
+    themes = list(ThemeExtractor.EXTENDED_THEMES)
+    assert {themes[t] for t in column.nonzero()[0]} == {'自由', '自然'}
+    assert list(keyword_counts) == [len(k) for k in ThemeExtractor.EXTENDED_THEMES.values()]
+
+
+def test_extract_entities_matches_baseline(extractor):
+    for lyrics in DOCUMENTS:
+        entities = extractor.extract_entities(lyrics)
+        expected = baseline_extract_entities(lyrics)
+        if len(expected['persons']) <= 10:
+            assert set(entities['persons']) == expected['persons']
+        if len(expected['scenes']) <= 10:
+            assert set(entities['scenes']) == expected['scenes']
+        assert entities['emotion_words'] == expected['emotion_words']
+
+
+def test_entity_spans_point_into_text(extractor):
+    lyrics = '我们在城市的街头\n夜里想起你的笑'
+    entities = extractor.extract_entities(lyrics)
+    for span in entities['entity_spans']:
+        assert lyrics[span['start']:span['end']] == span['text']
+    spans = {(span['text'], span['type']) for span in entities['entity_spans']}
+    assert {('我们', 'person'), ('城市', 'scene'), ('街头', 'scene'), ('笑', 'emotion')} <= spans
+    assert entities['persons'][0] == '我们'